@@ -1,5 +1,10 @@
 from django.contrib import admin
-from core.models import Patient, Test, Booking
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from core.forms import BulkActionForm
+from core.models import Patient, Test, Hospital, Booking, BookingArchive, SlotCapacity, WaitlistEntry, Job
+from core.services.pagination_service import EstimatedCountPaginator
+from core.views import bulk_report_response
 
 
 @admin.register(Patient)
@@ -8,6 +13,10 @@ class PatientAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['name', 'contact']
     readonly_fields = ['created_at']
+    date_hierarchy = 'created_at'
+    # No COUNT(*) of the whole table per page (patient_created_at_idx backs ordering and drill-down)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Test)
@@ -16,10 +25,81 @@ class TestAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+@admin.register(Hospital)
+class HospitalAdmin(admin.ModelAdmin):
+    list_display = ['name', 'key']
+    search_fields = ['name', 'key']
+    readonly_fields = ['key']
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ['patient', 'test', 'date', 'time', 'hospital', 'user', 'created_at']
     list_filter = ['date', 'test', 'hospital', 'created_at']
-    search_fields = ['patient__name', 'test__name', 'hospital', 'user__username']
+    search_fields = ['patient__name', 'test__name', 'hospital__name', 'user__username']
     readonly_fields = ['created_at']
     date_hierarchy = 'date'
+    # Patient, test and user __str__ are read per row; hospitals come from the hospital cache
+    list_select_related = ['patient', 'test', 'user']
+    autocomplete_fields = ['patient']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['bulk_action']
+
+    @admin.action(description='Reschedule, move or cancel selected bookings')
+    def bulk_action(self, request, queryset):
+        """Set-based bulk change (core.services.bulk_service) with a confirmation page."""
+        # Prefixed: the changelist posts its own 'action' field
+        if 'apply' in request.POST:
+            form = BulkActionForm(request.POST, prefix='bulk')
+            if form.is_valid():
+                result = form.run(queryset)
+                self.message_user(request, f'{result.applied} of {len(result.rows)} bookings changed.')
+                return bulk_report_response(result)
+        else:
+            form = BulkActionForm(prefix='bulk')
+        return TemplateResponse(request, 'admin/core/booking/bulk_action.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Bulk change bookings',
+            'opts': self.model._meta,
+            'form': form,
+            'count': queryset.count(),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across') == '1',
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(BookingArchive)
+class BookingArchiveAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'test', 'date', 'time', 'hospital', 'user', 'archived_at']
+    list_filter = ['test', 'hospital']
+    search_fields = ['patient__name', 'test__name', 'hospital__name', 'user__username']
+    readonly_fields = ['archived_at']
+    raw_id_fields = ['patient', 'user']
+    date_hierarchy = 'date'
+
+
+@admin.register(SlotCapacity)
+class SlotCapacityAdmin(admin.ModelAdmin):
+    list_display = ['hospital', 'test', 'capacity']
+    list_filter = ['test']
+    search_fields = ['hospital__name']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'test', 'date', 'time', 'hospital', 'priority', 'status', 'user', 'created_at']
+    list_filter = ['status', 'test', 'hospital']
+    search_fields = ['patient__name', 'hospital__name', 'user__username']
+    readonly_fields = ['created_at', 'resolved_at', 'booking']
+    raw_id_fields = ['patient', 'user']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'status', 'attempts', 'run_at', 'locked_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['idempotency_key']
+    readonly_fields = ['created_at', 'finished_at', 'locked_at', 'last_error']
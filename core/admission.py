@@ -0,0 +1,54 @@
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from core.services import admission_service
+
+
+# Methods that never write, so are never shed
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+BUSY_MESSAGE = 'Too many booking requests right now. Please try again in a moment.'
+
+
+def _busy_response(request, decision, api):
+    if api:
+        response = JsonResponse(
+            {'error': BUSY_MESSAGE, 'code': 'busy', 'retry_after': decision.retry_after_seconds}, status=429,
+        )
+    else:
+        response = render(request, 'core/busy.html', {
+            'message': BUSY_MESSAGE, 'retry_after': decision.retry_after_seconds,
+        }, status=429)
+    response['Retry-After'] = str(decision.retry_after_seconds)
+    return response
+
+
+def admission_control(api=False):
+    """
+    Admission control for views that write bookings.
+
+    Writing requests go through admission_service.admit(): past the user's
+    or the global rate, or with too many writes already running, they are
+    answered at once with 429 Too Many Requests and a Retry-After header
+    instead of queueing for the database. Reads pass straight through.
+    Apply below login_required / api_view, so the user is known.
+
+    Args:
+        api: Answer refused requests with a JSON error instead of a page
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            decision = admission_service.admit(request.user.pk)
+            if not decision.admitted:
+                return _busy_response(request, decision, api)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                admission_service.release(decision)
+        return wrapper
+    return decorator
@@ -0,0 +1,459 @@
+"""
+JSON API for kiosk and mobile clients, mounted under /api/.
+
+Bookings, patients, tests and slot availability are served as JSON. Rows
+come straight from values() querysets, so no model instances are built.
+`?fields=a,b` picks a sparse fieldset and listings are cursor-paginated.
+GET responses carry an ETag, and a matching If-None-Match gets a 304.
+Writes go through BookingForm and the booking service, like the HTML views,
+and /api/batch/ applies many of them in one transaction. Writes are subject
+to admission control (core.admission): when over the limits they get 429
+with a Retry-After header. Clients log in with the normal session and send
+the CSRF token in the X-CSRFToken header.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, quote_etag
+
+from core.admission import admission_control
+from core.caching import bookings_page
+from core.forms import BookingForm
+from core.models import Booking, Patient
+from core.routers import read_replica
+from core.services import catalogue_service, hospital_service, notification_service
+from core.services.availability_service import BOOKING_WINDOW_DAYS, free_slots
+from core.services.booking_service import DuplicateBookingError, SlotFullError
+from core.services.export_service import parse_date
+from core.services.pagination_service import get_page_size, paginate_rows
+from core.services.patient_service import normalize_contact
+
+
+# API field name -> ORM path for values(); 'hospital' is read as the id and
+# named from the hospital cache (see name_hospitals)
+BOOKING_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'time': 'time',
+    'hospital': 'hospital',
+    'test_id': 'test_id',
+    'test_name': 'test__name',
+    'patient_id': 'patient_id',
+    'patient_name': 'patient__name',
+    'patient_age': 'patient__age',
+    'patient_contact': 'patient__contact',
+    'created_at': 'created_at',
+}
+PATIENT_FIELDS = {'id': 'id', 'name': 'name', 'age': 'age', 'contact': 'contact', 'created_at': 'created_at'}
+TEST_FIELDS = ('id', 'name')
+
+# Keys the booking cursor is built from; fetched even when not requested
+CURSOR_FIELDS = ('id', 'date', 'time')
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class ApiError(Exception):
+    """Error answered with a JSON body {"error": message, ...} and the given status."""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+    def response(self, **extra):
+        return JsonResponse({'error': str(self), **self.extra, **extra}, status=self.status)
+
+
+def api_view(methods):
+    """
+    Common handling for API views.
+
+    Anonymous requests get 401 instead of the login redirect, methods not
+    in `methods` get 405 and an ApiError raised by the view becomes its
+    JSON response.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Authentication required.'}, status=401)
+            if request.method not in methods:
+                response = JsonResponse({'error': f'Method {request.method} not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as exc:
+                return exc.response()
+        return wrapper
+    return decorator
+
+
+def parse_fields(request, available):
+    """
+    Returns the fields requested with ?fields=a,b (all of `available` by default).
+
+    Raises:
+        ApiError: If an unknown field is requested
+    """
+    raw = request.GET.get('fields', '').strip()
+    if not raw:
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f'Unknown fields: {", ".join(unknown)}.', available=list(available))
+    return names
+
+
+def select_fields(queryset, field_map, names):
+    """values() of a queryset keyed by API field names."""
+    plain = [name for name in names if field_map[name] == name]
+    aliased = {name: F(field_map[name]) for name in names if field_map[name] != name}
+    return queryset.values(*plain, **aliased)
+
+
+def name_hospitals(rows):
+    """Replaces the hospital ids of booking rows with the hospital names, in place."""
+    rows = [row for row in rows if 'hospital' in row]
+    names = hospital_service.get_names({row['hospital'] for row in rows})
+    for row in rows:
+        row['hospital'] = names.get(row['hospital'])
+
+
+def parse_body(request):
+    """
+    Decodes a JSON object request body.
+
+    Raises:
+        ApiError: If the body is not a JSON object
+    """
+    try:
+        body = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError('Request body must be JSON.')
+    if not isinstance(body, dict):
+        raise ApiError('Request body must be a JSON object.')
+    return body
+
+
+def conditional_json(request, payload):
+    """
+    JsonResponse with an ETag of its content; 304 if the client has it.
+
+    Used where the payload has no cheaper version to tag (catalogue,
+    availability, patients); the client still saves the transfer.
+    """
+    response = JsonResponse(payload)
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response['ETag'] = etag
+    return response
+
+
+def _form_data(booking):
+    """The BookingForm data of an existing booking, for partial updates."""
+    return {
+        'patient_name': booking.patient.name,
+        'age': booking.patient.age,
+        'contact': booking.patient.contact,
+        'test': booking.test_id,
+        'date': booking.date,
+        'time': booking.time,
+        'hospital': booking.hospital.name,
+    }
+
+
+def _get_booking(user, pk):
+    booking = Booking.objects.select_related('patient').filter(pk=pk, user=user).first()
+    if booking is None:
+        raise ApiError('Booking not found.', status=404)
+    return booking
+
+
+def apply_operation(user, op, pk=None, data=None, partial=False):
+    """
+    Creates, updates or deletes one of the user's bookings.
+
+    Validation and saving are done by BookingForm and the booking service,
+    as in the HTML views, and the notification is queued the same way.
+
+    Args:
+        user: User the booking belongs to
+        op: CREATE, UPDATE or DELETE
+        pk: Booking id (UPDATE and DELETE)
+        data: Booking fields (CREATE and UPDATE)
+        partial: For UPDATE, fields missing from data keep their value
+
+    Returns:
+        tuple: (HTTP status, booking id)
+
+    Raises:
+        ApiError: If the booking is unknown, the data invalid or the slot taken/full
+    """
+    if op not in (CREATE, UPDATE, DELETE):
+        raise ApiError(f'Unknown operation "{op}"; use {CREATE}, {UPDATE} or {DELETE}.')
+    booking = None
+    if op != CREATE:
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise ApiError(f'"{op}" needs the numeric booking "id".')
+        booking = _get_booking(user, pk)
+
+    if op == DELETE:
+        with transaction.atomic():
+            notification_service.notify_booking('cancelled', booking)
+            booking.delete()
+        return 204, pk
+
+    if not isinstance(data, dict):
+        raise ApiError('Booking "data" must be an object.')
+    if partial and booking is not None:
+        data = {**_form_data(booking), **data}
+    form = BookingForm(data, instance=booking)
+    if not form.is_valid():
+        raise ApiError('Invalid booking.', errors={name: list(errors) for name, errors in form.errors.items()})
+    try:
+        with transaction.atomic():
+            booking = form.save(user=user)
+            notification_service.notify_booking('created' if op == CREATE else 'updated', booking)
+    except DuplicateBookingError as exc:
+        raise ApiError(str(exc), status=409, code='duplicate')
+    except SlotFullError as exc:
+        raise ApiError(str(exc), status=409, code='slot_full')
+    return (201 if op == CREATE else 200), booking.pk
+
+
+@bookings_page()
+@read_replica
+def _list_bookings(request):
+    names = parse_fields(request, BOOKING_FIELDS)
+    queryset = Booking.objects.filter(user=request.user)
+    try:
+        date_from = parse_date(request.GET.get('date_from'))
+        date_to = parse_date(request.GET.get('date_to'))
+    except ValueError:
+        raise ApiError('Dates must be in YYYY-MM-DD format.')
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    if request.GET.get('hospital', '').strip():
+        hospital = hospital_service.find_hospital(request.GET['hospital'])
+        queryset = queryset.filter(hospital=hospital) if hospital else queryset.none()
+    if request.GET.get('test', '').isdigit():
+        queryset = queryset.filter(test_id=request.GET['test'])
+
+    extra = [name for name in CURSOR_FIELDS if name not in names]
+    page = paginate_rows(
+        select_fields(queryset, BOOKING_FIELDS, names + extra),
+        cursor=request.GET.get('cursor'),
+        page_size=request.GET.get('page_size'),
+    )
+    for row in page.object_list if extra else ():
+        for name in extra:
+            del row[name]
+    name_hospitals(page.object_list)
+    return JsonResponse({
+        'results': page.object_list,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@bookings_page()
+@read_replica
+def _get_booking_json(request, id):
+    names = parse_fields(request, BOOKING_FIELDS)
+    row = select_fields(Booking.objects.filter(pk=id, user=request.user), BOOKING_FIELDS, names).first()
+    if row is None:
+        raise ApiError('Booking not found.', status=404)
+    name_hospitals([row])
+    return JsonResponse(row)
+
+
+def _saved_response(request, status, pk):
+    names = parse_fields(request, BOOKING_FIELDS)
+    row = select_fields(Booking.objects.filter(pk=pk), BOOKING_FIELDS, names).first()
+    name_hospitals([row])
+    return JsonResponse(row, status=status)
+
+
+@api_view(['GET', 'POST'])
+@admission_control(api=True)
+def bookings(request):
+    """GET: the user's bookings, newest first. POST: create a booking."""
+    if request.method == 'GET':
+        return _list_bookings(request)
+    status, pk = apply_operation(request.user, CREATE, data=parse_body(request))
+    return _saved_response(request, status, pk)
+
+
+@api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
+@admission_control(api=True)
+def booking_detail(request, id):
+    """GET, replace (PUT), partially update (PATCH) or delete (DELETE) one of the user's bookings."""
+    if request.method == 'GET':
+        return _get_booking_json(request, id)
+    if request.method == 'DELETE':
+        apply_operation(request.user, DELETE, pk=id)
+        return HttpResponse(status=204)
+    status, pk = apply_operation(
+        request.user, UPDATE, pk=id, data=parse_body(request), partial=request.method == 'PATCH',
+    )
+    return _saved_response(request, status, pk)
+
+
+@api_view(['POST'])
+@admission_control(api=True)
+def batch(request):
+    """
+    Applies many booking operations in one transaction.
+
+    Body: {"operations": [{"op": "create", "data": {...}},
+    {"op": "update", "id": 1, "data": {...}}, {"op": "delete", "id": 2}]}.
+    Updates are partial and each booking id may appear in one operation
+    only. If any operation fails nothing is saved and the error names the
+    failing operation's index. Otherwise each result holds the booking row
+    (with ?fields) as it is after the whole batch, read back in one query,
+    or "deleted": true for a booking that no longer exists.
+    """
+    operations = parse_body(request).get('operations')
+    limit = getattr(settings, 'API_BATCH_MAX_OPERATIONS', 100)
+    if not isinstance(operations, list) or not operations:
+        raise ApiError('"operations" must be a non-empty list.')
+    if len(operations) > limit:
+        raise ApiError(f'At most {limit} operations per batch.', status=413)
+    names = parse_fields(request, BOOKING_FIELDS)
+
+    targeted = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            return ApiError('Operations must be objects.', index=index).response(applied=0)
+        if operation.get('op') in (UPDATE, DELETE):
+            pk = str(operation.get('id'))
+            if pk in targeted:
+                return ApiError(
+                    'A booking can only appear in one operation per batch.', index=index,
+                ).response(applied=0)
+            targeted.add(pk)
+
+    outcomes = []
+    try:
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                try:
+                    outcomes.append(apply_operation(
+                        request.user, operation.get('op'), pk=operation.get('id'),
+                        data=operation.get('data'), partial=True,
+                    ))
+                except ApiError as exc:
+                    exc.extra.setdefault('index', index)
+                    raise
+    except ApiError as exc:
+        return exc.response(applied=0)
+
+    saved = dict(
+        (row['id'], row) for row in select_fields(
+            Booking.objects.filter(pk__in=[pk for status, pk in outcomes if status != 204]).order_by(),
+            BOOKING_FIELDS, list(dict.fromkeys(names + ['id'])),
+        )
+    )
+    name_hospitals(saved.values())
+    results = []
+    for (status, pk), operation in zip(outcomes, operations):
+        result = {'op': operation['op'], 'status': status, 'id': pk}
+        if pk in saved:
+            result['booking'] = {name: saved[pk][name] for name in names}
+        elif status != 204:
+            # Saved, then removed later in the batch (e.g. by its id)
+            result['deleted'] = True
+        results.append(result)
+    return JsonResponse({'applied': len(results), 'results': results})
+
+
+def _encode_id(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def _decode_id(token):
+    try:
+        return int(base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode()).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+@api_view(['GET'])
+@read_replica
+def patients(request):
+    """
+    Patients the user has booked for (every patient for staff), by id.
+
+    ?contact= looks a patient up by phone number (any accepted format).
+    """
+    names = parse_fields(request, PATIENT_FIELDS)
+    queryset = Patient.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(bookings__user=request.user).distinct()
+    if request.GET.get('contact', '').strip():
+        queryset = queryset.filter(contact=normalize_contact(request.GET['contact']))
+    after = _decode_id(request.GET.get('cursor', ''))
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+
+    page_size = get_page_size(request.GET.get('page_size'))
+    rows = list(select_fields(queryset.order_by('pk'), PATIENT_FIELDS, list(dict.fromkeys(names + ['id'])))[
+        :page_size + 1
+    ])
+    next_cursor = _encode_id(rows[page_size - 1]['id']) if len(rows) > page_size else None
+    rows = rows[:page_size]
+    if 'id' not in names:
+        for row in rows:
+            del row['id']
+    return conditional_json(request, {'results': rows, 'next_cursor': next_cursor})
+
+
+@api_view(['GET'])
+def tests(request):
+    """The test catalogue (served from catalogue_service's cache)."""
+    names = parse_fields(request, TEST_FIELDS)
+    return conditional_json(request, {
+        'results': [{name: getattr(test, name) for name in names} for test in catalogue_service.get_tests()],
+    })
+
+
+@api_view(['GET'])
+@read_replica
+def availability(request):
+    """Free slots per day for ?test=<id>&hospital=<name>[&days=N]."""
+    hospital = request.GET.get('hospital', '').strip()
+    test_id = request.GET.get('test', '')
+    test = catalogue_service.get_test(test_id) if test_id.isdigit() else None
+    if not hospital or test is None:
+        raise ApiError('Both a valid "test" id and a "hospital" are required.')
+    try:
+        days = int(request.GET.get('days', BOOKING_WINDOW_DAYS))
+    except ValueError:
+        raise ApiError('"days" must be an integer.')
+
+    known = hospital_service.find_hospital(hospital)
+    slots = free_slots(test, known.pk if known else None, days=days)
+    return conditional_json(request, {
+        'hospital': hospital,
+        'test': {'id': test.pk, 'name': test.name},
+        'slots': {day.isoformat(): [slot.strftime('%H:%M') for slot in times] for day, times in slots.items()},
+    })
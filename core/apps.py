@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Register signal handlers
+        from core import signals  # noqa: F401
+        # Register background job handlers
+        from core.services import notification_service  # noqa: F401
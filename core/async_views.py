@@ -0,0 +1,172 @@
+"""
+Async variants of the read-heavy views.
+
+core.urls routes to these instead of core.views when BOOKING_ASYNC_VIEWS is
+on (the default under hbs/asgi.py). They load data with the async ORM, so
+the event loop serves other requests while a page waits on the database.
+The queries of one page still run one after another: the async ORM hands
+each to the single thread-sensitive executor that owns the connection, so
+asyncio.gather only saves the switches between them. Templates are still
+rendered through sync_to_async because context processors touch the
+session synchronously. When a page's table fragment is already cached its
+rows are not loaded.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.functional import SimpleLazyObject
+
+from core.caching import FRAGMENT_CACHE, bookings_page
+from core.forms import BulkBookingForm
+from core.models import Booking, Test
+from core.routers import read_replica
+from core.services.availability_service import BOOKING_WINDOW_DAYS, afree_slots
+from core.services.hospital_service import find_hospital
+from core.services.pagination_service import apaginate_bookings, paginate_bookings
+from core.services.rollup_service import get_heatmap
+from core.services.search_service import asearch_bookings, search_bookings
+from core.services.stats_service import aget_stats
+from core.services.waitlist_service import user_waitlist
+
+
+arender = sync_to_async(render)
+
+
+async def current_user(request):
+    """
+    Resolves the user once for both the view and the template context.
+
+    request.auser() and the lazy request.user cache separately, so without
+    this the auth context processor would load the user a second time.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def fragment_cached(name, *vary_on):
+    """True if a {% cache %} fragment is already stored, so its data need not be loaded."""
+    return await caches[FRAGMENT_CACHE].ahas_key(make_template_fragment_key(name, vary_on))
+
+
+@login_required
+@bookings_page()
+@read_replica
+async def dashboard(request):
+    """User dashboard displaying user's bookings."""
+    user = await current_user(request)
+    version = request.bookings_version
+    bookings = Booking.objects.filter(user=user).select_related('patient', 'test')
+
+    if await fragment_cached('dashboard_recent', user.pk, version.token):
+        # Only read if the fragment expires before the template renders
+        recent, stats = SimpleLazyObject(lambda: list(bookings[:5])), await aget_stats(user)
+    else:
+        async def recent_bookings():
+            return [booking async for booking in bookings[:5]]
+
+        recent, stats = await asyncio.gather(recent_bookings(), aget_stats(user))
+    context = {
+        'bookings': recent,
+        'stats': stats,
+        'user': user,
+        'bookings_version': version,
+    }
+    return await arender(request, 'core/dashboard.html', context)
+
+
+@login_required
+@staff_member_required
+@bookings_page(all_bookings=True)
+@read_replica
+async def admin_dashboard(request):
+    """Admin dashboard displaying all bookings with search functionality."""
+    await current_user(request)
+    version = request.bookings_version
+    search_query = request.GET.get('search', '').strip()
+    cursor, page_size = request.GET.get('cursor'), request.GET.get('page_size')
+    queryset = Booking.objects.all().select_related('patient', 'test', 'user')
+
+    if await fragment_cached('admin_table', version.token, request.GET.urlencode()):
+        # Only read if the fragment expires before the template renders
+        page = SimpleLazyObject(
+            lambda: search_bookings(search_query, cursor=cursor, page_size=page_size) if search_query
+            else paginate_bookings(queryset, cursor=cursor, page_size=page_size, count_cache_key='admin_dashboard')
+        )
+        stats = await aget_stats()
+    else:
+        if search_query:
+            bookings = asearch_bookings(search_query, cursor=cursor, page_size=page_size)
+        else:
+            bookings = apaginate_bookings(
+                queryset, cursor=cursor, page_size=page_size, count_cache_key='admin_dashboard',
+            )
+        page, stats = await asyncio.gather(bookings, aget_stats())
+    context = {
+        'bookings': SimpleLazyObject(lambda: page.object_list),
+        'page': page,
+        'stats': stats,
+        # Rendered in a cached fragment, so only loaded on a miss
+        'heatmap': SimpleLazyObject(get_heatmap),
+        'bulk_form': BulkBookingForm(),
+        'search_query': search_query,
+        'bookings_version': version,
+    }
+    return await arender(request, 'core/admin_dashboard.html', context)
+
+
+@login_required
+@bookings_page()
+@read_replica
+async def list_bookings(request):
+    """List all bookings for the current user."""
+    user = await current_user(request)
+    version = request.bookings_version
+    bookings = Booking.objects.filter(user=user).select_related('patient', 'test')
+    cursor, page_size = request.GET.get('cursor'), request.GET.get('page_size')
+
+    if await fragment_cached('booking_table', user.pk, version.token, request.GET.urlencode()):
+        # Only read if the fragment expires before the template renders
+        page = SimpleLazyObject(lambda: paginate_bookings(bookings, cursor=cursor, page_size=page_size))
+    else:
+        page = await apaginate_bookings(bookings, cursor=cursor, page_size=page_size)
+    context = {
+        'bookings': SimpleLazyObject(lambda: page.object_list),
+        'page': page,
+        # Rendered in a cached fragment, so only loaded on a miss
+        'waitlist': SimpleLazyObject(lambda: list(user_waitlist(user))),
+        'bookings_version': version,
+    }
+    return await arender(request, 'core/booking_list.html', context)
+
+
+@login_required
+async def slot_availability(request):
+    """Return the free slots for a test at a hospital as JSON."""
+    hospital = request.GET.get('hospital', '').strip()
+    test_id = request.GET.get('test', '')
+    test = await Test.objects.filter(pk=test_id).afirst() if test_id.isdigit() else None
+    if not hospital or test is None:
+        return JsonResponse({'error': 'Both a valid "test" id and a "hospital" are required.'}, status=400)
+
+    try:
+        days = int(request.GET.get('days', BOOKING_WINDOW_DAYS))
+    except ValueError:
+        return JsonResponse({'error': '"days" must be an integer.'}, status=400)
+
+    known = await sync_to_async(find_hospital)(hospital)
+    slots = await afree_slots(test, known.pk if known else None, days=days)
+    return JsonResponse({
+        'hospital': hospital,
+        'test': {'id': test.pk, 'name': test.name},
+        'slots': {
+            day.isoformat(): [slot.strftime('%H:%M') for slot in times]
+            for day, times in slots.items()
+        },
+    })
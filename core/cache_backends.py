@@ -0,0 +1,60 @@
+from threading import Lock
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Per cache name, like LocMemCache's own module-level stores:
+# {'sizes': {key: pickled bytes}, 'total': int}
+_usage = {}
+_usage_lock = Lock()
+
+
+class BoundedLocMemCache(LocMemCache):
+    """
+    LocMemCache that also caps the total size of the stored values.
+
+    Besides the MAX_ENTRIES cull inherited from LocMemCache, the least
+    recently used entries are evicted whenever the pickled values exceed
+    OPTIONS['MAX_BYTES'] (default 32 MiB), so a few large rendered fragments
+    cannot grow the process without bound.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', 32 * 1024 * 1024))
+        with _usage_lock:
+            self._usage = _usage.setdefault(name, {'sizes': {}, 'total': 0})
+
+    @property
+    def total_bytes(self):
+        return self._usage['total']
+
+    def _forget(self, key):
+        self._usage['total'] -= self._usage['sizes'].pop(key, 0)
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._forget(key)
+        super()._set(key, value, timeout)
+        self._usage['sizes'][key] = len(value)
+        self._usage['total'] += len(value)
+        # Least recently used entries sit at the end of the OrderedDict
+        while self._usage['total'] > self._max_bytes and len(self._cache) > 1:
+            evicted, _ = self._cache.popitem()
+            self._expire_info.pop(evicted, None)
+            self._forget(evicted)
+
+    def _cull(self):
+        super()._cull()
+        for key in [key for key in self._usage['sizes'] if key not in self._cache]:
+            self._forget(key)
+
+    def _delete(self, key):
+        self._forget(key)
+        return super()._delete(key)
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self._usage['sizes'].clear()
+            self._usage['total'] = 0
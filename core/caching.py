@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from core.services import page_cache_service
+
+
+# Cache alias used by the {% cache %} fragments in the booking templates
+FRAGMENT_CACHE = 'fragments'
+
+
+class VersionedCache:
+    """
+    A small, rarely changing table served from memory in every process.
+
+    The rows are kept in the shared cache under a version number, and each
+    process keeps its own copy, revalidated against the shared version at
+    most every `local_ttl_setting` seconds. invalidate() bumps the version,
+    so every process reloads within that time.
+
+    Args:
+        prefix: Cache key prefix (the version lives at '<prefix>:version')
+        load: Returns the rows from the database (must be picklable)
+        build: Turns the rows into the value get() returns
+        timeout_setting: Setting naming the shared cache timeout (seconds)
+        local_ttl_setting: Setting naming the process-local revalidation interval (seconds)
+    """
+
+    def __init__(self, prefix, load, build, timeout_setting, local_ttl_setting):
+        self.prefix = prefix
+        self.version_key = f'{prefix}:version'
+        self.load = load
+        self.build = build
+        self.timeout_setting = timeout_setting
+        self.local_ttl_setting = local_ttl_setting
+        self._value = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Seed with a fresh value so an evicted key never revives stale entries
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _load(self, version):
+        key = f'{self.prefix}:v{version}'
+        rows = cache.get(key)
+        if rows is None:
+            rows = self.load()
+            cache.set(key, rows, getattr(settings, self.timeout_setting, 24 * 60 * 60))
+        return self.build(rows)
+
+    def get(self):
+        """Returns the value, without touching the database when warm."""
+        now = time.monotonic()
+        value = self._value
+        if value is not None and now - self._checked_at < getattr(settings, self.local_ttl_setting, 5):
+            return value
+
+        version = self._shared_version()
+        with self._lock:
+            if self._value is None or self._version != version:
+                self._value = self._load(version)
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self):
+        """Bumps the version so every process reloads the rows."""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._value = None
+            self._version = None
+
+
+def _etag(request, user, version):
+    # The page header shows the user's name, so it is part of the tag. So is
+    # the session's CSRF secret (rotated at login): a page kept from before
+    # it changed would post a token that is no longer accepted.
+    raw = '|'.join([
+        version.token, str(user.pk), user.get_username(), user.get_full_name(), request.get_full_path(),
+        request.META.get('CSRF_COOKIE', ''),
+    ])
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _precondition(request, user, version):
+    """Returns (304/412 response or None, etag or None)."""
+    # Flash messages are rendered once; a 304 would leave them hanging
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None, None
+    etag = _etag(request, user, version)
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(version.last_modified.timestamp())
+    ), etag
+
+
+def _finish(request, user, response, etag, version):
+    if etag and response.status_code == 200:
+        # Rendering may have issued the session's first CSRF secret
+        etag = _etag(request, user, version)
+    if etag and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(version.last_modified.timestamp()))
+        # Browsers keep the page but revalidate it on every visit
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def bookings_page(all_bookings=False):
+    """
+    Conditional-GET support for pages listing bookings.
+
+    The page's bookings version (see page_cache_service) is stored on
+    request.bookings_version for the view's fragment cache keys; unchanged
+    pages are answered with 304 Not Modified without running the view.
+
+    Args:
+        all_bookings: The page shows every booking (admin) rather than the user's own
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                request.user = user = await request.auser()
+                version = await page_cache_service.aget_page_version(None if all_bookings else user.pk)
+                request.bookings_version = version
+                response, etag = _precondition(request, user, version)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, user, response, etag, version)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            version = page_cache_service.get_page_version(None if all_bookings else user.pk)
+            request.bookings_version = version
+            response, etag = _precondition(request, user, version)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(request, user, response, etag, version)
+        return wrapper
+    return decorator
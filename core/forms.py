@@ -1,8 +1,84 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from core.models import Booking, Patient, Test
+from core.models import Booking, Hospital
 from core.validators import validate_phone_number, validate_booking_date
-from core.services.booking_service import check_duplicate_booking
+from core.services import bulk_service, catalogue_service, hospital_service
+from core.services.booking_service import save_booking
+from core.services.patient_service import normalize_contact
+from core.services.waitlist_service import join_waitlist
+
+
+class TestChoiceField(forms.ChoiceField):
+    """Test picker backed by the cached test catalogue instead of a queryset."""
+
+    def __init__(self, *, empty_label='---------', **kwargs):
+        self.empty_label = empty_label
+        super().__init__(choices=self.catalogue_choices, **kwargs)
+
+    def catalogue_choices(self):
+        return [('', self.empty_label)] + [
+            (test.pk, test.name) for test in catalogue_service.get_tests()
+        ]
+
+    def prepare_value(self, value):
+        return getattr(value, 'pk', value)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        test = catalogue_service.get_test(value)
+        if test is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return test
+
+    def validate(self, value):
+        if value is None and self.required:
+            raise ValidationError(self.error_messages['required'], code='required')
+
+
+class ContactField(forms.CharField):
+    """Phone number field that accepts spaces and a +254 prefix and stores 07XXXXXXXX."""
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return normalize_contact(value) if value else value
+
+
+class HospitalField(forms.CharField):
+    """
+    Hospital name input resolved against the cached hospital list.
+
+    Any spelling variant of a known hospital cleans to that Hospital. An
+    unknown name cleans to an unsaved Hospital, created when the booking is
+    saved, unless create is False, in which case it is an error.
+    """
+
+    def __init__(self, *, create=True, **kwargs):
+        self.create = create
+        kwargs.setdefault('max_length', 200)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, int):
+            value = hospital_service.get_hospital(value) or value
+        return getattr(value, 'name', value)
+
+    def clean(self, value):
+        name = super().clean(value)
+        if not name:
+            return None
+        hospital = hospital_service.find_hospital(name)
+        if hospital is None:
+            if not self.create:
+                raise ValidationError('There is no hospital with this name.', code='invalid_choice')
+            hospital = Hospital(
+                name=hospital_service.display_name(name), key=hospital_service.canonical_name(name),
+            )
+        return hospital
 
 
 class BookingForm(forms.ModelForm):
@@ -18,16 +94,16 @@ class BookingForm(forms.ModelForm):
         label='Age',
         widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': '150'})
     )
-    contact = forms.CharField(
-        max_length=10,
+    contact = ContactField(
+        # Room for "+254 712 345 678"; the normalised value is validated
+        max_length=16,
         label='Contact Number',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': '0712345678'}),
         validators=[validate_phone_number]
     )
     
     # Booking fields
-    test = forms.ModelChoiceField(
-        queryset=Test.objects.all(),
+    test = TestChoiceField(
         label='Test Type',
         widget=forms.Select(attrs={'class': 'form-control'}),
         empty_label='Select a test type'
@@ -41,8 +117,7 @@ class BookingForm(forms.ModelForm):
         label='Time',
         widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
     )
-    hospital = forms.CharField(
-        max_length=200,
+    hospital = HospitalField(
         label='Hospital Name',
         widget=forms.TextInput(attrs={'class': 'form-control'})
     )
@@ -51,62 +126,127 @@ class BookingForm(forms.ModelForm):
         model = Booking
         fields = ['patient_name', 'age', 'contact', 'test', 'date', 'time', 'hospital']
 
+    def _get_validation_exclusions(self):
+        # The test is already checked against the catalogue and the hospital
+        # resolved by name (possibly a new one); skip the FK existence
+        # queries that model validation would run.
+        exclude = super()._get_validation_exclusions()
+        exclude.update(('test', 'hospital'))
+        return exclude
+
+    def save(self, commit=True, user=None):
+        """
+        Save the booking and its patient through the booking service.
+
+        Raises:
+            DuplicateBookingError: If the patient already has this test booked at that slot
+        """
+        if not commit:
+            return super().save(commit=False)
+        data = self.cleaned_data
+        self.instance = save_booking(
+            patient_name=data['patient_name'],
+            age=data['age'],
+            contact=data['contact'],
+            test=data['test'],
+            date=data['date'],
+            time=data['time'],
+            hospital=data['hospital'],
+            user=user,
+            booking=self.instance,
+        )
+        return self.instance
+
+    def join_waitlist(self, user=None):
+        """
+        Put the patient on the waitlist of the requested (full) slot.
+
+        Raises:
+            AlreadyWaitlistedError: If the patient is already waiting for this test and slot
+        """
+        data = self.cleaned_data
+        return join_waitlist(
+            patient_name=data['patient_name'],
+            age=data['age'],
+            contact=data['contact'],
+            test=data['test'],
+            date=data['date'],
+            time=data['time'],
+            hospital=data['hospital'],
+            user=user,
+        )
+
+
+class BulkActionForm(forms.Form):
+    """What to do with a selection of bookings (see core.services.bulk_service)."""
+    action = forms.ChoiceField(
+        choices=[
+            (bulk_service.RESCHEDULE, 'Reschedule by a number of days'),
+            (bulk_service.REASSIGN, 'Move to another hospital'),
+            (bulk_service.CANCEL, 'Cancel'),
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    days = forms.IntegerField(
+        required=False,
+        label='Shift by (days)',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    new_hospital = HospitalField(
+        required=False,
+        label='New hospital',
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+
     def clean(self):
-        """Custom validation including duplicate booking check."""
         cleaned_data = super().clean()
-        patient_name = cleaned_data.get('patient_name')
-        age = cleaned_data.get('age')
-        contact = cleaned_data.get('contact')
-        test = cleaned_data.get('test')
-        date = cleaned_data.get('date')
-        time = cleaned_data.get('time')
-
-        if not all([patient_name, age, contact, test, date, time]):
-            return cleaned_data
-
-        # Get or create patient, update if exists
-        patient, created = Patient.objects.get_or_create(
-            contact=contact,
-            defaults={'name': patient_name, 'age': age}
+        action = cleaned_data.get('action')
+        if action == bulk_service.RESCHEDULE and not cleaned_data.get('days'):
+            self.add_error('days', 'Enter the number of days to shift the bookings by.')
+        if action == bulk_service.REASSIGN and not cleaned_data.get('new_hospital'):
+            self.add_error('new_hospital', 'Enter the hospital to move the bookings to.')
+        return cleaned_data
+
+    def run(self, queryset):
+        """Apply the chosen action to the bookings of queryset; returns a BulkResult."""
+        data = self.cleaned_data
+        return bulk_service.run_action(
+            queryset, data['action'], days=data.get('days') or 0, hospital=data.get('new_hospital'),
         )
-        # Update patient info if it already exists
-        if not created:
-            patient.name = patient_name
-            patient.age = age
-            patient.save()
-
-        # Check for duplicate booking
-        if self.instance and self.instance.pk:
-            # For update, exclude current instance
-            existing_booking = Booking.objects.filter(
-                patient=patient,
-                test=test,
-                date=date,
-                time=time
-            ).exclude(pk=self.instance.pk).exists()
-        else:
-            # For create, check normally
-            existing_booking = check_duplicate_booking(patient, test, date, time)
-
-        if existing_booking:
-            raise ValidationError(
-                'A booking already exists for this patient, test, date, and time combination. '
-                'Please choose a different time or date.'
-            )
 
-        # Store patient in cleaned_data for use in save method
-        cleaned_data['patient'] = patient
-        return cleaned_data
 
-    def save(self, commit=True):
-        """Override save to handle patient creation/retrieval."""
-        instance = super().save(commit=False)
-        patient = self.cleaned_data.get('patient')
-        
-        if patient:
-            instance.patient = patient
-        
-        if commit:
-            instance.save()
-        return instance
+class BulkBookingForm(BulkActionForm):
+    """Bulk action on every booking of a hospital over a date range (e.g. a closure)."""
+    hospital = HospitalField(
+        create=False,
+        label='Hospital',
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    date_from = forms.DateField(
+        label='From',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        label='To (optional)',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    test = TestChoiceField(
+        required=False,
+        label='Test',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        empty_label='All tests'
+    )
 
+    field_order = ['hospital', 'date_from', 'date_to', 'test', 'action', 'days', 'new_hospital']
+
+    def queryset(self):
+        """Bookings matching the filter fields."""
+        data = self.cleaned_data
+        queryset = Booking.objects.filter(
+            hospital=data['hospital'],
+            date__range=(data['date_from'], data.get('date_to') or data['date_from']),
+        )
+        if data.get('test'):
+            queryset = queryset.filter(test=data['test'])
+        return queryset
@@ -0,0 +1,250 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends.django import Template
+
+
+# Metrics for the request being handled (None when the request is not sampled)
+_current = ContextVar('request_metrics', default=None)
+
+# url name -> deque of RequestMetrics; deque.append is atomic, so recording
+# a sample never takes a lock
+_samples = defaultdict(lambda: deque(maxlen=get_window_size()))
+
+# Request counters are per thread (each thread only writes its own) and
+# summed on read. Whenever they are read, or a new thread registers, the
+# counters of exited threads are folded into _retired_counts, so the list
+# only holds live threads.
+_thread_counters = []
+_retired_counts = Counter()
+_registry_lock = threading.Lock()
+
+
+def _live_counters():
+    """Returns the live threads' counters, retiring those of exited threads."""
+    with _registry_lock:
+        live = []
+        for thread, counts in _thread_counters:
+            if thread.is_alive():
+                live.append((thread, counts))
+            else:
+                _retired_counts.update(counts)
+        _thread_counters[:] = live
+        return [counts for _, counts in live]
+
+
+def _request_counts():
+    requests = Counter()
+    for counts in _live_counters():
+        requests.update(counts)
+    with _registry_lock:
+        requests.update(_retired_counts)
+    return requests
+
+
+class _ThreadCounters(threading.local):
+    def __init__(self):
+        self.counts = Counter()
+        _live_counters()
+        with _registry_lock:
+            _thread_counters.append((threading.current_thread(), self.counts))
+
+
+_counters = _ThreadCounters()
+
+
+def get_window_size():
+    return getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+
+
+def get_sample_rate():
+    return getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.01)
+
+
+def enabled():
+    """True if any request is sampled (REQUEST_METRICS_SAMPLE_RATE above 0)."""
+    return get_sample_rate() > 0
+
+
+class RequestMetrics:
+    """Timings and query statistics gathered while handling one request."""
+
+    __slots__ = ('started', 'total', 'db_time', 'query_count', 'render_time', 'signatures')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.query_count = 0
+        self.render_time = 0.0
+        self.signatures = Counter()
+
+    @property
+    def duplicates(self):
+        """SQL statements executed more than once (likely N+1 patterns)."""
+        return {sql: count for sql, count in self.signatures.items() if count > 1}
+
+    def server_timing(self):
+        """Formats the metrics as a Server-Timing header value."""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+def start_request():
+    """
+    Starts collecting metrics for the current request if it is sampled.
+
+    Returns:
+        RequestMetrics or None: The metrics object, or None if not sampled
+    """
+    rate = get_sample_rate()
+    metrics = RequestMetrics() if rate >= 1 or (rate > 0 and random.random() < rate) else None
+    _current.set(metrics)
+    return metrics
+
+
+def finish_request(metrics, url_name):
+    """
+    Counts a finished request and records its metrics if it was sampled.
+
+    Args:
+        metrics: RequestMetrics from start_request, or None
+        url_name: Name of the URL pattern that handled the request
+    """
+    _counters.counts[url_name] += 1
+    _current.set(None)
+    if metrics is not None:
+        metrics.total = time.perf_counter() - metrics.started
+        _samples[url_name].append(metrics)
+
+
+def query_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook timing every query of a sampled request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.query_count += 1
+        metrics.signatures[sql] += 1
+
+
+def install_query_timer(connection):
+    """Adds query_timer to a connection's execute wrappers (once)."""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def timed_render(render):
+    """Wraps a template backend's render() to accumulate render time."""
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+    wrapper.__wrapped__ = render
+    return wrapper
+
+
+def install_render_timer():
+    """Wraps the Django template backend's render() with timed_render (once)."""
+    if not hasattr(Template.render, '__wrapped__'):
+        Template.render = timed_render(Template.render)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def snapshot():
+    """
+    Summarises the rolling window of samples per URL name.
+
+    Returns:
+        dict: {url name: {requests, samples, latency_ms, db_ms, queries, render_ms, duplicate_queries}}
+    """
+    requests = _request_counts()
+
+    summary = {}
+    for url_name, samples in list(_samples.items()):
+        window = list(samples)
+        if not window:
+            continue
+        latencies = sorted(sample.total * 1000 for sample in window)
+        db_times = sorted(sample.db_time * 1000 for sample in window)
+        duplicates = Counter()
+        for sample in window:
+            duplicates.update(sample.duplicates)
+        summary[url_name] = {
+            'requests': requests[url_name],
+            'samples': len(window),
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+            },
+            'db_ms': {
+                'p50': percentile(db_times, 0.50),
+                'p95': percentile(db_times, 0.95),
+            },
+            'queries': {
+                'mean': sum(sample.query_count for sample in window) / len(window),
+                'max': max(sample.query_count for sample in window),
+            },
+            'render_ms': {
+                'mean': sum(sample.render_time for sample in window) * 1000 / len(window),
+            },
+            'duplicate_queries': [
+                {'sql': sql, 'count': count} for sql, count in duplicates.most_common(5)
+            ],
+        }
+    return summary
+
+
+def prometheus_text(summary=None):
+    """Renders a snapshot in the Prometheus text exposition format."""
+    summary = snapshot() if summary is None else summary
+    lines = [
+        '# TYPE hbs_requests_total counter',
+        '# TYPE hbs_request_latency_ms summary',
+        '# TYPE hbs_request_db_ms summary',
+        '# TYPE hbs_request_queries gauge',
+    ]
+    for url_name, stats in sorted(summary.items()):
+        label = f'view="{url_name}"'
+        lines.append(f'hbs_requests_total{{{label}}} {stats["requests"]}')
+        for quantile in ('p50', 'p95', 'p99'):
+            value = stats['latency_ms'][quantile]
+            lines.append(f'hbs_request_latency_ms{{{label},quantile="0.{quantile[1:]}"}} {value:.3f}')
+        for quantile in ('p50', 'p95'):
+            value = stats['db_ms'][quantile]
+            lines.append(f'hbs_request_db_ms{{{label},quantile="0.{quantile[1:]}"}} {value:.3f}')
+        lines.append(f'hbs_request_queries{{{label}}} {stats["queries"]["mean"]:.2f}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clears all recorded samples (used by tests)."""
+    _samples.clear()
+    for counts in _live_counters():
+        counts.clear()
+    with _registry_lock:
+        _retired_counts.clear()
@@ -0,0 +1,41 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Booking
+from core.services import archive_service
+
+
+class Command(BaseCommand):
+    help = 'Move past bookings older than BOOKING_ARCHIVE_AFTER_DAYS into the booking archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive bookings dated before this day (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, help='Bookings moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the bookings to archive.')
+
+    def handle(self, *args, **options):
+        try:
+            before = date.fromisoformat(options['before']) if options['before'] else None
+        except ValueError:
+            raise CommandError('--before must be in YYYY-MM-DD format.')
+        before = before or archive_service.get_archive_horizon()
+        if before > date.today():
+            raise CommandError('Only past bookings can be archived.')
+
+        if options['dry_run']:
+            count = Booking.objects.filter(date__lt=before).count()
+            self.stdout.write(f'{count} booking(s) dated before {before} would be archived.')
+            return
+
+        started = time.perf_counter()
+        total = archive_service.archive_bookings(
+            before,
+            batch_size=options['batch_size'],
+            progress=lambda total: self.stdout.write(f'  {total} archived...'),
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} booking(s) dated before {before} in {elapsed:.2f}s.'
+        ))
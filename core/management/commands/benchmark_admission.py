@@ -0,0 +1,223 @@
+import json
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.instrumentation import percentile
+from core.models import Booking
+from core.services import admission_service, availability_service, catalogue_service, seed_service
+
+
+# Admission control off / on
+MODES = {'off': False, 'on': True}
+
+# Response status -> outcome
+OUTCOMES = {302: 'booked', 200: 'refused', 429: 'shed'}
+
+
+def latency_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 0.50), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'p99': round(percentile(values, 0.99), 3),
+        'max': round(values[-1], 3) if values else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Burst load test of booking creation: every thread submits its share '
+        'of create_booking requests at the same moment, with admission control '
+        'off and then on. Reports booked/refused/shed/failed requests, latency '
+        'percentiles of all, admitted and shed requests, and the admission '
+        'counters, and compares the p99 latency with the previous JSON baseline. '
+        'Writes bookings, so run it against a seeded scratch database (see seed_data).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests in the burst (default: 400).')
+        parser.add_argument(
+            '--concurrency', type=int, default=64, help='Threads submitting at once (default: 64).',
+        )
+        parser.add_argument('--users', type=int, default=50, help='Distinct users booking (default: 50).')
+        parser.add_argument(
+            '--modes', nargs='+', choices=list(MODES), default=list(MODES), help='Modes to run (default: all).',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmarks/admission.json',
+            help='Where to write the results (default: benchmarks/admission.json).',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results file to compare against (default: the existing --output file).',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10.0,
+            help='Percentage change reported as a regression (default: 10).',
+        )
+        parser.add_argument('--no-save', action='store_true', help='Do not write the results file.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+
+    def get_users(self, count):
+        users = list(User.objects.filter(username__startswith='bench', is_staff=False).order_by('pk')[:count])
+        if not users:
+            raise CommandError('No benchmark users found. Run "manage.py seed_data" first.')
+        return users
+
+    def booking_data(self, rng):
+        day = date.today() + timedelta(days=rng.randrange(1, availability_service.BOOKING_WINDOW_DAYS))
+        return {
+            'patient_name': f'{rng.choice(seed_service.FIRST_NAMES)} Burst',
+            'age': rng.randint(1, 95),
+            'contact': f'078{rng.randrange(10 ** 7):07d}',
+            'test': rng.choice(catalogue_service.get_tests()).pk,
+            'date': day.isoformat(),
+            'time': rng.choice(availability_service.slot_times()).strftime('%H:%M'),
+            'hospital': rng.choice(seed_service.HOSPITALS),
+        }
+
+    def run_burst(self, users, options):
+        """Fires the burst; returns [(latency ms, status)]."""
+        concurrency = options['concurrency']
+        rng = random.Random(options['seed'])
+        clients = []
+        for index in range(concurrency):
+            client = Client(raise_request_exception=False)
+            client.force_login(users[index % len(users)])
+            clients.append(client)
+        requests = options['requests']
+        shares = [
+            [self.booking_data(rng) for _ in range(requests // concurrency + (index < requests % concurrency))]
+            for index in range(concurrency)
+        ]
+        url = reverse('create_booking')
+        barrier = threading.Barrier(concurrency)
+        samples = []
+        lock = threading.Lock()
+
+        def work(client, share):
+            local = []
+            try:
+                barrier.wait()
+                for data in share:
+                    started = time.perf_counter()
+                    response = client.post(url, data)
+                    local.append(((time.perf_counter() - started) * 1000, response.status_code))
+            finally:
+                connections.close_all()
+            with lock:
+                samples.extend(local)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(work, clients, shares))
+        return samples
+
+    def run_mode(self, mode, users, options):
+        admission_service.get_cache().delete_many(
+            [admission_service.GLOBAL_KEY] + [admission_service.user_key(user.pk) for user in users]
+        )
+        admission_service.reset()
+        with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False, ADMISSION_CONTROL_ENABLED=MODES[mode]):
+            started = time.perf_counter()
+            try:
+                samples = self.run_burst(users, options)
+            finally:
+                duration = time.perf_counter() - started
+                Booking.objects.filter(user__in=users, patient__name__endswith=' Burst').delete()
+            admission = admission_service.snapshot()
+
+        counts = {outcome: 0 for outcome in OUTCOMES.values()}
+        counts['failed'] = 0
+        for _, status in samples:
+            counts[OUTCOMES.get(status, 'failed')] += 1
+        return {
+            **counts,
+            'requests': len(samples),
+            'duration_s': round(duration, 3),
+            'booked_per_s': round(counts['booked'] / duration, 2) if duration else 0.0,
+            'latency_ms': {
+                'all': latency_summary([ms for ms, _ in samples]),
+                'admitted': latency_summary([ms for ms, status in samples if status != 429]),
+                'shed': latency_summary([ms for ms, status in samples if status == 429]),
+            },
+            'admission': admission,
+        }
+
+    def change(self, current, previous):
+        if not previous:
+            return None
+        return (current - previous) * 100 / previous
+
+    def report(self, results, previous, threshold):
+        self.stdout.write(
+            f"{'mode':<6}{'req':>6}{'booked':>8}{'refused':>8}{'shed':>6}{'failed':>8}{'booked/s':>10}"
+            f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'Δp99':>8}"
+        )
+        for mode, stats in results['modes'].items():
+            latency = stats['latency_ms']['all']
+            line = (
+                f"{mode:<6}{stats['requests']:>6}{stats['booked']:>8}{stats['refused']:>8}{stats['shed']:>6}"
+                f"{stats['failed']:>8}{stats['booked_per_s']:>10.1f}{latency['p50']:>9.1f}{latency['p95']:>9.1f}"
+                f"{latency['p99']:>9.1f}{latency['max']:>9.1f}"
+            )
+            before = (previous or {}).get('modes', {}).get(mode)
+            delta = self.change(latency['p99'], before['latency_ms']['all']['p99']) if before else None
+            line += f"{'-' if delta is None else f'{delta:+.0f}%':>8}"
+            self.stdout.write(self.style.WARNING(line) if (delta or 0) > threshold else line)
+        for mode, stats in results['modes'].items():
+            admitted, shed = stats['latency_ms']['admitted'], stats['latency_ms']['shed']
+            admission = stats['admission']
+            self.stdout.write(
+                f"{mode}: admitted p99 {admitted['p99']:.1f} ms, shed p99 {shed['p99']:.1f} ms; "
+                f"peak in flight {admission['peak_in_flight']}, rejected "
+                + ', '.join(f'{reason} {count}' for reason, count in admission['rejected'].items())
+            )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError('--requests, --concurrency and --users must be at least 1.')
+        users = self.get_users(options['users'])
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'users': len(users),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'modes': {},
+        }
+        for mode in options['modes']:
+            self.stdout.write(f'Running burst with admission control {mode}...')
+            results['modes'][mode] = self.run_mode(mode, users, options)
+
+        baseline_path = Path(options['baseline'] or options['output'])
+        previous = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+        if previous:
+            self.stdout.write(f"Comparing with {baseline_path} ({previous['meta']['timestamp']})")
+        self.report(results, previous, options['threshold'])
+
+        if not options['no_save']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
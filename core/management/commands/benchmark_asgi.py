@@ -0,0 +1,205 @@
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.instrumentation import percentile
+from core.services import catalogue_service, seed_service
+
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the read-heavy views under the sync WSGI handler '
+        '(thread pool, core.views) and the ASGI handler (event loop, '
+        'core.async_views) at high concurrency. Each mode runs in its own '
+        'process against the configured database; run seed_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode (default: 2000).')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight (default: 64).')
+        parser.add_argument('--users', type=int, default=20, help='Distinct logged-in users (default: 20).')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+        parser.add_argument('--mode', choices=MODES, help='Run a single mode and print JSON (used internally).')
+
+    def build_requests(self, options):
+        """Returns [(path, query string, cookie)] mixing the read-heavy views."""
+        users = list(
+            User.objects.filter(username__startswith='bench', is_staff=False).order_by('pk')[:options['users']]
+        )
+        if not users:
+            raise CommandError('No benchmark users found. Run "manage.py seed_data" first.')
+        staff, _ = User.objects.get_or_create(
+            username='bench-admin', defaults={'is_staff': True, 'email': 'bench-admin@example.com'}
+        )
+
+        def session_cookie(user):
+            client = Client()
+            client.force_login(user)
+            return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        user_cookies = [session_cookie(user) for user in users]
+        staff_cookie = session_cookie(staff)
+        tests = catalogue_service.get_tests()
+        rng = random.Random(options['seed'])
+
+        requests = []
+        for _ in range(options['requests']):
+            kind = rng.choice(('dashboard', 'list_bookings', 'admin_search', 'availability'))
+            if kind == 'admin_search':
+                term = f'{rng.choice(seed_service.FIRST_NAMES)} {rng.choice(seed_service.LAST_NAMES)[:3]}'
+                requests.append((reverse('admin_dashboard'), urlencode({'search': term}), staff_cookie))
+            elif kind == 'availability':
+                query = urlencode({'test': rng.choice(tests).pk, 'hospital': rng.choice(seed_service.HOSPITALS)})
+                requests.append((reverse('slot_availability'), query, rng.choice(user_cookies)))
+            else:
+                requests.append((reverse(kind), '', rng.choice(user_cookies)))
+        return requests
+
+    def run_wsgi(self, requests, concurrency):
+        handler = WSGIHandler()
+
+        def call(request):
+            path, query, cookie = request
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'SCRIPT_NAME': '',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1',
+                'HTTP_HOST': 'testserver',
+                'HTTP_COOKIE': cookie,
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(b''),
+                'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            started = time.perf_counter()
+            result = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                b''.join(result)
+            finally:
+                result.close()
+            return (time.perf_counter() - started) * 1000, int(status[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(call, requests))
+
+    def run_asgi(self, requests, concurrency):
+        handler = ASGIHandler()
+
+        async def call(request, limit):
+            path, query, cookie = request
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 50000),
+                'server': ('testserver', 80),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Never disconnect; the handler cancels this once it responds
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with limit:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, status[0]
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(call(request, limit) for request in requests))
+
+        return asyncio.run(main())
+
+    def run_mode(self, options):
+        requests = self.build_requests(options)
+        with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False):
+            runner = self.run_asgi if options['mode'] == 'asgi' else self.run_wsgi
+            started = time.perf_counter()
+            samples = runner(requests, options['concurrency'])
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in samples)
+        return {
+            'mode': options['mode'],
+            'async_views': settings.BOOKING_ASYNC_VIEWS,
+            'requests': len(samples),
+            'errors': sum(1 for _, status in samples if status != 200),
+            'throughput_rps': len(samples) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+        }
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        results = []
+        for mode in MODES:
+            self.stdout.write(f'Running {mode}...')
+            env = dict(os.environ, BOOKING_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_asgi', '--mode', mode,
+                '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+                '--users', str(options['users']), '--seed', str(options['seed']),
+            ]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True)
+            if completed.returncode:
+                raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        self.stdout.write(f"{'mode':<6}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for row in results:
+            self.stdout.write(
+                f"{row['mode']:<6}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+                f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+            )
+        wsgi, asgi = results
+        if wsgi['throughput_rps']:
+            self.stdout.write(self.style.SUCCESS(
+                f"ASGI throughput: {asgi['throughput_rps'] / wsgi['throughput_rps']:.2f}x WSGI "
+                f"at concurrency {options['concurrency']}"
+            ))
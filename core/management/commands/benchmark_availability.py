@@ -0,0 +1,67 @@
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Booking, Test
+from core.services import availability_service, hospital_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the occupancy-grid availability lookup with a naive '
+        'query-per-slot scan of the Booking table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospital', required=True, help='Hospital name to query.')
+        parser.add_argument('--test', required=True, help='Test name to query.')
+        parser.add_argument('--days', type=int, default=availability_service.BOOKING_WINDOW_DAYS)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def naive_free_slots(self, test, hospital, days):
+        """Baseline: one query per day and slot, as a client probing create_booking would."""
+        capacity = availability_service.get_capacity(hospital.pk, test)
+        step = timedelta(minutes=availability_service.get_slot_minutes())
+        today = date.today()
+        slots = {}
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            slots[day] = []
+            for slot in availability_service.slot_times():
+                # Every booking time inside the slot counts, as in the grid
+                end = datetime.combine(day, slot) + step
+                in_slot = {'time__gte': slot}
+                if end.date() == day:
+                    in_slot['time__lt'] = end.time()
+                booked = Booking.objects.filter(
+                    hospital=hospital, test=test, date=day, **in_slot
+                ).count()
+                if not availability_service.is_full(booked, capacity):
+                    slots[day].append(slot)
+        return slots
+
+    def time_it(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), max(samples)
+
+    def handle(self, *args, **options):
+        test = Test.objects.filter(name=options['test']).first()
+        if test is None:
+            raise CommandError(f"Unknown test '{options['test']}'.")
+        hospital = hospital_service.find_hospital(options['hospital'])
+        if hospital is None:
+            raise CommandError(f"Unknown hospital '{options['hospital']}'.")
+        days, repeat = options['days'], options['repeat']
+
+        grid = self.time_it(lambda: availability_service.free_slots(test, hospital.pk, days), repeat)
+        naive = self.time_it(lambda: self.naive_free_slots(test, hospital, days), max(1, repeat // 10))
+
+        self.stdout.write(f'Occupancy grid: median {grid[0]:.2f} ms, max {grid[1]:.2f} ms')
+        self.stdout.write(f'Query per slot: median {naive[0]:.2f} ms, max {naive[1]:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {naive[0] / grid[0]:.1f}x'))
@@ -0,0 +1,307 @@
+import json
+import platform
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.instrumentation import percentile
+from core.models import Booking, Patient
+from core.services import availability_service, catalogue_service, seed_service
+from core.services.booking_service import DuplicateBookingError, SlotFullError, save_booking
+
+
+FLOWS = (
+    'dashboard',
+    'list_bookings',
+    'admin_search',
+    'availability',
+    'create_booking',
+    'update_booking',
+    'delete_booking',
+)
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Worker:
+    """One simulated user: a logged-in test client plus the bookings it owns."""
+
+    def __init__(self, user, staff, seed):
+        self.rng = random.Random(seed)
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(user)
+        self.staff_client = Client(raise_request_exception=False)
+        self.staff_client.force_login(staff)
+        self.user = user
+        self.owned = []
+
+    def booking_data(self):
+        tests = catalogue_service.get_tests()
+        day = date.today() + timedelta(days=self.rng.randrange(availability_service.BOOKING_WINDOW_DAYS))
+        return {
+            'patient_name': f'{self.rng.choice(seed_service.FIRST_NAMES)} Bench',
+            'age': self.rng.randint(1, 95),
+            'contact': f'079{self.rng.randrange(10 ** 7):07d}',
+            'test': self.rng.choice(tests).pk,
+            'date': day.isoformat(),
+            'time': self.rng.choice(availability_service.slot_times()).strftime('%H:%M'),
+            'hospital': self.rng.choice(seed_service.HOSPITALS),
+        }
+
+    def make_booking(self):
+        """Creates a booking outside the timed section (setup for update/delete)."""
+        tests = {test.pk: test for test in catalogue_service.get_tests()}
+        while True:
+            data = self.booking_data()
+            try:
+                booking = save_booking(
+                    patient_name=data['patient_name'],
+                    age=data['age'],
+                    contact=data['contact'],
+                    test=tests[data['test']],
+                    date=date.fromisoformat(data['date']),
+                    time=datetime.strptime(data['time'], '%H:%M').time(),
+                    hospital=data['hospital'],
+                    user=self.user,
+                )
+            except (DuplicateBookingError, SlotFullError):
+                continue
+            self.owned.append(booking.pk)
+            return booking.pk
+
+    def prepare(self, flow):
+        """Returns a callable issuing one request for the flow."""
+        if flow == 'dashboard':
+            return lambda: self.client.get(reverse('dashboard'))
+        if flow == 'list_bookings':
+            return lambda: self.client.get(reverse('list_bookings'))
+        if flow == 'admin_search':
+            term = f'{self.rng.choice(seed_service.FIRST_NAMES)} {self.rng.choice(seed_service.LAST_NAMES)[:3]}'
+            return lambda: self.staff_client.get(reverse('admin_dashboard'), {'search': term})
+        if flow == 'availability':
+            params = {
+                'test': self.rng.choice(catalogue_service.get_tests()).pk,
+                'hospital': self.rng.choice(seed_service.HOSPITALS),
+            }
+            return lambda: self.client.get(reverse('slot_availability'), params)
+        if flow == 'create_booking':
+            data = self.booking_data()
+            return lambda: self.client.post(reverse('create_booking'), data)
+        if flow == 'update_booking':
+            pk = self.owned[-1] if self.owned else self.make_booking()
+            data = self.booking_data()
+            return lambda: self.client.post(reverse('update_booking', args=[pk]), data)
+        if flow == 'delete_booking':
+            pk = self.make_booking()
+            self.owned.remove(pk)
+            return lambda: self.client.post(reverse('delete_booking', args=[pk]))
+        raise ValueError(f'Unknown flow {flow!r}')
+
+    def cleanup(self):
+        # Everything the worker booked uses a '<name> Bench' patient, so
+        # repeated runs with the same seed start from the same dataset
+        Booking.objects.filter(user=self.user, patient__name__endswith=' Bench').delete()
+        self.owned = []
+
+
+def expected_status(flow):
+    return 302 if flow in ('create_booking', 'update_booking', 'delete_booking') else 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the booking flows through the Django test client, report '
+        'throughput, latency percentiles and query counts, and compare the '
+        'result with the previous JSON baseline. Writes bookings, so run it '
+        'against a seeded scratch database (see seed_data).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--flows',
+            nargs='+',
+            choices=FLOWS,
+            default=list(FLOWS),
+            help='Flows to run (default: all).',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per flow (default: 200).',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of concurrent simulated users (default: 1).',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmarks/baseline.json',
+            help='Where to write the results (default: benchmarks/baseline.json).',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results file to compare against (default: the existing --output file).',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10.0,
+            help='Percentage change reported as a regression (default: 10).',
+        )
+        parser.add_argument('--no-save', action='store_true', help='Do not write the results file.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+
+    def get_users(self, count):
+        users = list(
+            User.objects.filter(username__startswith='bench', is_staff=False).order_by('pk')[:count]
+        )
+        if not users:
+            raise CommandError('No benchmark users found. Run "manage.py seed_data" first.')
+        staff, _ = User.objects.get_or_create(
+            username='bench-admin', defaults={'is_staff': True, 'email': 'bench-admin@example.com'}
+        )
+        return users, staff
+
+    def run_flow(self, flow, workers, requests):
+        """Spreads the flow's requests over the workers and times each one."""
+        samples = []
+        lock = threading.Lock()
+
+        def work(worker, count):
+            local = []
+            try:
+                for _ in range(count):
+                    try:
+                        request = worker.prepare(flow)
+                    except DatabaseError:
+                        # Setup lost a write lock race; counts as a failed request
+                        local.append((None, None, None))
+                        continue
+                    started = time.perf_counter()
+                    response = request()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+                    local.append((elapsed, int(match.group(1)) if match else None, response.status_code))
+            finally:
+                connections.close_all()
+            with lock:
+                samples.extend(local)
+
+        shares = [requests // len(workers) + (index < requests % len(workers)) for index in range(len(workers))]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            list(pool.map(work, workers, shares))
+        duration = time.perf_counter() - started
+
+        latencies = sorted(sample[0] for sample in samples if sample[0] is not None)
+        queries = [sample[1] for sample in samples if sample[1] is not None]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if sample[2] != expected_status(flow)),
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(len(samples) / duration, 2) if duration else 0.0,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                'p50': round(percentile(latencies, 0.50), 3),
+                'p95': round(percentile(latencies, 0.95), 3),
+                'p99': round(percentile(latencies, 0.99), 3),
+            },
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'max': max(queries) if queries else None,
+            },
+        }
+
+    def change(self, current, previous):
+        if not previous:
+            return None
+        return (current - previous) * 100 / previous
+
+    def report(self, results, previous, threshold):
+        self.stdout.write(
+            f"{'flow':<16}{'req':>6}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}"
+            f"{'Δp95':>9}{'Δrps':>9}"
+        )
+        for flow, stats in results['flows'].items():
+            latency = stats['latency_ms']
+            queries = stats['queries']['mean']
+            line = (
+                f"{flow:<16}{stats['requests']:>6}{stats['errors']:>5}{stats['throughput_rps']:>9.1f}"
+                f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+                f"{'-' if queries is None else f'{queries:.1f}':>9}"
+            )
+            before = (previous or {}).get('flows', {}).get(flow)
+            if before is None:
+                self.stdout.write(line)
+                continue
+            p95 = self.change(latency['p95'], before['latency_ms']['p95'])
+            rps = self.change(stats['throughput_rps'], before['throughput_rps'])
+            line += f"{'-' if p95 is None else f'{p95:+.0f}%':>9}{'-' if rps is None else f'{rps:+.0f}%':>9}"
+            regressed = (p95 or 0) > threshold or (rps or 0) < -threshold
+            self.stdout.write(self.style.WARNING(line) if regressed else line)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+
+        users, staff = self.get_users(options['concurrency'])
+        workers = [
+            Worker(user, staff, options['seed'] + index) for index, user in enumerate(users)
+        ]
+        if len(workers) < options['concurrency']:
+            self.stdout.write(self.style.WARNING(
+                f'Only {len(workers)} benchmark users available; running with that concurrency.'
+            ))
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'bookings': Booking.objects.count(),
+                'patients': Patient.objects.count(),
+                'requests': options['requests'],
+                'concurrency': len(workers),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'flows': {},
+        }
+        # Every request is sampled so Server-Timing always carries the query
+        # count; admission control is off so every write is measured (see
+        # benchmark_admission for the behaviour under a burst)
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'], DEBUG=False, REQUEST_METRICS_SAMPLE_RATE=1.0,
+            ADMISSION_CONTROL_ENABLED=False,
+        ):
+            try:
+                for flow in options['flows']:
+                    self.stdout.write(f'Running {flow}...')
+                    results['flows'][flow] = self.run_flow(flow, workers, options['requests'])
+            finally:
+                for worker in workers:
+                    worker.cleanup()
+
+        baseline_path = Path(options['baseline'] or options['output'])
+        previous = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+        if previous:
+            self.stdout.write(f"Comparing with {baseline_path} ({previous['meta']['timestamp']})")
+        self.report(results, previous, options['threshold'])
+
+        if not options['no_save']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
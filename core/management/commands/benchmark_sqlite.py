@@ -0,0 +1,159 @@
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections
+
+from core.instrumentation import percentile
+from core.models import Booking
+from core.services import availability_service, catalogue_service, seed_service
+from core.services.booking_service import save_booking
+from hbs.database import sqlite_database
+
+
+def stock_database(path):
+    """Django's out-of-the-box SQLite settings, for comparison."""
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path), 'OPTIONS': {}, 'CONN_MAX_AGE': 0}
+
+
+PROFILES = {
+    'stock': stock_database,
+    'tuned': sqlite_database,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent booking write throughput (with concurrent readers) '
+        'on a throwaway SQLite file, with stock settings and with the tuned '
+        'settings from hbs/database.py. The configured database is not touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads (default: 8).')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads (default: 4).')
+        parser.add_argument('--writes', type=int, default=100, help='Bookings per writer (default: 100).')
+        parser.add_argument('--bookings', type=int, default=5000, help='Bookings seeded first (default: 5000).')
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['stock', 'tuned'])
+
+    def use_database(self, settings_dict):
+        """Points the default alias at another database for every thread."""
+        connections.close_all()
+        configured = connections.configure_settings({DEFAULT_DB_ALIAS: settings_dict})[DEFAULT_DB_ALIAS]
+        current = connections.settings[DEFAULT_DB_ALIAS]
+        current.clear()
+        current.update(configured)
+
+    def writer(self, index, writes, stats):
+        rng = random.Random(index)
+        tests = catalogue_service.get_tests()
+        latencies, failed = [], 0
+        try:
+            for number in range(writes):
+                started = time.perf_counter()
+                try:
+                    save_booking(
+                        patient_name=f'Writer {index}',
+                        age=30,
+                        contact=f'078{index:03d}{number:04d}',
+                        test=rng.choice(tests),
+                        date=date.today() + timedelta(days=rng.randrange(availability_service.BOOKING_WINDOW_DAYS)),
+                        time=rng.choice(availability_service.slot_times()),
+                        hospital=rng.choice(seed_service.HOSPITALS),
+                    )
+                except DatabaseError:
+                    failed += 1
+                else:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                # Request boundary: connections older than CONN_MAX_AGE are closed
+                close_old_connections()
+        finally:
+            connections.close_all()
+        with stats['lock']:
+            stats['latencies'].extend(latencies)
+            stats['failed'] += failed
+
+    def reader(self, done, stats):
+        reads = failed = 0
+        try:
+            while not done.is_set():
+                try:
+                    list(Booking.objects.select_related('patient', 'test').order_by('-date', '-time', '-id')[:25])
+                    reads += 1
+                except DatabaseError:
+                    failed += 1
+                close_old_connections()
+        finally:
+            connections.close_all()
+        with stats['lock']:
+            stats['reads'] += reads
+            stats['read_failures'] += failed
+
+    def run_profile(self, name, directory, options):
+        path = Path(directory) / f'{name}.sqlite3'
+        self.use_database(PROFILES[name](path))
+        call_command('migrate', verbosity=0, interactive=False)
+        seed_service.seed_bookings(options['bookings'], seed=1)
+        connections.close_all()
+
+        stats = {'lock': threading.Lock(), 'latencies': [], 'failed': 0, 'reads': 0, 'read_failures': 0}
+        done = threading.Event()
+        readers = [threading.Thread(target=self.reader, args=(done, stats)) for _ in range(options['readers'])]
+        writers = [
+            threading.Thread(target=self.writer, args=(index, options['writes'], stats))
+            for index in range(options['writers'])
+        ]
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        latencies = sorted(stats['latencies'])
+        return {
+            'writes': len(latencies),
+            'failed': stats['failed'],
+            'writes_per_s': len(latencies) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'reads_per_s': stats['reads'] / elapsed,
+            'read_failures': stats['read_failures'],
+        }
+
+    def handle(self, *args, **options):
+        if min(options['writers'], options['writes']) < 1 or options['readers'] < 0:
+            raise CommandError('--writers and --writes must be at least 1.')
+
+        original = dict(connections.settings[DEFAULT_DB_ALIAS])
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for name in options['profiles']:
+                    self.stdout.write(f'Running {name} profile...')
+                    results[name] = self.run_profile(name, directory, options)
+                connections.close_all()
+        finally:
+            self.use_database(original)
+            catalogue_service.invalidate()
+
+        self.stdout.write(
+            f"{'profile':<8}{'writes':>8}{'failed':>8}{'writes/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'reads/s':>10}{'read err':>10}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<8}{row['writes']:>8}{row['failed']:>8}{row['writes_per_s']:>10.1f}"
+                f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['reads_per_s']:>10.1f}{row['read_failures']:>10}"
+            )
+        if {'stock', 'tuned'} <= results.keys() and results['stock']['writes_per_s']:
+            gain = results['tuned']['writes_per_s'] / results['stock']['writes_per_s']
+            self.stdout.write(self.style.SUCCESS(f'Tuned write throughput: {gain:.1f}x stock'))
@@ -0,0 +1,231 @@
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core.startup import PHASE_MARKER
+
+
+# Start-up modes: PRECOMPILE_TEMPLATES off / on
+MODES = {'lazy': '0', 'precompiled': '1'}
+PHASES = ('settings', 'apps_ready', 'handler', 'warm_up', 'startup')
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+# (name, URL name, who is logged in)
+REQUESTS = (
+    ('login', 'login', None),
+    ('dashboard', 'dashboard', 'user'),
+    ('list_bookings', 'list_bookings', 'user'),
+    ('create_booking', 'create_booking', 'user'),
+    ('api_bookings', 'api_bookings', 'user'),
+    ('admin_dashboard', 'admin_dashboard', 'staff'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold start: each run starts a fresh interpreter with -X importtime, '
+        'times the settings import, app registry population, WSGI handler set-up '
+        'and template warm-up, then the first and second request of the main '
+        'pages. Import time is attributed to the phase (or request) that paid '
+        'for it. Both start-up modes (PRECOMPILE_TEMPLATES off and on) are run '
+        'and the medians compared with the previous JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts per mode (default: 5).')
+        parser.add_argument(
+            '--modes', nargs='+', choices=list(MODES), default=list(MODES), help='Modes to run (default: all).',
+        )
+        parser.add_argument('--top', type=int, default=15, help='Slowest imported modules to list (default: 15).')
+        parser.add_argument(
+            '--output',
+            default='benchmarks/startup.json',
+            help='Where to write the results (default: benchmarks/startup.json).',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results file to compare against (default: the existing --output file).',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10.0,
+            help='Percentage change reported as a regression (default: 10).',
+        )
+        parser.add_argument('--no-save', action='store_true', help='Do not write the results file.')
+
+    def build_requests(self):
+        """Returns [(name, path, session cookie)] for the profiled pages."""
+        user = User.objects.filter(username__startswith='bench', is_staff=False).order_by('pk').first()
+        if user is None:
+            raise CommandError('No benchmark users found. Run "manage.py seed_data" first.')
+        staff, _ = User.objects.get_or_create(
+            username='bench-admin', defaults={'is_staff': True, 'email': 'bench-admin@example.com'}
+        )
+
+        def session_cookie(account):
+            client = Client()
+            client.force_login(account)
+            return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        cookies = {None: '', 'user': session_cookie(user), 'staff': session_cookie(staff)}
+        return [(name, reverse(url_name), cookies[who]) for name, url_name, who in REQUESTS]
+
+    def cold_start(self, requests, mode):
+        """One fresh process: returns its timings plus the import times per phase and module."""
+        env = dict(os.environ, PRECOMPILE_TEMPLATES=MODES[mode])
+        env.pop('PYTHONPROFILEIMPORTTIME', None)
+        command = [sys.executable, '-X', 'importtime', '-m', 'core.startup', json.dumps(requests)]
+        completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f'{mode} start-up failed:\n{completed.stderr[-4000:]}')
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        phase = 'interpreter'
+        imports = defaultdict(float)
+        modules = {}
+        for line in completed.stderr.splitlines():
+            if line.startswith(PHASE_MARKER):
+                phase = line[len(PHASE_MARKER):]
+                continue
+            match = IMPORT_LINE.match(line)
+            if match is None:
+                continue
+            own, cumulative, _, module = match.groups()
+            imports[phase] += int(own) / 1000
+            modules[module] = {'phase': phase, 'self_ms': int(own) / 1000, 'cumulative_ms': int(cumulative) / 1000}
+        for name, stats in result['requests'].items():
+            stats['imports_ms'] = imports.get(f'request:{name}', 0.0)
+        result['imports_ms'] = {name: imports.get(name, 0.0) for name in ('interpreter',) + PHASES[:-1]}
+        result['modules'] = modules
+        return result
+
+    def median_result(self, runs, top):
+        """Median of every timing over the runs; the slowest modules by median self time."""
+        def median(values):
+            return round(statistics.median(values), 3)
+
+        first = runs[0]
+        package_totals = []
+        for run in runs:
+            totals = defaultdict(float)
+            for module, stats in run['modules'].items():
+                totals[module.split('.')[0]] += stats['self_ms']
+            package_totals.append(totals)
+        packages = {
+            package: [totals.get(package, 0.0) for totals in package_totals]
+            for package in set().union(*package_totals)
+        }
+        module_names = set.intersection(*(set(run['modules']) for run in runs))
+        modules = sorted(
+            (
+                {
+                    'module': module,
+                    'phase': first['modules'][module]['phase'],
+                    'self_ms': median([run['modules'][module]['self_ms'] for run in runs]),
+                    'cumulative_ms': median([run['modules'][module]['cumulative_ms'] for run in runs]),
+                }
+                for module in module_names
+            ),
+            key=lambda row: -row['self_ms'],
+        )
+        return {
+            'phases': {name: median([run['phases'][name] for run in runs]) for name in PHASES},
+            'imports_ms': {name: median([run['imports_ms'][name] for run in runs]) for name in first['imports_ms']},
+            'requests': {
+                name: {
+                    'status': stats['status'],
+                    **{key: median([run['requests'][name][key] for run in runs])
+                       for key in ('first_ms', 'warm_ms', 'imports_ms')},
+                }
+                for name, stats in first['requests'].items()
+            },
+            'packages_ms': dict(sorted(
+                ((package, median(values)) for package, values in packages.items()), key=lambda item: -item[1],
+            )[:top]),
+            'modules': modules[:top],
+        }
+
+    def change(self, current, previous):
+        if not previous:
+            return None
+        return (current - previous) * 100 / previous
+
+    def line(self, text, current, previous, threshold):
+        delta = self.change(current, previous) if previous is not None else None
+        text += f"{'-' if delta is None else f'{delta:+.0f}%':>9}"
+        return self.style.WARNING(text) if (delta or 0) > threshold else text
+
+    def report(self, mode, result, previous, threshold):
+        previous = previous or {}
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{mode}'))
+        self.stdout.write(f"{'phase':<20}{'ms':>9}{'imports':>9}{'Δms':>9}")
+        for name in PHASES:
+            imports = result['imports_ms'].get(name)
+            self.stdout.write(self.line(
+                f"{name:<20}{result['phases'][name]:>9.1f}{'-' if imports is None else f'{imports:.1f}':>9}",
+                result['phases'][name], previous.get('phases', {}).get(name), threshold,
+            ))
+        self.stdout.write(f"{'request':<20}{'status':>7}{'first':>9}{'warm':>9}{'imports':>9}{'Δfirst':>9}")
+        for name, stats in result['requests'].items():
+            before = previous.get('requests', {}).get(name, {})
+            self.stdout.write(self.line(
+                f"{name:<20}{stats['status']:>7}{stats['first_ms']:>9.1f}{stats['warm_ms']:>9.1f}"
+                f"{stats['imports_ms']:>9.1f}",
+                stats['first_ms'], before.get('first_ms'), threshold,
+            ))
+        self.stdout.write(f"{'slowest imports':<48}{'phase':<24}{'self':>9}{'cumul.':>9}")
+        for row in result['modules']:
+            self.stdout.write(
+                f"{row['module']:<48}{row['phase']:<24}{row['self_ms']:>9.1f}{row['cumulative_ms']:>9.1f}"
+            )
+        self.stdout.write('import time by package: ' + ', '.join(
+            f'{package} {ms:.1f}' for package, ms in result['packages_ms'].items()
+        ))
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+        requests = self.build_requests()
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'runs': options['runs'],
+                'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'modes': {},
+        }
+        for mode in options['modes']:
+            self.stdout.write(f'Running {mode} ({options["runs"]} cold starts)...')
+            runs = [self.cold_start(requests, mode) for _ in range(options['runs'])]
+            results['modes'][mode] = self.median_result(runs, options['top'])
+
+        baseline_path = Path(options['baseline'] or options['output'])
+        previous = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+        if previous:
+            self.stdout.write(f"Comparing with {baseline_path} ({previous['meta']['timestamp']})")
+        for mode, result in results['modes'].items():
+            self.report(mode, result, (previous or {}).get('modes', {}).get(mode), options['threshold'])
+
+        if not options['no_save']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Patient
+from core.services import patient_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Find patients that are probably the same person (similar name and age, contact '
+        'one typo apart) and optionally merge them into the oldest record.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true', help='Merge the clusters (default: report only)')
+        parser.add_argument('--max-block', type=int, default=500,
+                            help='Skip candidate blocks larger than this (too unselective)')
+        parser.add_argument('--show', type=int, default=20, help='Number of clusters to print')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        clusters = patient_service.find_duplicate_clusters(max_block=options['max_block'])
+        elapsed = time.perf_counter() - started
+        duplicates = sum(len(cluster) - 1 for cluster in clusters)
+        self.stdout.write(
+            f'Found {len(clusters)} cluster(s) with {duplicates} likely duplicate(s) in {elapsed:.2f}s.'
+        )
+
+        shown = clusters[:options['show']]
+        patients = Patient.objects.in_bulk([pk for cluster in shown for pk in cluster])
+        counts = patient_service.booking_counts(list(patients))
+        for cluster in shown:
+            keeper, *others = cluster
+            self.stdout.write(self._describe(patients[keeper], counts, 'keep '))
+            for pk in others:
+                self.stdout.write(self._describe(patients[pk], counts, '  merge'))
+
+        if not options['merge']:
+            if clusters:
+                self.stdout.write('Run with --merge to merge them.')
+            return
+        moved = 0
+        for keeper, *others in clusters:
+            moved += patient_service.merge_patients(Patient.objects.get(pk=keeper), others)
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {duplicates} patient(s); {moved} booking(s) moved.'
+        ))
+
+    @staticmethod
+    def _describe(patient, counts, label):
+        return (
+            f'{label} #{patient.pk} {patient.name} ({patient.contact}), age {patient.age}, '
+            f'{counts.get(patient.pk, 0)} booking(s)'
+        )
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import export_service
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings to a CSV or NDJSON file (or stdout).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export_service.EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+        parser.add_argument('--search', default='', help='Only export bookings matching this search.')
+        parser.add_argument('--date-from', help='First booking date to export (YYYY-MM-DD).')
+        parser.add_argument('--date-to', help='Last booking date to export (YYYY-MM-DD).')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = export_service.parse_date(options['date_from'])
+            date_to = export_service.parse_date(options['date_to'])
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+
+        queryset = export_service.export_queryset(options['search'], date_from, date_to)
+        chunks = export_service.iter_export(
+            queryset,
+            options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['output']:
+            if options['gzip']:
+                output = open(options['output'], 'wb')
+            else:
+                output = open(options['output'], 'w', newline='', encoding='utf-8')
+            with output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported bookings to {options['output']}"))
+        else:
+            stream = sys.stdout.buffer if options['gzip'] else sys.stdout
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
@@ -0,0 +1,73 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import import_service
+
+
+class Command(BaseCommand):
+    help = 'Import bookings in bulk from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='File format (default: guessed from the file extension).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of rows written per transaction (default: 2000).',
+        )
+        parser.add_argument('--user', help='Username to assign to rows without a username column.')
+        parser.add_argument(
+            '--errors',
+            help='Where to write rejected rows (default: <path>.errors.csv).',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+
+        default_user = None
+        if options['user']:
+            default_user = User.objects.filter(username=options['user']).first()
+            if default_user is None:
+                raise CommandError(f"Unknown user '{options['user']}'.")
+
+        errors_path = Path(options['errors'] or f'{path}.errors.csv')
+        started = time.perf_counter()
+        with path.open(newline='', encoding='utf-8') as stream, \
+                errors_path.open('w', newline='', encoding='utf-8') as errors_file:
+            writer = csv.writer(errors_file)
+            writer.writerow(['line', 'errors', 'row'])
+
+            def report(line, raw, messages):
+                writer.writerow([line, ' '.join(messages), json.dumps(raw, default=str)])
+
+            result = import_service.import_bookings(
+                import_service.read_rows(stream, file_format),
+                chunk_size=options['chunk_size'],
+                report=report,
+                default_user=default_user,
+            )
+        elapsed = time.perf_counter() - started
+
+        rate = result.total / elapsed * 60 if elapsed else 0
+        self.stdout.write(
+            f'Read {result.total} rows in {elapsed:.2f}s ({rate:.0f} rows/min): '
+            f'{result.created} bookings created, {result.patients_created} new patients, '
+            f'{result.duplicates} duplicates, {result.invalid} invalid.'
+        )
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {errors_path}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All rows imported.'))
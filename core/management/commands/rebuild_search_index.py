@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import search_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the booking full-text search index from the Booking table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of index rows written per batch (default: 5000).',
+        )
+
+    def handle(self, *args, **options):
+        if not search_service.is_search_enabled():
+            raise CommandError('The booking search index requires an SQLite database with FTS5.')
+
+        started = time.perf_counter()
+        total = search_service.rebuild_index(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} bookings in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import availability_service
+
+
+class Command(BaseCommand):
+    help = 'Recompute the slot occupancy grid from upcoming bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Only drop the rows of past days.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['prune']:
+            total = availability_service.prune_occupancy()
+            message = f'Dropped {total} past occupancy rows'
+        else:
+            total = availability_service.rebuild_occupancy()
+            message = f'Wrote {total} occupied slots'
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{message} in {elapsed:.2f}s.'))
@@ -0,0 +1,86 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from core.services import job_service
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (notifications, audit log) on a thread pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'JOB_WORKER_THREADS', 4))
+        parser.add_argument('--kind', action='append', dest='kinds', help='Only run jobs of this kind (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Exit once no jobs are due')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue jobs left running this many seconds by a stopped worker')
+        parser.add_argument('--purge-after', type=int, default=7,
+                            help='Delete finished jobs older than this many days')
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or sorted(job_service.HANDLERS)
+        unknown = set(kinds) - set(job_service.HANDLERS)
+        if unknown:
+            raise CommandError(f'Unknown job kind(s): {", ".join(sorted(unknown))}')
+
+        released = job_service.release_stale(timedelta(seconds=options['stale_after']))
+        purged = job_service.purge(timedelta(days=options['purge_after']))
+        if released or purged:
+            self.stdout.write(f'Requeued {released} stale job(s), purged {purged} finished job(s).')
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        stop = threading.Event()
+        started = time.perf_counter()
+        self.stdout.write(f'Worker {name}: {options["threads"]} thread(s), kinds {", ".join(kinds)}')
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            futures = [
+                pool.submit(self.work, f'{name}:{index}', kinds, stop, options['once'], options['poll'])
+                for index in range(options['threads'])
+            ]
+            try:
+                totals = [future.result() for future in futures]
+            except KeyboardInterrupt:
+                stop.set()
+                totals = [future.result() for future in futures]
+
+        done = sum(total[0] for total in totals)
+        failed = sum(total[1] for total in totals)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {done + failed} job(s) in {elapsed:.2f}s ({failed} to retry or failed).'
+        ))
+
+    def work(self, worker, kinds, stop, once, poll):
+        """One pool thread: claims and runs a batch of each kind in turn."""
+        done = failed = 0
+        try:
+            while not stop.is_set():
+                ran = 0
+                for kind in kinds:
+                    try:
+                        jobs = job_service.claim(kind, worker)
+                    except OperationalError:
+                        # Database busy; try again on the next pass
+                        continue
+                    if not jobs:
+                        continue
+                    failures = job_service.run(jobs)
+                    done += len(jobs) - failures
+                    failed += failures
+                    ran += len(jobs)
+                    close_old_connections()
+                if not ran:
+                    if once:
+                        break
+                    stop.wait(poll)
+        finally:
+            connection.close()
+        return done, failed
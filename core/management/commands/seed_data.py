@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import seed_service
+
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the database with a synthetic, skewed booking dataset for demos '
+        'and benchmarks. Point DATABASE_NAME at a scratch database first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            choices=sorted(SIZES),
+            help='Preset dataset size (10k, 100k or 1m bookings).',
+        )
+        parser.add_argument('--bookings', type=int, help='Exact number of bookings to generate.')
+        parser.add_argument('--patients', type=int, help='Number of patients (default: bookings / 5).')
+        parser.add_argument('--users', type=int, help='Number of user accounts (default: bookings / 50).')
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            default=365,
+            help='How many days of past bookings to generate (default: 365).',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+
+    def handle(self, *args, **options):
+        bookings = options['bookings'] or SIZES.get(options['size'], SIZES['10k'])
+        if bookings < 1:
+            raise CommandError('--bookings must be at least 1.')
+
+        started = time.perf_counter()
+        inserted = seed_service.seed_bookings(
+            bookings,
+            patients=options['patients'],
+            users=options['users'],
+            history_days=options['history_days'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {inserted} bookings in {elapsed:.1f}s. '
+            f"Benchmark users are named bench<N> with password '{seed_service.DEMO_PASSWORD}'."
+        ))
@@ -0,0 +1,51 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from core import instrumentation
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, DB time, duplicate queries, template render time and
+    total latency for each request, grouped by URL name.
+
+    Queries are timed by the execute wrapper core.signals attaches to every
+    connection. Sampled responses carry the numbers in a Server-Timing
+    header; the aggregated rolling window is served by the request_metrics
+    view.
+
+    The middleware is async-capable, so under ASGI it does not force async
+    views back onto a thread. Template rendering is only timed (and the
+    template backend only patched) when REQUEST_METRICS_SAMPLE_RATE is above
+    0 as the middleware is loaded.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if instrumentation.enabled():
+            instrumentation.install_render_timer()
+
+    def finish(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.view_name if match else None) or 'unresolved'
+        instrumentation.finish_request(metrics, url_name)
+        if metrics is not None:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = instrumentation.start_request()
+        response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = instrumentation.start_request()
+        response = await self.get_response(request)
+        return self.finish(request, response, metrics)
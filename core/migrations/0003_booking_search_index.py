@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'core_booking_fts'
+TRIGRAM_TABLE = 'core_booking_trigram'
+COLUMNS = 'patient_name, contact, test_name, hospital, username'
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 search tables and index existing bookings (SQLite only)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{COLUMNS}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5("
+        f"{COLUMNS}, tokenize='trigram')"
+    )
+    for table in (FTS_TABLE, TRIGRAM_TABLE):
+        schema_editor.execute(
+            f"INSERT INTO {table} (rowid, {COLUMNS}) "
+            "SELECT b.id, p.name, p.contact, t.name, b.hospital, COALESCE(u.username, '') "
+            "FROM core_booking b "
+            "JOIN core_patient p ON p.id = b.patient_id "
+            "JOIN core_test t ON t.id = b.test_id "
+            "LEFT JOIN auth_user u ON u.id = b.user_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the FTS5 search tables."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TRIGRAM_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20251130_1236'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
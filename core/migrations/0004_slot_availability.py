@@ -0,0 +1,72 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:53
+
+import django.db.models.deletion
+from collections import Counter
+from datetime import date, time
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_occupancy(apps, schema_editor):
+    """Build the occupancy grid for upcoming bookings."""
+    Booking = apps.get_model('core', 'Booking')
+    SlotOccupancy = apps.get_model('core', 'SlotOccupancy')
+    step = getattr(settings, 'BOOKING_SLOT_MINUTES', 30)
+
+    def slot_start(value):
+        minutes = value.hour * 60 + value.minute
+        minutes -= minutes % step
+        return time(minutes // 60, minutes % 60)
+
+    counts = Counter(
+        (hospital, test_id, day, slot_start(booking_time))
+        for hospital, test_id, day, booking_time in Booking.objects.filter(
+            date__gte=date.today()
+        ).values_list('hospital', 'test_id', 'date', 'time')
+    )
+    SlotOccupancy.objects.bulk_create([
+        SlotOccupancy(hospital=hospital, test_id=test_id, date=day, time=slot, booked=booked)
+        for (hospital, test_id, day, slot), booked in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_booking_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital', models.CharField(max_length=200)),
+                ('capacity', models.PositiveIntegerField(default=1)),
+                ('test', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slot_capacities', to='core.test')),
+            ],
+            options={
+                'verbose_name_plural': 'slot capacities',
+                'ordering': ['hospital'],
+                'unique_together': {('hospital', 'test')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital', models.CharField(max_length=200)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_occupancy', to='core.test')),
+            ],
+            options={
+                'verbose_name_plural': 'slot occupancy',
+                'ordering': ['date', 'time'],
+                'unique_together': {('hospital', 'test', 'date', 'time')},
+            },
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_booking_access_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital', models.CharField(max_length=200)),
+                ('date', models.DateField()),
+                ('time', models.TimeField(help_text='Start of the requested slot')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Higher values are promoted first')),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('promoted', 'Promoted'), ('cancelled', 'Cancelled')], default='waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.booking')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='core.patient')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='core.test')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'waitlist entries',
+                'ordering': ['date', 'time', '-priority', 'created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['hospital', 'test', 'date', 'time', '-priority', 'created_at', 'id'], name='waitlist_queue_idx'), models.Index(fields=['user', 'status'], name='waitlist_user_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'waiting')), fields=('patient', 'test', 'date', 'time'), name='waitlist_one_waiting_per_patient')],
+            },
+        ),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:34
+
+import re
+from datetime import time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Min, When
+
+
+FTS_TABLES = ('core_booking_fts', 'core_booking_trigram')
+FTS_COLUMNS = 'patient_name, contact, test_name, hospital, username'
+BATCH_SIZE = 500
+
+
+def normalize_contact(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('254') and len(digits) == 12:
+        digits = '0' + digits[3:]
+    elif len(digits) == 9 and digits.startswith('7'):
+        digits = '0' + digits
+    return digits
+
+
+def batches(items):
+    items = list(items)
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def merge_duplicate_patients(apps, schema_editor):
+    """
+    Normalise contacts and merge patients sharing one into the oldest.
+
+    Bookings and waitlist entries are re-pointed with batched CASE updates.
+    A duplicate's booking for a slot its keeper already holds is deleted,
+    with the occupancy grid and search index adjusted to match.
+    """
+    Patient = apps.get_model('core', 'Patient')
+    Booking = apps.get_model('core', 'Booking')
+    WaitlistEntry = apps.get_model('core', 'WaitlistEntry')
+    SlotOccupancy = apps.get_model('core', 'SlotOccupancy')
+    step = getattr(settings, 'BOOKING_SLOT_MINUTES', 30)
+
+    changed = [
+        Patient(pk=pk, contact=normalize_contact(contact))
+        for pk, contact in Patient.objects.values_list('pk', 'contact').iterator(chunk_size=5000)
+        if normalize_contact(contact) != contact
+    ]
+    Patient.objects.bulk_update(changed, ['contact'], batch_size=BATCH_SIZE)
+
+    keepers = dict(
+        Patient.objects.values('contact').annotate(count=Count('pk'), keeper=Min('pk'))
+        .filter(count__gt=1).values_list('contact', 'keeper')
+    )
+    if not keepers:
+        return
+    remap = {
+        pk: keepers[contact]
+        for pk, contact in Patient.objects.filter(contact__in=keepers).values_list('pk', 'contact')
+        if pk != keepers[contact]
+    }
+
+    # Oldest booking of a (keeper, test, date, time) slot survives
+    seen, clashes = set(), []
+    for pk, patient_id, test_id, day, booking_time, hospital in (
+        Booking.objects.filter(patient_id__in=set(remap) | set(remap.values()))
+        .order_by('pk').values_list('pk', 'patient_id', 'test_id', 'date', 'time', 'hospital')
+    ):
+        slot = (remap.get(patient_id, patient_id), test_id, day, booking_time)
+        if slot in seen:
+            clashes.append((pk, hospital, test_id, day, booking_time))
+        seen.add(slot)
+    for pk, hospital, test_id, day, booking_time in clashes:
+        minutes = booking_time.hour * 60 + booking_time.minute
+        minutes -= minutes % step
+        SlotOccupancy.objects.filter(
+            hospital=hospital, test_id=test_id, date=day, time=time(minutes // 60, minutes % 60),
+        ).update(booked=F('booked') - 1)
+    for chunk in batches(pk for pk, *_ in clashes):
+        Booking.objects.filter(pk__in=chunk).delete()
+
+    # Only one waiting entry per patient, test and slot
+    seen, cancelled = set(), []
+    for pk, patient_id, test_id, day, slot in (
+        WaitlistEntry.objects.filter(patient_id__in=set(remap) | set(remap.values()), status='waiting')
+        .order_by('pk').values_list('pk', 'patient_id', 'test_id', 'date', 'time')
+    ):
+        key = (remap.get(patient_id, patient_id), test_id, day, slot)
+        if key in seen:
+            cancelled.append(pk)
+        seen.add(key)
+    for chunk in batches(cancelled):
+        WaitlistEntry.objects.filter(pk__in=chunk).update(status='cancelled')
+
+    moved = []
+    for chunk in batches(remap.items()):
+        duplicates = dict(chunk)
+        whens = [When(patient_id=duplicate, then=keeper) for duplicate, keeper in duplicates.items()]
+        moved.extend(Booking.objects.filter(patient_id__in=duplicates).values_list('pk', flat=True))
+        Booking.objects.filter(patient_id__in=duplicates).update(patient_id=Case(*whens))
+        WaitlistEntry.objects.filter(patient_id__in=duplicates).update(patient_id=Case(*whens))
+
+    for chunk in batches(remap):
+        Patient.objects.filter(pk__in=chunk).delete()
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for chunk in batches([pk for pk, *_ in clashes] + moved):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        for table in FTS_TABLES:
+            schema_editor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', chunk)
+    for chunk in batches(moved):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        for table in FTS_TABLES:
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, {FTS_COLUMNS}) "
+                "SELECT b.id, p.name, p.contact, t.name, b.hospital, COALESCE(u.username, '') "
+                "FROM core_booking b "
+                "JOIN core_patient p ON p.id = b.patient_id "
+                "JOIN core_test t ON t.id = b.test_id "
+                "LEFT JOIN auth_user u ON u.id = b.user_id "
+                f"WHERE b.id IN ({placeholders})",
+                chunk,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_job_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_patients, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_contact_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='patient',
+            constraint=models.UniqueConstraint(fields=('contact',), name='patient_contact_key'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_patient_contact_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('hospital', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='core.patient')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='core.test')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'archived bookings',
+                'ordering': ['-date', '-time'],
+                'indexes': [models.Index(fields=['user', 'date', 'time'], name='archive_user_date_time_idx'), models.Index(fields=['date', 'time'], name='archive_date_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:41
+
+import django.db.models.deletion
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_rollup(apps, schema_editor):
+    """Count upcoming bookings per day, hospital and test."""
+    Booking = apps.get_model('core', 'Booking')
+    DailyBookingRollup = apps.get_model('core', 'DailyBookingRollup')
+    groups = (
+        Booking.objects.filter(date__gte=date.today()).order_by()
+        .values_list('date', 'hospital', 'test_id').annotate(booked=Count('id'))
+    )
+    DailyBookingRollup.objects.bulk_create(
+        [
+            DailyBookingRollup(date=day, hospital=hospital, test_id=test_id, booked=booked)
+            for day, hospital, test_id, booked in groups
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_booking_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hospital', models.CharField(max_length=200)),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.test')),
+            ],
+            options={
+                'ordering': ['date', 'hospital'],
+                'unique_together': {('date', 'hospital', 'test')},
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
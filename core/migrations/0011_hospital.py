@@ -0,0 +1,235 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:02
+
+import re
+from collections import Counter, defaultdict
+from datetime import date, time
+
+import core.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+
+
+# Models whose hospital name becomes a Hospital foreign key
+MODELS = ('booking', 'bookingarchive', 'slotcapacity', 'slotoccupancy', 'dailybookingrollup', 'waitlistentry')
+
+# Strings per UPDATE ... CASE statement (SQLite bound-parameter limit)
+CHUNK_SIZE = 500
+
+FTS_TABLES = ('core_booking_fts', 'core_booking_trigram')
+FTS_COLUMNS = 'patient_name, contact, test_name, hospital, username'
+
+APOSTROPHES = re.compile(r"['’`]")
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def canonical_name(name):
+    # Frozen copy of hospital_service.canonical_name
+    return ' '.join(PUNCTUATION.sub(' ', APOSTROPHES.sub('', name)).casefold().split())
+
+
+def canonicalise_hospitals(apps, schema_editor):
+    """
+    Create one Hospital per spelling family and point every row at it.
+
+    A family is all strings with the same canonical key; the Hospital is
+    named after its most used spelling. Each table is then updated with one
+    CASE statement per CHUNK_SIZE distinct strings. The occupancy grid and
+    daily rollup are derived data: they are emptied here and recounted once
+    the new keys are in place.
+    """
+    Hospital = apps.get_model('core', 'Hospital')
+    apps.get_model('core', 'SlotOccupancy').objects.all().delete()
+    apps.get_model('core', 'DailyBookingRollup').objects.all().delete()
+    mapped = [apps.get_model('core', name) for name in ('Booking', 'BookingArchive', 'SlotCapacity', 'WaitlistEntry')]
+
+    usage = Counter()
+    for model in mapped:
+        for hospital, count in model.objects.order_by().values_list('hospital').annotate(count=Count('id')):
+            usage[hospital] += count
+
+    families = defaultdict(Counter)
+    for hospital, count in usage.items():
+        families[canonical_name(hospital)][' '.join(hospital.split())] += count
+    Hospital.objects.bulk_create(
+        [
+            Hospital(key=key, name=min(spellings, key=lambda name: (-spellings[name], name)))
+            for key, spellings in families.items()
+        ],
+        batch_size=1000,
+    )
+    ids = dict(Hospital.objects.values_list('key', 'id'))
+    strings = sorted(usage)
+    for model in mapped:
+        for start in range(0, len(strings), CHUNK_SIZE):
+            chunk = strings[start:start + CHUNK_SIZE]
+            model.objects.filter(hospital__in=chunk).update(hospital_ref=Case(
+                *[When(hospital=hospital, then=Value(ids[canonical_name(hospital)])) for hospital in chunk],
+            ))
+
+    # Merged spellings may now hold several capacities; the largest one stays
+    SlotCapacity = apps.get_model('core', 'SlotCapacity')
+    seen = set()
+    for pk, hospital_id, test_id in SlotCapacity.objects.order_by('-capacity', 'id').values_list(
+        'id', 'hospital_ref_id', 'test_id',
+    ):
+        if (hospital_id, test_id) in seen:
+            SlotCapacity.objects.filter(pk=pk).delete()
+        seen.add((hospital_id, test_id))
+
+
+def recount_derived_tables(apps, schema_editor):
+    """Rebuild the occupancy grid and daily rollup of upcoming bookings on the hospital ids."""
+    Booking = apps.get_model('core', 'Booking')
+    SlotOccupancy = apps.get_model('core', 'SlotOccupancy')
+    DailyBookingRollup = apps.get_model('core', 'DailyBookingRollup')
+    upcoming = Booking.objects.filter(date__gte=date.today()).order_by()
+    step = getattr(settings, 'BOOKING_SLOT_MINUTES', 30)
+
+    def slot_start(value):
+        minutes = value.hour * 60 + value.minute
+        minutes -= minutes % step
+        return time(minutes // 60, minutes % 60)
+
+    counts = Counter(
+        (hospital_id, test_id, day, slot_start(booking_time))
+        for hospital_id, test_id, day, booking_time in upcoming.values_list('hospital_id', 'test_id', 'date', 'time')
+    )
+    SlotOccupancy.objects.bulk_create(
+        [
+            SlotOccupancy(hospital_id=hospital_id, test_id=test_id, date=day, time=slot, booked=booked)
+            for (hospital_id, test_id, day, slot), booked in counts.items()
+        ],
+        batch_size=1000,
+    )
+    DailyBookingRollup.objects.bulk_create(
+        [
+            DailyBookingRollup(date=day, hospital_id=hospital_id, test_id=test_id, booked=booked)
+            for day, hospital_id, test_id, booked in upcoming.values_list(
+                'date', 'hospital_id', 'test_id',
+            ).annotate(booked=Count('id'))
+        ],
+        batch_size=1000,
+    )
+
+
+def reindex_renamed_bookings(apps, schema_editor):
+    """Re-index the bookings whose hospital spelling was merged into another name."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT f.rowid FROM core_booking_fts f "
+            "JOIN core_booking b ON b.id = f.rowid "
+            "JOIN core_hospital h ON h.id = b.hospital_id "
+            "WHERE f.hospital != h.name"
+        )
+        renamed = [row[0] for row in cursor.fetchall()]
+    for start in range(0, len(renamed), CHUNK_SIZE):
+        chunk = renamed[start:start + CHUNK_SIZE]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        for table in FTS_TABLES:
+            schema_editor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', chunk)
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, {FTS_COLUMNS}) "
+                "SELECT b.id, p.name, p.contact, t.name, h.name, COALESCE(u.username, '') "
+                "FROM core_booking b "
+                "JOIN core_patient p ON p.id = b.patient_id "
+                "JOIN core_test t ON t.id = b.test_id "
+                "JOIN core_hospital h ON h.id = b.hospital_id "
+                "LEFT JOIN auth_user u ON u.id = b.user_id "
+                f"WHERE b.id IN ({placeholders})",
+                chunk,
+            )
+
+
+def hospital_ref(related_name, on_delete):
+    return core.models.HospitalForeignKey(
+        null=True, on_delete=on_delete, related_name=related_name, to='core.hospital',
+    )
+
+
+RELATED = {
+    'booking': ('bookings', django.db.models.deletion.PROTECT),
+    'bookingarchive': ('archived_bookings', django.db.models.deletion.PROTECT),
+    'slotcapacity': ('slot_capacities', django.db.models.deletion.CASCADE),
+    'slotoccupancy': ('slot_occupancy', django.db.models.deletion.CASCADE),
+    'dailybookingrollup': ('daily_rollups', django.db.models.deletion.CASCADE),
+    'waitlistentry': ('waitlist_entries', django.db.models.deletion.PROTECT),
+}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_daily_booking_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hospital',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('key', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='hospital_ref',
+                field=hospital_ref(f'{model_name}_hospital_ref+', django.db.models.deletion.SET_NULL),
+            )
+            for model_name in MODELS
+        ],
+        migrations.RunPython(canonicalise_hospitals, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(name='slotcapacity', unique_together=set()),
+        migrations.AlterUniqueTogether(name='slotoccupancy', unique_together=set()),
+        migrations.AlterUniqueTogether(name='dailybookingrollup', unique_together=set()),
+        migrations.RemoveIndex(model_name='booking', name='booking_hospital_test_date_idx'),
+        migrations.RemoveIndex(model_name='waitlistentry', name='waitlist_queue_idx'),
+        *[migrations.RemoveField(model_name=model_name, name='hospital') for model_name in MODELS],
+        *[
+            migrations.RenameField(model_name=model_name, old_name='hospital_ref', new_name='hospital')
+            for model_name in MODELS
+        ],
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='hospital',
+                field=core.models.HospitalForeignKey(
+                    on_delete=on_delete, related_name=related_name, to='core.hospital',
+                ),
+            )
+            for model_name, (related_name, on_delete) in RELATED.items()
+        ],
+        migrations.AlterModelOptions(
+            name='slotcapacity',
+            options={'ordering': ['hospital__name'], 'verbose_name_plural': 'slot capacities'},
+        ),
+        migrations.AlterModelOptions(
+            name='dailybookingrollup',
+            options={'ordering': ['date', 'hospital_id']},
+        ),
+        migrations.AlterUniqueTogether(name='slotcapacity', unique_together={('hospital', 'test')}),
+        migrations.AlterUniqueTogether(name='slotoccupancy', unique_together={('hospital', 'test', 'date', 'time')}),
+        migrations.AlterUniqueTogether(name='dailybookingrollup', unique_together={('date', 'hospital', 'test')}),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['hospital', 'test', 'date'], name='booking_hospital_test_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(
+                condition=models.Q(('status', 'waiting')),
+                fields=['hospital', 'test', 'date', 'time', '-priority', 'created_at', 'id'],
+                name='waitlist_queue_idx',
+            ),
+        ),
+        migrations.RunPython(recount_derived_tables, migrations.RunPython.noop),
+        migrations.RunPython(reindex_renamed_bookings, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import User
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
 
 
 class Patient(models.Model):
@@ -20,6 +21,14 @@ class Patient(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Admin changelist order and date_hierarchy drill-down
+            models.Index(fields=['created_at'], name='patient_created_at_idx'),
+        ]
+        constraints = [
+            # Contacts are stored normalised (07XXXXXXXX) and identify the patient
+            models.UniqueConstraint(fields=['contact'], name='patient_contact_key'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.contact})"
@@ -36,6 +45,38 @@ class Test(models.Model):
         return self.name
 
 
+class Hospital(models.Model):
+    """Hospital bookings are made at; spelling variants share one row (see hospital_service)."""
+    name = models.CharField(max_length=200)
+    # Case-, spacing- and punctuation-insensitive form of the name
+    key = models.CharField(max_length=200, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class HospitalDescriptor(ForwardManyToOneDescriptor):
+    """Loads the related hospital from the in-process hospital cache instead of the database."""
+
+    def get_object(self, instance):
+        from core.services import hospital_service
+        hospital = hospital_service.get_hospital(getattr(instance, self.field.attname))
+        return hospital if hospital is not None else super().get_object(instance)
+
+
+class HospitalForeignKey(models.ForeignKey):
+    """
+    ForeignKey to Hospital whose objects come from the interned hospital cache.
+
+    Pages list many bookings of a handful of hospitals, so showing the
+    hospital name needs neither a join nor a query per row.
+    """
+    forward_related_accessor_class = HospitalDescriptor
+
+
 class Booking(models.Model):
     """Model to store booking information."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings', null=True, blank=True)
@@ -43,12 +84,190 @@ class Booking(models.Model):
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='bookings')
     date = models.DateField()
     time = models.TimeField()
-    hospital = models.CharField(max_length=200)
+    hospital = HospitalForeignKey(Hospital, on_delete=models.PROTECT, related_name='bookings')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Raised on every change of patient, test, date, time or hospital; keys the notifications
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ['-date', '-time']
         unique_together = [('patient', 'test', 'date', 'time')]
+        indexes = [
+            # User listings/dashboards: filter by user, keyset order on (date, time, id)
+            models.Index(fields=['user', 'date', 'time'], name='booking_user_date_time_idx'),
+            # Admin listings, date_hierarchy and date-range filters
+            models.Index(fields=['date', 'time'], name='booking_date_time_idx'),
+            # Per-hospital filters and covering index for the statistics group-by
+            models.Index(fields=['hospital', 'test', 'date'], name='booking_hospital_test_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.name} - {self.test.name} on {self.date} at {self.time}"
+
+
+class BookingArchive(models.Model):
+    """Past booking moved out of the Booking table by the archive_bookings command."""
+    # Keeps the id the booking had, so links and exports stay stable
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings', null=True, blank=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_bookings')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='archived_bookings')
+    date = models.DateField()
+    time = models.TimeField()
+    hospital = HospitalForeignKey(Hospital, on_delete=models.PROTECT, related_name='archived_bookings')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-time']
+        verbose_name_plural = 'archived bookings'
+        indexes = [
+            models.Index(fields=['user', 'date', 'time'], name='archive_user_date_time_idx'),
+            models.Index(fields=['date', 'time'], name='archive_date_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.name} - {self.test.name} on {self.date} at {self.time} (archived)"
+
+
+class SlotCapacity(models.Model):
+    """Number of bookings a hospital can take per time slot, optionally per test."""
+    hospital = HospitalForeignKey(Hospital, on_delete=models.CASCADE, related_name='slot_capacities')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='slot_capacities', null=True, blank=True)
+    capacity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ['hospital__name']
+        unique_together = [('hospital', 'test')]
+        verbose_name_plural = 'slot capacities'
+
+    def __str__(self):
+        test_name = self.test.name if self.test_id else 'all tests'
+        return f"{self.hospital} - {test_name}: {self.capacity} per slot"
+
+
+class SlotOccupancy(models.Model):
+    """Precomputed number of bookings per hospital, test, date and time slot."""
+    hospital = HospitalForeignKey(Hospital, on_delete=models.CASCADE, related_name='slot_occupancy')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='slot_occupancy')
+    date = models.DateField()
+    time = models.TimeField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'time']
+        unique_together = [('hospital', 'test', 'date', 'time')]
+        verbose_name_plural = 'slot occupancy'
+
+    def __str__(self):
+        return f"{self.hospital} - {self.test_id} on {self.date} at {self.time}: {self.booked}"
+
+
+class DailyBookingRollup(models.Model):
+    """Precomputed number of bookings per day, hospital and test (the staff heatmap)."""
+    date = models.DateField()
+    hospital = HospitalForeignKey(Hospital, on_delete=models.CASCADE, related_name='daily_rollups')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='daily_rollups')
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'hospital_id']
+        # Date first: the heatmap reads a date range
+        unique_together = [('date', 'hospital', 'test')]
+
+    def __str__(self):
+        return f"{self.hospital} - {self.test_id} on {self.date}: {self.booked}"
+
+
+class WaitlistEntry(models.Model):
+    """A request to be booked into a full slot as soon as a place frees up."""
+    WAITING = 'waiting'
+    PROMOTED = 'promoted'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (PROMOTED, 'Promoted'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries', null=True, blank=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='waitlist_entries')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='waitlist_entries')
+    hospital = HospitalForeignKey(Hospital, on_delete=models.PROTECT, related_name='waitlist_entries')
+    date = models.DateField()
+    time = models.TimeField(help_text='Start of the requested slot')
+    priority = models.SmallIntegerField(default=0, help_text='Higher values are promoted first')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['date', 'time', '-priority', 'created_at']
+        verbose_name_plural = 'waitlist entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'test', 'date', 'time'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_one_waiting_per_patient',
+            ),
+        ]
+        indexes = [
+            # Queue per slot: the head is the first row of this partial index
+            models.Index(
+                fields=['hospital', 'test', 'date', 'time', '-priority', 'created_at', 'id'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_queue_idx',
+            ),
+            models.Index(fields=['user', 'status'], name='waitlist_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.name} waiting for {self.test.name} on {self.date} at {self.time}"
+
+
+class Job(models.Model):
+    """Background job stored in the database queue (see core.services.job_service)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(help_text='Not picked up before this time (retry backoff)')
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            # Workers claim the oldest due jobs of a kind
+            models.Index(
+                fields=['kind', 'run_at', 'id'],
+                condition=models.Q(status='queued'),
+                name='job_due_idx',
+            ),
+            # Stale-lock recovery
+            models.Index(
+                fields=['locked_at'],
+                condition=models.Q(status='running'),
+                name='job_running_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,75 @@
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = 'replica'
+
+# True while a read-only view is running
+_use_replica = ContextVar('use_read_replica', default=False)
+
+
+def replica_available():
+    """
+    True if a separate read-only alias is configured.
+
+    Under the test runner the replica is a mirror of the default test
+    database; reads then stay on default so they see the test transaction.
+    """
+    if REPLICA_DB_ALIAS not in connections.settings:
+        return False
+    replica = connections.settings[REPLICA_DB_ALIAS]['NAME']
+    return replica != connections.settings[DEFAULT_DB_ALIAS]['NAME']
+
+
+def read_replica(view):
+    """Routes the ORM reads of a view that never writes to the read-only alias."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads inside read_replica views to the replica; everything else uses default.
+
+    Reads inside a transaction on default stay there, so they see its
+    uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get() and replica_available()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,218 @@
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Reasons a write is shed
+USER_RATE = 'user_rate'
+GLOBAL_RATE = 'global_rate'
+IN_FLIGHT = 'in_flight'
+REASONS = (USER_RATE, GLOBAL_RATE, IN_FLIGHT)
+
+GLOBAL_KEY = 'admission:global'
+
+# Process-wide state: writes currently running, and the counters exported
+# by the request_metrics view
+_lock = threading.Lock()
+_slot_freed = threading.Condition(_lock)
+_in_flight = 0
+_peak_in_flight = 0
+_counters = Counter()
+
+
+@dataclass
+class Decision:
+    """Outcome of admit(): whether the write may run, and if not why and when to retry."""
+    admitted: bool
+    reason: str = None
+    retry_after: float = 0.0
+    # An in-flight slot is held and must be given back with release()
+    held: bool = False
+
+    @property
+    def retry_after_seconds(self):
+        """retry_after rounded up to whole seconds, as sent in the Retry-After header."""
+        return max(1, math.ceil(self.retry_after))
+
+
+def is_enabled():
+    return getattr(settings, 'ADMISSION_CONTROL_ENABLED', True)
+
+
+def get_cache():
+    return caches[getattr(settings, 'ADMISSION_CACHE', 'default')]
+
+
+def user_key(user_id):
+    return f'admission:user:{user_id}'
+
+
+def take_token(key, rate, burst, now=None):
+    """
+    Takes one token from a token bucket held in the cache.
+
+    The bucket is stored in its GCRA form, as a single integer: the time
+    (ms) at which it would be full again. Taking a token pushes that time
+    one refill interval further, with the cache's atomic incr(), so
+    processes sharing the cache draw from the same bucket without a lock.
+    A token is available while the time stays within `burst` intervals of
+    now. The key expires once the bucket is full, so idle users cost no
+    cache space. Two requests refilling the same idle bucket at once can
+    both be admitted; that is the only over-admission.
+
+    Args:
+        key: Cache key of the bucket
+        rate: Tokens refilled per second
+        burst: Bucket size (requests admitted at once after a quiet period)
+        now: Current time in seconds (defaults to time.time())
+
+    Returns:
+        float: 0 if a token was taken, else the seconds until one is available
+    """
+    cache = get_cache()
+    interval = max(1, round(1000 / rate))
+    window = interval * burst
+    timeout = math.ceil(window / 1000) + 1
+    now = round((time.time() if now is None else now) * 1000)
+
+    if cache.add(key, now + interval, timeout):
+        return 0
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        # Expired between add() and incr(): the bucket was full
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - interval < now:
+        # Idle bucket whose key has not expired yet: restart it from now
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - now > window:
+        cache.decr(key, interval)
+        return (full_at - now - window) / 1000
+    cache.touch(key, timeout)
+    return 0
+
+
+def return_token(key, rate):
+    """Gives back a token taken with take_token() for a write that was not run."""
+    try:
+        get_cache().decr(key, max(1, round(1000 / rate)))
+    except ValueError:
+        pass
+
+
+def admit(user_id):
+    """
+    Decides whether a booking write may run now.
+
+    Checks, in order, the user's token bucket, the global token bucket and
+    the number of writes in flight in this process. Only the in-flight cap
+    waits, for at most ADMISSION_MAX_WAIT seconds: a write over any limit
+    is refused with the time after which a retry can succeed, and tokens
+    already taken for it are returned.
+
+    Args:
+        user_id: Primary key of the user writing
+
+    Returns:
+        Decision: Admitted decisions with held=True must be passed to release()
+    """
+    if not is_enabled():
+        return Decision(admitted=True)
+
+    user_rate = getattr(settings, 'ADMISSION_USER_RATE', 5)
+    global_rate = getattr(settings, 'ADMISSION_GLOBAL_RATE', 50)
+    wait = take_token(user_key(user_id), user_rate, getattr(settings, 'ADMISSION_USER_BURST', 20))
+    if wait:
+        return _reject(USER_RATE, wait)
+    wait = take_token(GLOBAL_KEY, global_rate, getattr(settings, 'ADMISSION_GLOBAL_BURST', 100))
+    if wait:
+        return_token(user_key(user_id), user_rate)
+        return _reject(GLOBAL_RATE, wait)
+
+    global _in_flight, _peak_in_flight
+    limit = getattr(settings, 'ADMISSION_MAX_IN_FLIGHT', 2)
+    deadline = time.monotonic() + getattr(settings, 'ADMISSION_MAX_WAIT', 0.5)
+    with _slot_freed:
+        while _in_flight >= limit and _slot_freed.wait(max(0, deadline - time.monotonic())):
+            pass
+        if _in_flight >= limit:
+            _counters[f'rejected_{IN_FLIGHT}'] += 1
+            admitted = False
+        else:
+            _in_flight += 1
+            _peak_in_flight = max(_peak_in_flight, _in_flight)
+            _counters['admitted'] += 1
+            admitted = True
+    if not admitted:
+        return_token(user_key(user_id), user_rate)
+        return_token(GLOBAL_KEY, global_rate)
+        # Writes take milliseconds, so a slot frees up almost at once
+        return Decision(admitted=False, reason=IN_FLIGHT, retry_after=1)
+    return Decision(admitted=True, held=True)
+
+
+def release(decision):
+    """Ends a write admitted by admit()."""
+    global _in_flight
+    if decision.held:
+        with _slot_freed:
+            _in_flight -= 1
+            _slot_freed.notify()
+
+
+def _reject(reason, wait):
+    with _lock:
+        _counters[f'rejected_{reason}'] += 1
+    return Decision(admitted=False, reason=reason, retry_after=wait)
+
+
+def snapshot():
+    """
+    Returns this process's admission counters.
+
+    Returns:
+        dict: {enabled, admitted, rejected: {reason: count}, in_flight, peak_in_flight, max_in_flight}
+    """
+    with _lock:
+        return {
+            'enabled': is_enabled(),
+            'admitted': _counters['admitted'],
+            'rejected': {reason: _counters[f'rejected_{reason}'] for reason in REASONS},
+            'in_flight': _in_flight,
+            'peak_in_flight': _peak_in_flight,
+            'max_in_flight': getattr(settings, 'ADMISSION_MAX_IN_FLIGHT', 2),
+        }
+
+
+def prometheus_text(summary=None):
+    """Renders the admission counters in the Prometheus text exposition format."""
+    summary = snapshot() if summary is None else summary
+    lines = [
+        '# TYPE hbs_admission_admitted_total counter',
+        f'hbs_admission_admitted_total {summary["admitted"]}',
+        '# TYPE hbs_admission_rejected_total counter',
+    ]
+    for reason, count in summary['rejected'].items():
+        lines.append(f'hbs_admission_rejected_total{{reason="{reason}"}} {count}')
+    lines += [
+        '# TYPE hbs_admission_in_flight gauge',
+        f'hbs_admission_in_flight {summary["in_flight"]}',
+        '# TYPE hbs_admission_peak_in_flight gauge',
+        f'hbs_admission_peak_in_flight {summary["peak_in_flight"]}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clears the counters (used by the load test between runs)."""
+    global _peak_in_flight
+    with _lock:
+        _counters.clear()
+        _peak_in_flight = _in_flight
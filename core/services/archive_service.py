@@ -0,0 +1,164 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from core.models import Booking, BookingArchive, DailyBookingRollup
+from core.services import availability_service, page_cache_service, search_service
+from core.services.booking_service import delete_bookings
+
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'patient_id', 'test_id', 'date', 'time', 'hospital_id', 'created_at')
+
+
+def get_archive_horizon(today=None):
+    """
+    Returns the first booking date that stays in the Booking table.
+
+    Bookings before it are archived; set with BOOKING_ARCHIVE_AFTER_DAYS.
+    """
+    today = today or date.today()
+    return today - timedelta(days=getattr(settings, 'BOOKING_ARCHIVE_AFTER_DAYS', 365))
+
+
+def newest_archived_date():
+    """
+    Returns the date of the latest archived booking, or None if the archive is empty.
+
+    A single seek on archive_date_time_idx; it is not cached because the
+    archive command runs in another process.
+    """
+    return BookingArchive.objects.aggregate(newest=Max('date'))['newest']
+
+
+def reaches_archive(date_from=None):
+    """
+    True if a date range starting at date_from may contain archived bookings.
+
+    Args:
+        date_from: First date of the range, or None for an open range
+    """
+    newest = newest_archived_date()
+    return newest is not None and (date_from is None or date_from <= newest)
+
+
+def booking_rows(fields, date_from=None, date_to=None, search_query='', **filters):
+    """
+    Returns value rows of the bookings in a date range, archive included.
+
+    The Booking table is queried alone unless the range starts before the
+    newest archived booking; only then is BookingArchive UNIONed in, so
+    listings of recent bookings never touch the archive.
+
+    Args:
+        fields: values_list() field names; must include id, date and time
+        date_from: Optional first booking date to include
+        date_to: Optional last booking date to include
+        search_query: Optional free-text filter
+        **filters: Further filters valid on both tables (e.g. user=...)
+
+    Returns:
+        QuerySet: Tuples of the fields, newest booking first
+    """
+    ordering = ('-date', '-time', '-id')
+    querysets = [Booking.objects.filter(**filters)]
+    if reaches_archive(date_from):
+        querysets.append(BookingArchive.objects.filter(**filters))
+
+    rows = []
+    for queryset in querysets:
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        if search_query:
+            if queryset.model is Booking:
+                queryset = search_service.filter_bookings(queryset, search_query)
+            else:
+                queryset = search_service.contains_filter(queryset, search_query)
+        rows.append(queryset.values_list(*fields))
+
+    if len(rows) == 1:
+        return rows[0].order_by(*ordering)
+    return rows[0].order_by().union(rows[1].order_by(), all=True).order_by(*ordering)
+
+
+def archived_counts(user_id=None):
+    """
+    Returns archived booking counts as {(test id, hospital id): count}.
+
+    The archive only grows when bookings are archived, which moves its
+    newest date forward, so the grouped query is cached per newest date
+    and user rather than rerun with every statistics refresh.
+
+    Args:
+        user_id: Restrict to this user's bookings, or None for all
+    """
+    newest = newest_archived_date()
+    if newest is None:
+        return Counter()
+    key = f"booking_archive:counts:{newest.isoformat()}:{user_id or 'all'}"
+    counts = cache.get(key)
+    if counts is None:
+        queryset = BookingArchive.objects.order_by()
+        if user_id is not None:
+            queryset = queryset.filter(user_id=user_id)
+        counts = Counter({
+            (test_id, hospital_id): count
+            for test_id, hospital_id, count in queryset.values_list('test_id', 'hospital_id')
+            .annotate(count=Count('id'))
+        })
+        cache.set(key, counts, getattr(settings, 'BOOKING_STATS_TIMEOUT', 300))
+    return counts
+
+
+def archive_bookings(before=None, batch_size=None, progress=None):
+    """
+    Moves bookings dated before a cutoff into BookingArchive.
+
+    Each batch is copied and deleted in its own transaction, oldest first,
+    so the job can be interrupted and resumed and writers are only blocked
+    for one batch at a time. Bookings are deleted with plain SQL rather than
+    one ORM delete (and signal round) per row; the search index and page
+    caches are updated once per batch instead. Statistics
+    count archived bookings too, so they are unchanged. The daily rollup
+    rows of archived days, and the occupancy rows of every past day, are
+    dropped at the end.
+
+    Args:
+        before: Cutoff date (defaults to get_archive_horizon())
+        batch_size: Bookings per transaction (defaults to BOOKING_ARCHIVE_BATCH_SIZE)
+        progress: Optional callable receiving the running total after each batch
+
+    Returns:
+        int: Number of bookings archived
+    """
+    before = before or get_archive_horizon()
+    batch_size = batch_size or getattr(settings, 'BOOKING_ARCHIVE_BATCH_SIZE', 1000)
+    queryset = Booking.objects.filter(date__lt=before).order_by('date', 'time', 'id')
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.values_list(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            BookingArchive.objects.bulk_create(
+                [BookingArchive(**dict(zip(ARCHIVE_FIELDS, row))) for row in rows]
+            )
+            delete_bookings(ids)
+            search_service.remove_bookings(ids)
+
+            user_ids = {row[1] for row in rows}
+            transaction.on_commit(lambda user_ids=user_ids: page_cache_service.bump(user_ids))
+        total += len(rows)
+        if progress:
+            progress(total)
+
+    availability_service.prune_occupancy()
+    if total:
+        DailyBookingRollup.objects.filter(date__lt=before).delete()
+    return total
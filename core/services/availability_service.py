@@ -0,0 +1,325 @@
+import asyncio
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+
+from core.models import Booking, SlotCapacity, SlotOccupancy
+
+
+# Bookings are accepted up to this many days ahead (see validate_booking_date)
+BOOKING_WINDOW_DAYS = 30
+
+
+def get_slot_minutes():
+    return getattr(settings, 'BOOKING_SLOT_MINUTES', 30)
+
+
+def slot_times():
+    """
+    Returns the start time of every bookable slot in a day.
+
+    Returns:
+        list: time objects from BOOKING_SLOT_START up to BOOKING_SLOT_END
+    """
+    start = time.fromisoformat(getattr(settings, 'BOOKING_SLOT_START', '08:00'))
+    end = time.fromisoformat(getattr(settings, 'BOOKING_SLOT_END', '17:00'))
+    step = timedelta(minutes=get_slot_minutes())
+    current = datetime.combine(date.min, start)
+    last = datetime.combine(date.min, end)
+    times = []
+    while current < last:
+        times.append(current.time())
+        current += step
+    return times
+
+
+def slot_start(value):
+    """
+    Floors a booking time to the start of its slot.
+
+    Args:
+        value: time object
+
+    Returns:
+        time: Start of the slot containing value
+    """
+    minutes = value.hour * 60 + value.minute
+    minutes -= minutes % get_slot_minutes()
+    return time(minutes // 60, minutes % 60)
+
+
+def get_capacity(hospital_id, test):
+    """
+    Returns how many bookings a hospital takes per slot for a test.
+
+    A SlotCapacity row for the specific test wins over a hospital-wide row;
+    without either, BOOKING_SLOT_CAPACITY is used (None by default: no limit).
+
+    Args:
+        hospital_id: Hospital primary key
+        test: Test instance or id
+
+    Returns:
+        int or None: Bookings allowed per slot, None if unlimited
+    """
+    test_id = getattr(test, 'pk', test)
+    return _pick_capacity(dict(_capacity_queryset(hospital_id, test_id)), test_id)
+
+
+def get_capacities(pairs):
+    """
+    Returns the per-slot capacity of many (hospital id, test id) pairs with one query.
+
+    Args:
+        pairs: Iterable of (hospital_id, test_id) tuples
+
+    Returns:
+        dict: {(hospital_id, test_id): bookings allowed per slot, or None if unlimited}
+    """
+    pairs = set(pairs)
+    rows = defaultdict(dict)
+    for hospital_id, test_id, capacity in SlotCapacity.objects.filter(
+        hospital_id__in={hospital_id for hospital_id, _ in pairs}
+    ).values_list('hospital_id', 'test_id', 'capacity'):
+        rows[hospital_id][test_id] = capacity
+    return {
+        (hospital_id, test_id): _pick_capacity(rows[hospital_id], test_id) for hospital_id, test_id in pairs
+    }
+
+
+def _capacity_queryset(hospital_id, test_id):
+    return (
+        SlotCapacity.objects.filter(hospital_id=hospital_id)
+        .filter(Q(test_id=test_id) | Q(test__isnull=True))
+        .values_list('test_id', 'capacity')
+    )
+
+
+def _pick_capacity(rows, test_id):
+    if test_id in rows:
+        return rows[test_id]
+    if None in rows:
+        return rows[None]
+    return getattr(settings, 'BOOKING_SLOT_CAPACITY', None)
+
+
+def is_full(booked, capacity):
+    """Whether a slot holding `booked` bookings has no place left (a None capacity never fills)."""
+    return capacity is not None and booked >= capacity
+
+
+def slot_usage(hospital_id, test_id, day, booking_time):
+    """
+    Returns how full the slot containing booking_time is.
+
+    Args:
+        hospital_id: Hospital primary key
+        test_id: Test primary key
+        day: Booking date
+        booking_time: Booking time (floored to its slot)
+
+    Returns:
+        tuple: (bookings in the slot, bookings allowed per slot or None if unlimited)
+    """
+    booked = SlotOccupancy.objects.filter(
+        hospital_id=hospital_id, test_id=test_id, date=day, time=slot_start(booking_time),
+    ).values_list('booked', flat=True).first()
+    return booked or 0, get_capacity(hospital_id, test_id)
+
+
+def adjust_occupancy(hospital_id, test_id, day, booking_time, delta):
+    """
+    Adds delta to the occupancy counter of the slot containing booking_time.
+
+    Args:
+        hospital_id: Hospital primary key
+        test_id: Test primary key
+        day: Booking date
+        booking_time: Booking time (floored to its slot)
+        delta: +1 for a new booking, -1 for a removed one
+    """
+    key = {
+        'hospital_id': hospital_id,
+        'test_id': test_id,
+        'date': day,
+        'time': slot_start(booking_time),
+    }
+    if SlotOccupancy.objects.filter(**key).update(booked=F('booked') + delta):
+        return
+    if delta <= 0:
+        return
+    try:
+        with transaction.atomic():
+            SlotOccupancy.objects.create(booked=delta, **key)
+    except IntegrityError:
+        # Another writer created the row first
+        SlotOccupancy.objects.filter(**key).update(booked=F('booked') + delta)
+
+
+def adjust_occupancy_bulk(slots, delta=1):
+    """
+    Applies adjust_occupancy for many bookings with one batched statement.
+
+    Used after bulk_create/bulk deletes, which do not send model signals.
+
+    Args:
+        slots: Iterable of (hospital_id, test_id, date, time) tuples
+        delta: +1 for added bookings, -1 for removed ones
+    """
+    ops = connection.ops
+    counts = Counter(
+        (
+            hospital_id,
+            test_id,
+            ops.adapt_datefield_value(day),
+            ops.adapt_timefield_value(slot_start(booking_time)),
+        )
+        for hospital_id, test_id, day, booking_time in slots
+    )
+    if not counts:
+        return
+    table = SlotOccupancy._meta.db_table
+    with connection.cursor() as cursor:
+        if delta > 0:
+            cursor.executemany(
+                f'INSERT INTO {table} (hospital_id, test_id, date, time, booked) '
+                f'VALUES (%s, %s, %s, %s, %s) '
+                f'ON CONFLICT (hospital_id, test_id, date, time) '
+                f'DO UPDATE SET booked = {table}.booked + excluded.booked',
+                [(*key, delta * count) for key, count in counts.items()],
+            )
+        else:
+            cursor.executemany(
+                f'UPDATE {table} SET booked = booked + %s '
+                f'WHERE hospital_id = %s AND test_id = %s AND date = %s AND time = %s',
+                [(delta * count, *key) for key, count in counts.items()],
+            )
+
+
+def free_slots(test, hospital_id, days=BOOKING_WINDOW_DAYS, start=None):
+    """
+    Returns the free slots for a test at a hospital over the next few days.
+
+    Full slots are read from the occupancy grid with a single indexed range
+    query; the free ones are the complement of that set in the slot grid.
+
+    Args:
+        test: Test instance or id
+        hospital_id: Hospital primary key (None for an unknown hospital: nothing booked)
+        days: Number of days to look ahead (capped to the 30-day window)
+        start: First day to consider (defaults to today)
+
+    Returns:
+        dict: {date: [time, ...]} for every day in the window, in order
+    """
+    today, start, end = _window(days, start)
+    test_id = getattr(test, 'pk', test)
+
+    capacity = get_capacity(hospital_id, test_id)
+    full = set()
+    if capacity is not None:
+        full = set(
+            SlotOccupancy.objects.filter(
+                hospital_id=hospital_id,
+                test_id=test_id,
+                date__range=(start, end),
+                booked__gte=capacity,
+            ).values_list('date', 'time')
+        )
+    return _free_grid(today, start, end, full)
+
+
+async def afree_slots(test, hospital_id, days=BOOKING_WINDOW_DAYS, start=None):
+    """
+    Async version of free_slots.
+
+    The capacity rows and the occupancy range are read with the async ORM
+    (one after another, on the thread that owns the connection); full
+    slots are then picked out in Python.
+    """
+    today, start, end = _window(days, start)
+    test_id = getattr(test, 'pk', test)
+    occupancy = SlotOccupancy.objects.filter(
+        hospital_id=hospital_id, test_id=test_id, date__range=(start, end), booked__gt=0,
+    ).values_list('date', 'time', 'booked')
+
+    async def collect(queryset):
+        return [row async for row in queryset]
+
+    capacity_rows, occupied = await asyncio.gather(
+        collect(_capacity_queryset(hospital_id, test_id)), collect(occupancy)
+    )
+    capacity = _pick_capacity(dict(capacity_rows), test_id)
+    full = {(day, slot) for day, slot, booked in occupied if is_full(booked, capacity)}
+    return _free_grid(today, start, end, full)
+
+
+def _window(days, start):
+    """Clamps a lookahead to the booking window; returns (today, start, end)."""
+    today = date.today()
+    start = max(start or today, today)
+    days = max(1, min(int(days), BOOKING_WINDOW_DAYS + 1))
+    end = min(start + timedelta(days=days - 1), today + timedelta(days=BOOKING_WINDOW_DAYS))
+    return today, start, end
+
+
+def _free_grid(today, start, end, full):
+    """Returns {date: [free times]} from start to end, skipping full and past slots."""
+    times = slot_times()
+    now = datetime.now().time()
+    slots = {}
+    day = start
+    while day <= end:
+        slots[day] = [
+            slot for slot in times
+            if (day, slot) not in full and (day != today or slot > now)
+        ]
+        day += timedelta(days=1)
+    return slots
+
+
+def prune_occupancy(before=None):
+    """
+    Drops the occupancy rows of past days, which no booking path reads.
+
+    Args:
+        before: Rows dated before this day are deleted (defaults to today)
+
+    Returns:
+        int: Number of rows deleted
+    """
+    deleted, _ = SlotOccupancy.objects.filter(date__lt=before or date.today()).delete()
+    return deleted
+
+
+def rebuild_occupancy(start=None):
+    """
+    Recomputes the occupancy grid from the Booking table.
+
+    Args:
+        start: Only bookings on or after this date are counted (defaults to today)
+
+    Returns:
+        int: Number of occupied slots written
+    """
+    start = start or date.today()
+    counts = Counter(
+        (hospital_id, test_id, day, slot_start(booking_time))
+        for hospital_id, test_id, day, booking_time in Booking.objects.filter(date__gte=start)
+        .order_by()
+        .values_list('hospital_id', 'test_id', 'date', 'time')
+        .iterator(chunk_size=5000)
+    )
+    with transaction.atomic():
+        SlotOccupancy.objects.all().delete()
+        SlotOccupancy.objects.bulk_create(
+            [
+                SlotOccupancy(hospital_id=hospital_id, test_id=test_id, date=day, time=slot, booked=booked)
+                for (hospital_id, test_id, day, slot), booked in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
@@ -1,16 +1,46 @@
-from core.models import Booking
+from django.db import IntegrityError, connection, transaction
+
+from core.models import Booking, WaitlistEntry
+from core.services.availability_service import slot_start, slot_usage
+from core.services.hospital_service import resolve_hospital
+from core.services.patient_service import upsert_patient
+
+
+DUPLICATE_BOOKING_MESSAGE = (
+    'A booking already exists for this patient, test, date, and time combination. '
+    'Please choose a different time or date.'
+)
+
+SLOT_FULL_MESSAGE = (
+    'This time slot is fully booked for the selected test and hospital. '
+    'Please choose another time or join the waitlist.'
+)
+
+
+class DuplicateBookingError(Exception):
+    """Raised when a booking would violate the patient/test/date/time uniqueness."""
+
+    def __init__(self, message=DUPLICATE_BOOKING_MESSAGE):
+        super().__init__(message)
+
+
+class SlotFullError(Exception):
+    """Raised when a booking would exceed the capacity of its slot."""
+
+    def __init__(self, message=SLOT_FULL_MESSAGE):
+        super().__init__(message)
 
 
 def check_duplicate_booking(patient, test, date, time):
     """
     Checks if a booking already exists for the given patient, test, date, and time.
-    
+
     Args:
         patient: Patient instance
         test: Test instance
         date: Date object
         time: Time object
-    
+
     Returns:
         bool: True if duplicate booking exists, False otherwise
     """
@@ -21,3 +51,118 @@ def check_duplicate_booking(patient, test, date, time):
         time=time
     ).exists()
 
+
+def save_booking(*, patient_name, age, contact, test, date, time, hospital, user=None, booking=None):
+    """
+    Creates or updates a booking and its patient in one transaction.
+
+    The patient upsert and booking write either both commit or both roll
+    back. Duplicates are detected by the (patient, test, date, time) unique
+    constraint at insert time rather than by a separate lookup, so two
+    concurrent submissions cannot both succeed. Likewise the slot capacity is
+    checked against the occupancy grid after the write, inside the same
+    (BEGIN IMMEDIATE) transaction, so a slot is never overbooked.
+
+    Args:
+        patient_name: Patient name
+        age: Patient age
+        contact: Patient contact number
+        test: Test instance
+        date: Booking date
+        time: Booking time
+        hospital: Hospital instance or name (spelling variants resolve to one hospital)
+        user: User making the booking (kept unchanged if None)
+        booking: Existing Booking to update, or None to create a new one
+
+    Returns:
+        Booking: The saved booking
+
+    Raises:
+        DuplicateBookingError: If the slot is already booked for this patient and test
+        SlotFullError: If the slot has no places left
+    """
+    booking = booking if booking is not None else Booking()
+    creating = booking.pk is None
+    # Read from the stored row: a ModelForm has already copied the new
+    # values onto the instance
+    stored = None if creating else _stored_row(booking.pk)
+    previous = _row_slot(stored) if stored else None
+    try:
+        with transaction.atomic():
+            booking.patient = upsert_patient(patient_name, age, contact)
+            booking.test = test
+            booking.date = date
+            booking.time = time
+            booking.hospital = resolve_hospital(hospital)
+            if user is not None:
+                booking.user = user
+            if stored:
+                # A resubmitted, unchanged booking keeps its version (and so
+                # its notification keys): a retried request is not re-sent
+                changed = _row(booking) != stored[:-1]
+                booking.version = stored[-1] + 1 if changed else stored[-1]
+            booking.save()
+            # Keeping its slot never fails, even if the slot was overbooked before
+            if _slot(booking) != previous:
+                booked, capacity = slot_usage(*_slot(booking))
+                if capacity is not None and booked > capacity:
+                    raise SlotFullError()
+    except IntegrityError as exc:
+        _forget_insert(booking, creating)
+        raise DuplicateBookingError() from exc
+    except SlotFullError:
+        _forget_insert(booking, creating)
+        raise
+    return booking
+
+
+def _forget_insert(booking, creating):
+    # The INSERT was rolled back, so a later save() must insert again
+    if creating:
+        booking.pk = None
+        booking._state.adding = True
+
+
+def delete_bookings(ids, chunk_size=5000):
+    """
+    Deletes bookings by id with plain DELETE statements.
+
+    No model instances are loaded and no signals are sent, so callers must
+    update the derived tables (search index, occupancy grid, daily rollup,
+    caches) themselves. Waitlist entries pointing at the bookings are
+    unlinked first, as on_delete=SET_NULL would.
+
+    Args:
+        ids: Booking ids
+        chunk_size: Ids per statement (SQLite bound-parameter limit)
+    """
+    ids = list(ids)
+    table = Booking._meta.db_table
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        WaitlistEntry.objects.filter(booking_id__in=chunk).update(booking=None)
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', chunk)
+
+
+# Fields whose change raises Booking.version
+VERSIONED_FIELDS = ('hospital_id', 'test_id', 'date', 'time', 'patient_id')
+
+
+def _slot(booking):
+    return (booking.hospital_id, booking.test_id, booking.date, slot_start(booking.time))
+
+
+def _row(booking):
+    return tuple(getattr(booking, field) for field in VERSIONED_FIELDS)
+
+
+def _row_slot(row):
+    hospital_id, test_id, day, booking_time = row[:4]
+    return (hospital_id, test_id, day, slot_start(booking_time))
+
+
+def _stored_row(pk):
+    """The stored VERSIONED_FIELDS values of a booking, then its version (None if it is gone)."""
+    return Booking.objects.filter(pk=pk).values_list(*VERSIONED_FIELDS, 'version').first()
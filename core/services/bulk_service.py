@@ -0,0 +1,307 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Booking, SlotOccupancy
+from core.services import (
+    availability_service, catalogue_service, hospital_service, notification_service, page_cache_service,
+    rollup_service, search_service, stats_service, waitlist_service,
+)
+from core.services.availability_service import get_capacities, is_full, slot_start
+from core.services.booking_service import delete_bookings
+from core.services.export_service import Echo
+from core.validators import validate_booking_date
+
+
+RESCHEDULE = 'reschedule'
+REASSIGN = 'reassign'
+CANCEL = 'cancel'
+ACTIONS = (RESCHEDULE, REASSIGN, CANCEL)
+
+# Why a booking was left unchanged
+SKIPPED_PAST = 'past'
+SKIPPED_WINDOW = 'outside booking window'
+SKIPPED_DUPLICATE = 'duplicate'
+SKIPPED_FULL = 'full'
+
+ROW_FIELDS = ('id', 'user_id', 'patient_id', 'patient__name', 'test_id', 'date', 'time', 'hospital_id')
+
+# Ids per UPDATE statement (SQLite bound-parameter limit)
+CHUNK_SIZE = 5000
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk action, one entry per selected booking."""
+    action: str
+    rows: list
+    targets: dict = field(default_factory=dict)
+    skipped: dict = field(default_factory=dict)
+
+    @property
+    def applied(self):
+        return len(self.rows) - len(self.skipped)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _key(row, day):
+    # (patient, test, date, time): the Booking unique_together key
+    return (row[2], row[4], day, row[6])
+
+
+def _slot(row, hospital_id, day):
+    return (hospital_id, row[4], day, slot_start(row[6]))
+
+
+def plan_moves(rows, targets, today=None):
+    """
+    Decides which bookings can move to their target hospital and date.
+
+    Everything is checked set-wise: one query for bookings outside the
+    selection holding the target (patient, test, date, time) keys, one for
+    the occupancy of the target slots and one for their capacities. A
+    booking stays put if it would land in the past, clash with a booking
+    it does not displace, or overfill its new slot (oldest bookings get
+    the places first). New dates follow the booking form's rules
+    (validate_booking_date): a date past the booking window is skipped
+    too. Bookings that stay keep their key and place, which can block
+    others, so the checks repeat until nothing changes.
+
+    Args:
+        rows: Selected booking rows (ROW_FIELDS tuples)
+        targets: {booking id: (hospital id, date)} wanted for each row
+        today: Reference date (defaults to today)
+
+    Returns:
+        dict: {booking id: reason} for the bookings that cannot move
+    """
+    today = today or date.today()
+    ids = {row[0] for row in rows}
+    skipped = {}
+    for row in rows:
+        day = targets[row[0]][1]
+        if day < today:
+            skipped[row[0]] = SKIPPED_PAST
+            continue
+        try:
+            validate_booking_date(day)
+        except ValidationError:
+            skipped[row[0]] = SKIPPED_WINDOW
+    movers = [row for row in rows if row[0] not in skipped]
+    if not movers:
+        return skipped
+
+    new_keys = {row[0]: _key(row, targets[row[0]][1]) for row in movers}
+    taken = set(
+        Booking.objects.filter(
+            patient_id__in={key[0] for key in new_keys.values()},
+            test_id__in={key[1] for key in new_keys.values()},
+            date__in={key[2] for key in new_keys.values()},
+        )
+        .exclude(pk__in=ids)
+        .values_list('patient_id', 'test_id', 'date', 'time')
+    ) & set(new_keys.values())
+
+    new_slots = {row[0]: _slot(row, *targets[row[0]]) for row in movers}
+    old_slots = {row[0]: _slot(row, row[7], row[5]) for row in rows}
+    occupied = Counter({
+        (hospital_id, test_id, day, slot): booked
+        for hospital_id, test_id, day, slot, booked in SlotOccupancy.objects.filter(
+            hospital_id__in={slot[0] for slot in new_slots.values()},
+            test_id__in={slot[1] for slot in new_slots.values()},
+            date__in={slot[2] for slot in new_slots.values()},
+        ).values_list('hospital_id', 'test_id', 'date', 'time', 'booked')
+    })
+    capacities = get_capacities({(slot[0], slot[1]) for slot in new_slots.values()})
+
+    while True:
+        staying = {_key(row, row[5]): row[0] for row in rows if row[0] in skipped}
+        booked = occupied.copy()
+        for row in movers:
+            if row[0] not in skipped and new_slots[row[0]] != old_slots[row[0]]:
+                booked[old_slots[row[0]]] -= 1
+
+        blocked = dict(skipped)
+        for row in sorted(movers):
+            pk = row[0]
+            if pk in blocked:
+                continue
+            key = new_keys[pk]
+            if key in taken or staying.get(key, pk) != pk:
+                blocked[pk] = SKIPPED_DUPLICATE
+                continue
+            slot = new_slots[pk]
+            if slot == old_slots[pk]:
+                continue
+            if is_full(booked[slot], capacities[(slot[0], slot[1])]):
+                blocked[pk] = SKIPPED_FULL
+                continue
+            booked[slot] += 1
+        if blocked == skipped:
+            return skipped
+        skipped = blocked
+
+
+def _select(queryset):
+    return list(queryset.order_by('id').values_list(*ROW_FIELDS))
+
+
+def _refresh_moved(moved, targets):
+    """Updates the derived tables for bookings moved with a plain UPDATE."""
+    old = [(row[7], row[4], row[5], row[6]) for row in moved]
+    new = [(targets[row[0]][0], row[4], targets[row[0]][1], row[6]) for row in moved]
+    availability_service.adjust_occupancy_bulk(old, delta=-1)
+    availability_service.adjust_occupancy_bulk(new, delta=1)
+    rollup_service.adjust_rollup_bulk(old, delta=-1)
+    rollup_service.adjust_rollup_bulk(new, delta=1)
+
+
+def _finish(rows, freed_slots):
+    """Hands freed places to the waitlist and invalidates cached pages."""
+    for slot in sorted(set(freed_slots)):
+        waitlist_service.promote(*slot)
+    user_ids = {row[1] for row in rows}
+    transaction.on_commit(lambda: stats_service.invalidate(user_ids))
+    transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+
+
+def move_bookings(queryset, action, days=0, hospital=None):
+    """
+    Reschedules bookings by a number of days or moves them to another hospital.
+
+    The selection is read once, checked set-wise (see plan_moves) and
+    changed with one UPDATE per CHUNK_SIZE bookings (and per date when
+    rescheduling), all in one transaction. UPDATE sends no model signals, so the occupancy grid,
+    daily rollup, search index (for a new hospital), waitlist of the freed
+    places, statistics and page caches are refreshed here, and the
+    'updated' notifications are queued in batches.
+
+    Args:
+        queryset: Bookings to move
+        action: RESCHEDULE or REASSIGN
+        days: Days to shift by (RESCHEDULE)
+        hospital: New Hospital instance or name (REASSIGN)
+
+    Returns:
+        BulkResult: Rows, targets and skipped bookings
+    """
+    with transaction.atomic():
+        rows = _select(queryset)
+        if action == RESCHEDULE:
+            targets = {row[0]: (row[7], row[5] + timedelta(days=days)) for row in rows}
+        else:
+            hospital_id = hospital_service.resolve_hospital(hospital).pk
+            targets = {row[0]: (hospital_id, row[5]) for row in rows}
+        result = BulkResult(action, rows, targets, plan_moves(rows, targets))
+        moved = [row for row in rows if row[0] not in result.skipped]
+        if not moved:
+            return result
+
+        if action == RESCHEDULE:
+            by_date = defaultdict(list)
+            for row in moved:
+                by_date[row[5]].append(row[0])
+            # SQLite checks the unique key row by row, so a booking moving
+            # onto the date another selected booking is leaving must go
+            # after it: the date furthest in the direction of the shift first
+            for day in sorted(by_date, reverse=days > 0):
+                for chunk in _chunks(by_date[day]):
+                    Booking.objects.filter(pk__in=chunk).update(
+                        date=day + timedelta(days=days), version=F('version') + 1,
+                    )
+        else:
+            for chunk in _chunks(row[0] for row in moved):
+                Booking.objects.filter(pk__in=chunk).update(hospital_id=hospital_id, version=F('version') + 1)
+        _refresh_moved(moved, targets)
+
+        moved_ids = [row[0] for row in moved]
+        if action == REASSIGN:
+            for chunk in _chunks(moved_ids):
+                search_service.index_bookings(Booking.objects.filter(pk__in=chunk))
+        for chunk in _chunks(moved_ids):
+            notification_service.notify_bookings('updated', Booking.objects.filter(pk__in=chunk))
+        _finish(moved, [(row[7], row[4], row[5], slot_start(row[6])) for row in moved])
+    return result
+
+
+def cancel_bookings(queryset):
+    """
+    Cancels (deletes) bookings with set-based DELETEs in one transaction.
+
+    The 'cancelled' notifications are queued in batches before the rows go;
+    the derived tables are then updated and the freed places offered to
+    the waitlist.
+
+    Args:
+        queryset: Bookings to cancel
+
+    Returns:
+        BulkResult: Cancelled rows
+    """
+    with transaction.atomic():
+        rows = _select(queryset)
+        result = BulkResult(CANCEL, rows)
+        if not rows:
+            return result
+        ids = [row[0] for row in rows]
+        for chunk in _chunks(ids):
+            notification_service.notify_bookings('cancelled', Booking.objects.filter(pk__in=chunk))
+        delete_bookings(ids)
+
+        slots = [(row[7], row[4], row[5], row[6]) for row in rows]
+        availability_service.adjust_occupancy_bulk(slots, delta=-1)
+        rollup_service.adjust_rollup_bulk(slots, delta=-1)
+        search_service.remove_bookings(ids)
+        _finish(rows, [(row[7], row[4], row[5], slot_start(row[6])) for row in rows])
+    return result
+
+
+def run_action(queryset, action, days=0, hospital=None):
+    """Runs one of ACTIONS on the bookings of a queryset; see move_bookings and cancel_bookings."""
+    if action == CANCEL:
+        return cancel_bookings(queryset)
+    return move_bookings(queryset, action, days=days, hospital=hospital)
+
+
+REPORT_COLUMNS = (
+    'id', 'patient', 'test', 'date', 'time', 'hospital', 'new_date', 'new_hospital', 'status',
+)
+
+
+def iter_report(result):
+    """
+    Yields the CSV report of a bulk action, one line per selected booking.
+
+    Args:
+        result: BulkResult returned by run_action
+
+    Returns:
+        iterator: CSV lines, header first
+    """
+    # Deferred: forms import this module for its constants on every booking page
+    import csv
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(REPORT_COLUMNS)
+    names = hospital_service.get_names(
+        {row[7] for row in result.rows} | {target[0] for target in result.targets.values()}
+    )
+    for pk, _, _, patient, test_id, day, booking_time, hospital_id in result.rows:
+        test = catalogue_service.get_test(test_id)
+        new_hospital_id, new_date = result.targets.get(pk, (None, None))
+        reason = result.skipped.get(pk)
+        status = f'skipped: {reason}' if reason else ('cancelled' if result.action == CANCEL else 'moved')
+        yield writer.writerow([
+            pk, patient, test.name if test else test_id, day.isoformat(), booking_time.strftime('%H:%M'),
+            names.get(hospital_id, hospital_id), new_date.isoformat() if new_date else '',
+            names.get(new_hospital_id, '') if new_hospital_id else '', status,
+        ])
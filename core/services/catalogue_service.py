@@ -0,0 +1,59 @@
+from core.caching import VersionedCache
+from core.models import Test
+
+
+def _load():
+    return list(Test.objects.order_by('name').values_list('pk', 'name'))
+
+
+def _build(rows):
+    return [Test(pk=pk, name=name) for pk, name in rows]
+
+
+_catalogue = VersionedCache(
+    'test_catalogue', _load, _build,
+    timeout_setting='TEST_CATALOGUE_TIMEOUT', local_ttl_setting='TEST_CATALOGUE_LOCAL_TTL',
+)
+
+
+def get_tests():
+    """
+    Returns the test catalogue ordered by name, without touching the database when warm.
+
+    Reads are served from a process-local copy that is revalidated against the
+    shared cache version at most every TEST_CATALOGUE_LOCAL_TTL seconds.
+
+    Returns:
+        list: Test instances
+    """
+    return _catalogue.get()
+
+
+def get_test(pk):
+    """
+    Returns the catalogue test with the given primary key.
+
+    Args:
+        pk: Test id (int or numeric string)
+
+    Returns:
+        Test or None: The matching test
+    """
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    for test in get_tests():
+        if test.pk == pk:
+            return test
+    return None
+
+
+def get_tests_by_name():
+    """Returns {lower-cased test name: Test} for the catalogue."""
+    return {test.name.lower(): test for test in get_tests()}
+
+
+def invalidate():
+    """Bumps the catalogue version so every process reloads it."""
+    _catalogue.invalidate()
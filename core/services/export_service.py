@@ -0,0 +1,111 @@
+import json
+import zlib
+from datetime import date
+
+from core.services import archive_service
+
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('username', 'user__username'),
+    ('patient_name', 'patient__name'),
+    ('age', 'patient__age'),
+    ('contact', 'patient__contact'),
+    ('test', 'test__name'),
+    ('date', 'date'),
+    ('time', 'time'),
+    ('hospital', 'hospital__name'),
+    ('created_at', 'created_at'),
+)
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def parse_date(value):
+    """Parses an optional YYYY-MM-DD value, returning None when it is empty."""
+    return date.fromisoformat(value) if value else None
+
+
+def export_queryset(search_query='', date_from=None, date_to=None):
+    """
+    Builds the queryset of export rows.
+
+    Archived bookings are included when the date range reaches back into
+    the archive (see archive_service.booking_rows).
+
+    Args:
+        search_query: Optional free-text filter (same matching as the admin search)
+        date_from: Optional first booking date to include
+        date_to: Optional last booking date to include
+
+    Returns:
+        QuerySet: Tuples of the EXPORT_COLUMNS values, ordered like the booking listings
+    """
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return archive_service.booking_rows(fields, date_from, date_to, search_query)
+
+
+def iter_rows(queryset, chunk_size=2000):
+    """Yields export rows as tuples, streaming from a server-side cursor."""
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def _serialize(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows):
+    """Yields CSV lines (header first) for export rows."""
+    # Deferred: this module is loaded with the views, exports are rare
+    import csv
+
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_serialize(value) for value in row])
+
+
+def iter_ndjson(rows):
+    """Yields one JSON object per line for export rows."""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, map(_serialize, row)))) + '\n'
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip-compresses a stream of text chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(queryset, export_format='csv', compress=False, chunk_size=2000):
+    """
+    Streams a booking export without loading it into memory.
+
+    Args:
+        queryset: Bookings to export (see export_queryset)
+        export_format: 'csv' or 'ndjson'
+        compress: Whether to gzip the output
+        chunk_size: Rows fetched per database round trip
+
+    Returns:
+        iterator: Text chunks, or bytes chunks when compress is True
+    """
+    rows = iter_rows(queryset, chunk_size=chunk_size)
+    chunks = iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
+    return iter_gzip(chunks) if compress else chunks
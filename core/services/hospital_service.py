@@ -0,0 +1,173 @@
+import re
+
+from django.db import IntegrityError, transaction
+
+from core.caching import VersionedCache
+from core.models import Hospital
+
+
+APOSTROPHES = re.compile(r"['’`]")
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+class Interned:
+    """The hospital list with lookups by id and by canonical name."""
+
+    def __init__(self, hospitals):
+        self.hospitals = hospitals
+        self.by_id = {hospital.pk: hospital for hospital in hospitals}
+        self.by_key = {hospital.key: hospital for hospital in hospitals}
+
+
+def canonical_name(name):
+    """
+    Returns the key spelling variants of a hospital name share.
+
+    Case, apostrophes, other punctuation and spacing are ignored, so
+    "Gertrude's Children's  Hospital" and "gertrudes childrens hospital"
+    are the same hospital.
+
+    Args:
+        name: Hospital name as typed
+
+    Returns:
+        str: Canonical key
+    """
+    return ' '.join(PUNCTUATION.sub(' ', APOSTROPHES.sub('', name)).casefold().split())
+
+
+def display_name(name):
+    """The name as typed, with surrounding and repeated spaces removed."""
+    return ' '.join(name.split())
+
+
+def _load():
+    return list(Hospital.objects.order_by('name').values_list('pk', 'name', 'key'))
+
+
+def _build(rows):
+    return Interned([Hospital(pk=pk, name=name, key=key) for pk, name, key in rows])
+
+
+_hospitals = VersionedCache(
+    'hospitals', _load, _build,
+    timeout_setting='HOSPITAL_CACHE_TIMEOUT', local_ttl_setting='HOSPITAL_CACHE_LOCAL_TTL',
+)
+
+
+def _interned():
+    return _hospitals.get()
+
+
+def get_hospitals():
+    """
+    Returns every hospital ordered by name, without touching the database when warm.
+
+    Like the test catalogue, reads are served from a process-local copy that
+    is revalidated against the shared cache version at most every
+    HOSPITAL_CACHE_LOCAL_TTL seconds.
+
+    Returns:
+        list: Hospital instances
+    """
+    return _interned().hospitals
+
+
+def get_hospital(pk):
+    """
+    Returns the cached hospital with the given primary key.
+
+    Args:
+        pk: Hospital id
+
+    Returns:
+        Hospital or None: The hospital, None if unknown (or not cached yet)
+    """
+    return _interned().by_id.get(pk)
+
+
+def get_names(ids):
+    """Returns {hospital id: name} for the given ids (cache first, then one query)."""
+    by_id = _interned().by_id
+    names = {pk: by_id[pk].name for pk in ids if pk in by_id}
+    missing = set(ids) - set(names)
+    if missing:
+        names.update(Hospital.objects.filter(pk__in=missing).values_list('pk', 'name'))
+    return names
+
+
+def find_hospital(name):
+    """
+    Looks up an existing hospital by any spelling variant of its name.
+
+    Served from the in-process cache; a name that is not cached (e.g. a
+    hospital just added by another process) is looked up by its key.
+
+    Args:
+        name: Hospital name as typed
+
+    Returns:
+        Hospital or None: The hospital, None if there is none by that name
+    """
+    key = canonical_name(name or '')
+    if not key:
+        return None
+    hospital = _interned().by_key.get(key)
+    if hospital is None:
+        hospital = Hospital.objects.filter(key=key).first()
+    return hospital
+
+
+def resolve_hospital(hospital):
+    """
+    Returns the stored hospital for a name, creating it on first use.
+
+    Used on the write path, so the lookup goes to the database (one unique
+    index probe) rather than trusting the process cache.
+
+    Args:
+        hospital: Hospital name as typed, or a Hospital instance
+
+    Returns:
+        Hospital: The saved hospital
+    """
+    name = display_name(hospital.name if isinstance(hospital, Hospital) else hospital)
+    key = canonical_name(name)
+    existing = Hospital.objects.filter(key=key).first()
+    if existing is not None:
+        return existing
+    try:
+        with transaction.atomic():
+            return Hospital.objects.create(name=name, key=key)
+    except IntegrityError:
+        # Another writer created it first
+        return Hospital.objects.get(key=key)
+
+
+def resolve_hospitals(names):
+    """
+    resolve_hospital for many names with one query (plus one insert for new ones).
+
+    Args:
+        names: Hospital names as typed
+
+    Returns:
+        dict: {name: hospital id}
+    """
+    keys = {name: canonical_name(name) for name in set(names)}
+    ids = dict(Hospital.objects.filter(key__in=set(keys.values())).values_list('key', 'pk'))
+    missing = {}
+    for name, key in keys.items():
+        if key not in ids:
+            missing.setdefault(key, display_name(name))
+    if missing:
+        Hospital.objects.bulk_create(
+            [Hospital(name=name, key=key) for key, name in missing.items()], ignore_conflicts=True,
+        )
+        ids.update(Hospital.objects.filter(key__in=missing).values_list('key', 'pk'))
+        transaction.on_commit(invalidate)
+    return {name: ids[key] for name, key in keys.items()}
+
+
+def invalidate():
+    """Bumps the hospital cache version so every process reloads it."""
+    _hospitals.invalidate()
@@ -0,0 +1,246 @@
+import csv
+import json
+from dataclasses import dataclass
+from datetime import date, time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from core.models import Booking, Patient
+from core.services import (
+    availability_service, catalogue_service, hospital_service, page_cache_service, rollup_service,
+    search_service, stats_service,
+)
+from core.services.patient_service import normalize_contact
+from core.validators import validate_booking_date, validate_phone_number
+
+
+REQUIRED_FIELDS = ('patient_name', 'age', 'contact', 'test', 'date', 'time', 'hospital')
+DUPLICATE_ROW_MESSAGE = 'Booking already exists for this patient, test, date and time.'
+
+
+@dataclass
+class ImportResult:
+    """Counters for a bulk booking import."""
+    total: int = 0
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    patients_created: int = 0
+
+    @property
+    def rejected(self):
+        return self.duplicates + self.invalid
+
+
+def read_rows(stream, file_format):
+    """
+    Lazily reads booking rows from a CSV or JSONL stream.
+
+    Args:
+        stream: Text file object
+        file_format: 'csv' or 'jsonl'
+
+    Yields:
+        tuple: (line number, row dict); malformed JSON lines yield (line, None)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def clean_row(row, tests_by_name, users_by_name=None):
+    """
+    Validates a raw import row with the same rules as BookingForm.
+
+    Args:
+        row: Dict of raw values
+        tests_by_name: {lower-cased test name: test id}
+        users_by_name: {username: user id}, or None to ignore the username column
+
+    Returns:
+        dict: Cleaned values (patient_name, age, contact, test_id, date, time, hospital, user_id)
+
+    Raises:
+        ValidationError: With one message per invalid field
+    """
+    if row is None:
+        raise ValidationError('Row is not a valid JSON object.')
+
+    errors = []
+    values = {field: str(row.get(field) or '').strip() for field in REQUIRED_FIELDS}
+    missing = [field for field in REQUIRED_FIELDS if not values[field]]
+    if missing:
+        raise ValidationError(f"Missing required fields: {', '.join(missing)}.")
+
+    cleaned = {'patient_name': values['patient_name'][:200], 'hospital': values['hospital'][:200]}
+    try:
+        cleaned['age'] = int(values['age'])
+        if not 1 <= cleaned['age'] <= 150:
+            errors.append('Age must be between 1 and 150.')
+    except ValueError:
+        errors.append('Age must be a whole number.')
+
+    try:
+        cleaned['contact'] = normalize_contact(values['contact'])
+        validate_phone_number(cleaned['contact'])
+    except ValidationError as exc:
+        errors.extend(exc.messages)
+
+    cleaned['test_id'] = tests_by_name.get(values['test'].lower())
+    if cleaned['test_id'] is None:
+        errors.append(f"Unknown test type '{values['test']}'.")
+
+    try:
+        cleaned['date'] = date.fromisoformat(values['date'])
+        validate_booking_date(cleaned['date'])
+    except ValueError:
+        errors.append('Date must be in YYYY-MM-DD format.')
+    except ValidationError as exc:
+        errors.extend(exc.messages)
+
+    try:
+        cleaned['time'] = time.fromisoformat(values['time'])
+    except ValueError:
+        errors.append('Time must be in HH:MM format.')
+
+    cleaned['user_id'] = None
+    username = str(row.get('username') or '').strip()
+    if username and users_by_name is not None:
+        cleaned['user_id'] = users_by_name.get(username)
+        if cleaned['user_id'] is None:
+            errors.append(f"Unknown user '{username}'.")
+
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def _resolve_patients(rows, result):
+    """Returns {contact: patient id}, bulk-creating patients that do not exist yet."""
+    contacts = {row['contact'] for row in rows}
+    patients = dict(Patient.objects.filter(contact__in=contacts).values_list('contact', 'pk'))
+    new_patients = {}
+    for row in rows:
+        if row['contact'] not in patients and row['contact'] not in new_patients:
+            new_patients[row['contact']] = Patient(
+                name=row['patient_name'], age=row['age'], contact=row['contact']
+            )
+    if new_patients:
+        # A concurrent import may have added some of the contacts meanwhile:
+        # the insert skips those, so count the rows SQLite reports as written
+        connection.ensure_connection()
+        written = connection.connection.total_changes
+        Patient.objects.bulk_create(new_patients.values(), ignore_conflicts=True)
+        result.patients_created += connection.connection.total_changes - written
+        patients.update(Patient.objects.filter(contact__in=new_patients).values_list('contact', 'pk'))
+    return patients
+
+
+def import_chunk(chunk, result, report=None, default_user_id=None):
+    """
+    Writes one chunk of cleaned rows in a single transaction.
+
+    Duplicates (already stored, or repeated within the chunk) are found with
+    one set-wise query instead of one lookup per row.
+
+    Args:
+        chunk: List of (line number, raw row, cleaned row) tuples
+        result: ImportResult to update
+        report: Optional callable(line number, raw row, messages) for rejected rows
+        default_user_id: User id for rows without a username
+    """
+    with transaction.atomic():
+        patients = _resolve_patients([cleaned for _, _, cleaned in chunk], result)
+        hospitals = hospital_service.resolve_hospitals({cleaned['hospital'] for _, _, cleaned in chunk})
+        keyed = [
+            (line, raw, cleaned, (patients[cleaned['contact']], cleaned['test_id'], cleaned['date'], cleaned['time']))
+            for line, raw, cleaned in chunk
+        ]
+        existing = set(
+            Booking.objects.filter(
+                patient_id__in={key[0] for *_, key in keyed},
+                date__in={key[2] for *_, key in keyed},
+            ).values_list('patient_id', 'test_id', 'date', 'time')
+        )
+
+        bookings = []
+        for line, raw, cleaned, key in keyed:
+            if key in existing:
+                result.duplicates += 1
+                if report:
+                    report(line, raw, [DUPLICATE_ROW_MESSAGE])
+                continue
+            existing.add(key)
+            bookings.append(Booking(
+                patient_id=key[0],
+                test_id=cleaned['test_id'],
+                date=cleaned['date'],
+                time=cleaned['time'],
+                hospital_id=hospitals[cleaned['hospital']],
+                user_id=cleaned['user_id'] or default_user_id,
+            ))
+
+        created = Booking.objects.bulk_create(bookings)
+        result.created += len(created)
+
+        # bulk_create skips signals, so refresh the derived tables here
+        slots = [(booking.hospital_id, booking.test_id, booking.date, booking.time) for booking in created]
+        availability_service.adjust_occupancy_bulk(slots)
+        rollup_service.adjust_rollup_bulk(slots)
+        search_service.index_bookings(Booking.objects.filter(pk__in=[booking.pk for booking in created]))
+        user_ids = {booking.user_id for booking in created}
+        transaction.on_commit(lambda: stats_service.invalidate(user_ids))
+        transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+
+
+def import_bookings(rows, chunk_size=2000, report=None, default_user=None):
+    """
+    Streams booking rows into the database in chunked transactions.
+
+    Only one chunk of rows is held in memory at a time. Tests and users are
+    resolved through in-memory maps loaded once up front.
+
+    Args:
+        rows: Iterable of (line number, raw row dict) as produced by read_rows
+        chunk_size: Number of valid rows written per transaction
+        report: Optional callable(line number, raw row, messages) for rejected rows
+        default_user: User assigned to rows without a username column
+
+    Returns:
+        ImportResult: Import counters
+    """
+    tests_by_name = {name: test.pk for name, test in catalogue_service.get_tests_by_name().items()}
+    users_by_name = dict(User.objects.values_list('username', 'pk'))
+    default_user_id = default_user.pk if default_user else None
+    result = ImportResult()
+
+    chunk = []
+    for line, raw in rows:
+        result.total += 1
+        try:
+            cleaned = clean_row(raw, tests_by_name, users_by_name)
+        except ValidationError as exc:
+            result.invalid += 1
+            if report:
+                report(line, raw, exc.messages)
+            continue
+        chunk.append((line, raw, cleaned))
+        if len(chunk) >= chunk_size:
+            import_chunk(chunk, result, report, default_user_id)
+            chunk = []
+    if chunk:
+        import_chunk(chunk, result, report, default_user_id)
+    return result
@@ -0,0 +1,233 @@
+import random
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Job
+
+
+@dataclass(frozen=True)
+class Handler:
+    """A registered job kind."""
+    func: object
+    batch_size: int
+    max_attempts: int
+
+
+# kind -> Handler, filled by the @handler decorator
+HANDLERS = {}
+
+
+class PartialFailure(Exception):
+    """
+    Raised by a handler when only some payloads of its batch failed.
+
+    Only the jobs at those positions are retried; the others are marked done,
+    so messages that were already delivered are not sent again.
+
+    Args:
+        failed: Indexes into the batch of the payloads that failed
+    """
+
+    def __init__(self, failed, message=''):
+        self.failed = sorted(set(failed))
+        super().__init__(message or f'{len(self.failed)} payload(s) of the batch failed')
+
+
+def handler(kind, batch_size=1, max_attempts=None):
+    """
+    Registers a function that runs jobs of one kind.
+
+    The function receives a list of payloads, at most batch_size long, so
+    handlers that talk to an external service can make one call per batch.
+    Raising marks every job in the batch for a retry; raising PartialFailure
+    retries only the payloads it names.
+
+    Args:
+        kind: Job kind name
+        batch_size: Maximum number of jobs passed to one call
+        max_attempts: Attempts before a job is marked failed (defaults to JOB_MAX_ATTEMPTS)
+    """
+    def decorator(func):
+        HANDLERS[kind] = Handler(
+            func, batch_size, max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+        )
+        return func
+    return decorator
+
+
+def enqueue(kind, payload, key=None, delay=None):
+    """
+    Adds a job to the queue.
+
+    Called inside a transaction, the job is only visible to workers once
+    that transaction commits, and disappears with it if it rolls back.
+
+    Args:
+        kind: Registered job kind
+        payload: JSON-serialisable dict passed to the handler
+        key: Idempotency key; a job with a key that was already queued is not added again
+        delay: Optional timedelta before the job may run
+
+    Returns:
+        Job: The new job, or the existing one with the same key
+    """
+    job = Job(
+        kind=kind,
+        payload=payload,
+        idempotency_key=key,
+        max_attempts=HANDLERS[kind].max_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=key)
+    return job
+
+
+def enqueue_many(kind, items, batch_size=500):
+    """
+    Adds many jobs of one kind with batched inserts.
+
+    items is consumed lazily, batch_size at a time, so a large fan-out is
+    streamed into the queue rather than built in memory first. Jobs whose
+    key was already queued are skipped, as with enqueue().
+
+    Args:
+        kind: Registered job kind
+        items: Iterable of (payload, key) tuples
+        batch_size: Jobs per INSERT
+
+    Returns:
+        int: Number of jobs offered (including skipped duplicates)
+    """
+    max_attempts = HANDLERS[kind].max_attempts
+    run_at = timezone.now()
+    total = 0
+    batch = []
+    for payload, key in items:
+        batch.append(Job(
+            kind=kind, payload=payload, idempotency_key=key, max_attempts=max_attempts, run_at=run_at,
+        ))
+        if len(batch) >= batch_size:
+            Job.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+            batch = []
+    if batch:
+        Job.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+    return total
+
+
+def claim(kind, worker, limit=None):
+    """
+    Locks the next due jobs of a kind for one worker.
+
+    Args:
+        kind: Job kind
+        worker: Name of the claiming worker (stored in locked_by)
+        limit: Maximum number of jobs (defaults to the kind's batch size)
+
+    Returns:
+        list: Claimed Job objects, oldest first
+    """
+    limit = limit or HANDLERS[kind].batch_size
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.filter(kind=kind, status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # The status condition keeps two workers from claiming the same job
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        return list(Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now))
+
+
+def run(jobs):
+    """
+    Runs a batch of claimed jobs of one kind and records the outcome.
+
+    Failed jobs are requeued with exponential backoff (JOB_RETRY_BASE_SECONDS
+    doubled per attempt, with jitter) until they run out of attempts. If the
+    handler raises PartialFailure only the jobs it names fail.
+
+    Args:
+        jobs: Claimed Job objects of the same kind
+
+    Returns:
+        int: Number of jobs that failed (0 if the whole batch succeeded)
+    """
+    if not jobs:
+        return 0
+    failed = []
+    try:
+        HANDLERS[jobs[0].kind].func([job.payload for job in jobs])
+    except PartialFailure as exc:
+        failed = [jobs[index] for index in exc.failed]
+        error = traceback.format_exc()
+    except Exception:
+        failed = jobs
+        error = traceback.format_exc()
+    for job in failed:
+        _retry(job, error)
+    failed_ids = {job.pk for job in failed}
+    done = [job.pk for job in jobs if job.pk not in failed_ids]
+    if done:
+        Job.objects.filter(id__in=done).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return len(failed)
+
+
+def _retry(job, error):
+    if job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+        return
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 10)
+    delay = base * 2 ** (job.attempts - 1) * random.uniform(1, 1.5)
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.QUEUED, run_at=timezone.now() + timedelta(seconds=delay), last_error=error,
+    )
+
+
+def release_stale(timeout):
+    """
+    Requeues jobs whose worker stopped without finishing them.
+
+    Args:
+        timeout: timedelta after which a running job is considered abandoned
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - timeout).update(
+        status=Job.QUEUED, run_at=timezone.now(),
+    )
+
+
+def purge(older_than):
+    """
+    Deletes finished jobs, which also frees their idempotency keys.
+
+    Args:
+        older_than: timedelta; done jobs finished before now - older_than are deleted
+
+    Returns:
+        int: Number of jobs deleted
+    """
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
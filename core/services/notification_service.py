@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+
+from core.services import catalogue_service, job_service
+from core.sms import PartialDeliveryError, SMSMessage, get_gateway
+
+
+SMS_JOB = 'booking_sms'
+EMAIL_JOB = 'booking_email'
+AUDIT_JOB = 'booking_audit'
+
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger('core.audit')
+
+# Booking values a payload is built from (see booking_payload)
+PAYLOAD_FIELDS = (
+    'pk', 'version', 'user_id', 'patient__name', 'patient__contact', 'test_id', 'date', 'time', 'hospital__name',
+)
+
+EVENT_TEXT = {
+    'created': 'is confirmed',
+    'updated': 'has been changed',
+    'cancelled': 'has been cancelled',
+    'promoted': 'is confirmed from the waitlist',
+}
+
+
+def booking_payload(event, booking):
+    """
+    Snapshot of a booking for its notification jobs.
+
+    The jobs may run after the booking was changed or deleted, so they get
+    the values as of the event rather than the booking id alone.
+    """
+    return _row_payload(event, (
+        booking.pk, booking.version, booking.user_id, booking.patient.name, booking.patient.contact,
+        booking.test_id, booking.date, booking.time, booking.hospital.name,
+    ))
+
+
+def notify_booking(event, booking):
+    """
+    Queues the SMS, email and audit jobs for a booking event.
+
+    The jobs are written in one transaction (the caller's, if any) and keyed
+    on the event and booking snapshot, including Booking.version, so a
+    retried request does not send the same notification twice, while a
+    booking moved away and back again (a new version) is notified each time.
+
+    Args:
+        event: 'created', 'updated', 'cancelled' or 'promoted'
+        booking: Booking instance (before deletion, for 'cancelled')
+    """
+    payload = booking_payload(event, booking)
+    key = _job_key(payload)
+    with transaction.atomic():
+        job_service.enqueue(SMS_JOB, payload, key=f'sms:{key}')
+        if booking.user_id:
+            job_service.enqueue(EMAIL_JOB, payload, key=f'email:{key}')
+        job_service.enqueue(AUDIT_JOB, payload, key=f'audit:{key}')
+
+
+def notify_bookings(event, queryset, chunk_size=500):
+    """
+    Queues the notification jobs of an event for many bookings.
+
+    Payloads are read chunk_size bookings at a time with one joined query
+    per chunk and written with batched inserts, so notifying a bulk action
+    on thousands of bookings neither loads them all nor runs per-booking
+    queries. Same payloads and keys as notify_booking.
+
+    Args:
+        event: 'updated' or 'cancelled' (call before deleting)
+        queryset: Bookings to notify about
+
+    Returns:
+        int: Number of bookings notified
+    """
+    rows = queryset.order_by('pk').values_list(*PAYLOAD_FIELDS).iterator(chunk_size=chunk_size)
+    total = 0
+    with transaction.atomic():
+        while True:
+            payloads = [_row_payload(event, row) for row in islice(rows, chunk_size)]
+            if not payloads:
+                break
+            keys = [_job_key(payload) for payload in payloads]
+            job_service.enqueue_many(SMS_JOB, ((p, f'sms:{k}') for p, k in zip(payloads, keys)))
+            job_service.enqueue_many(
+                EMAIL_JOB, ((p, f'email:{k}') for p, k in zip(payloads, keys) if p['user_id'])
+            )
+            job_service.enqueue_many(AUDIT_JOB, ((p, f'audit:{k}') for p, k in zip(payloads, keys)))
+            total += len(payloads)
+    return total
+
+
+def _row_payload(event, row):
+    pk, version, user_id, patient, contact, test_id, day, booking_time, hospital = row
+    test = catalogue_service.get_test(test_id)
+    return {
+        'event': event,
+        'booking_id': pk,
+        'version': version,
+        'user_id': user_id,
+        'patient': patient,
+        'contact': contact,
+        'test': test.name if test else '',
+        'date': day.isoformat(),
+        'time': booking_time.strftime('%H:%M'),
+        'hospital': hospital,
+    }
+
+
+def _job_key(payload):
+    digest = hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f"{payload['event']}:{payload['booking_id']}:{digest}"
+
+
+def message_text(payload):
+    return (
+        f"Hospital booking: {payload['test']} for {payload['patient']} at {payload['hospital']} "
+        f"on {payload['date']} {payload['time']} {EVENT_TEXT.get(payload['event'], payload['event'])}."
+    )
+
+
+@job_service.handler(SMS_JOB, batch_size=getattr(settings, 'SMS_BATCH_SIZE', 50))
+def send_sms(payloads):
+    """One gateway call per batch of messages; only the messages the gateway rejected are retried."""
+    try:
+        get_gateway().send_batch([SMSMessage(payload['contact'], message_text(payload)) for payload in payloads])
+    except PartialDeliveryError as exc:
+        raise job_service.PartialFailure(exc.failed, str(exc)) from exc
+
+
+@job_service.handler(EMAIL_JOB, batch_size=getattr(settings, 'EMAIL_BATCH_SIZE', 50))
+def send_email(payloads):
+    """
+    One address lookup and one mail connection per batch.
+
+    Messages are sent one at a time over that connection, so a rejected
+    address only retries its own job.
+    """
+    emails = dict(
+        User.objects.filter(pk__in={payload['user_id'] for payload in payloads})
+        .exclude(email='')
+        .values_list('pk', 'email')
+    )
+    messages = [
+        (index, EmailMessage(
+            subject=f"Booking {payload['event']}: {payload['test']} on {payload['date']}",
+            body=message_text(payload),
+            to=[emails[payload['user_id']]],
+        ))
+        for index, payload in enumerate(payloads)
+        if payload['user_id'] in emails
+    ]
+    if not messages:
+        return
+    failed = []
+    with get_connection(fail_silently=False) as connection:
+        for index, message in messages:
+            try:
+                connection.send_messages([message])
+            except Exception:
+                logger.exception('Email for booking %s failed', payloads[index]['booking_id'])
+                failed.append(index)
+    if failed:
+        raise job_service.PartialFailure(failed)
+
+
+@job_service.handler(AUDIT_JOB, batch_size=500)
+def write_audit_log(payloads):
+    for payload in payloads:
+        audit_logger.info('booking %s', json.dumps(payload, sort_keys=True))
@@ -0,0 +1,101 @@
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Version scopes: one per user, one for all bookings (admin pages) and an
+# epoch that invalidates everything (e.g. a test was renamed)
+ALL_SCOPE = 'all'
+EPOCH_SCOPE = 'epoch'
+
+
+@dataclass(frozen=True)
+class PageVersion:
+    """Current bookings version of a page scope."""
+    token: str
+    last_modified: datetime
+
+
+def get_cache():
+    """
+    The cache holding the version counters (BOOKING_VERSION_CACHE).
+
+    Every process must see the same counters, or a process that missed a
+    change answers 304 Not Modified from its stale version.
+    """
+    return caches[getattr(settings, 'BOOKING_VERSION_CACHE', 'default')]
+
+
+def _key(scope):
+    return f'bookings_version:{scope}'
+
+
+def _scopes(user_id):
+    return [EPOCH_SCOPE, ALL_SCOPE if user_id is None else str(user_id)]
+
+
+def _page_version(versions, today):
+    # Stats split upcoming/past on today's date, so the day is part of the version
+    token = '.'.join(str(version) for version in versions) + f'.{today.isoformat()}'
+    modified = max(versions) / 1e9
+    return PageVersion(token, datetime.fromtimestamp(modified, tz=timezone.utc))
+
+
+def get_page_version(user_id=None):
+    """
+    Returns the bookings version for a user's pages (or the admin pages).
+
+    Versions are nanosecond timestamps of the last change, so they double as
+    Last-Modified values. A missing version is seeded with the current time,
+    which never matches a key cached before it was evicted.
+
+    Args:
+        user_id: Id of the user whose bookings the page shows, or None for all bookings
+
+    Returns:
+        PageVersion: Cache token and last-modified time
+    """
+    cache = get_cache()
+    keys = [_key(scope) for scope in _scopes(user_id)]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        now = time.time_ns()
+        for key in keys:
+            if key not in found:
+                cache.add(key, now, None)
+        found = cache.get_many(keys)
+    return _page_version([found.get(key, 0) for key in keys], date.today())
+
+
+async def aget_page_version(user_id=None):
+    """Async version of get_page_version."""
+    cache = get_cache()
+    keys = [_key(scope) for scope in _scopes(user_id)]
+    found = await cache.aget_many(keys)
+    if len(found) < len(keys):
+        now = time.time_ns()
+        for key in keys:
+            if key not in found:
+                await cache.aadd(key, now, None)
+        found = await cache.aget_many(keys)
+    return _page_version([found.get(key, 0) for key in keys], date.today())
+
+
+def bump(user_ids=()):
+    """
+    Marks the pages of the given users, and the admin pages, as changed.
+
+    Args:
+        user_ids: Ids of users whose bookings changed
+    """
+    now = time.time_ns()
+    scopes = [ALL_SCOPE] + [str(user_id) for user_id in set(user_ids) if user_id]
+    get_cache().set_many({_key(scope): now for scope in scopes}, None)
+
+
+def bump_all():
+    """Marks every bookings page as changed."""
+    get_cache().set(_key(EPOCH_SCOPE), time.time_ns(), None)
@@ -0,0 +1,309 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+from dataclasses import dataclass
+from datetime import date, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+
+
+# Keyset order: the model's Meta.ordering with the primary key as tie-breaker
+KEYSET_ORDERING = ('-date', '-time', '-id')
+REVERSE_KEYSET_ORDERING = ('date', 'time', 'id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+@dataclass
+class BookingPage:
+    """A single keyset page of bookings."""
+    object_list: list
+    page_size: int
+    next_cursor: str = None
+    previous_cursor: str = None
+    count: int = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(booking, direction=NEXT):
+    """
+    Encodes the keyset position of a booking as an opaque URL-safe token.
+
+    Args:
+        booking: Booking instance at the edge of a page
+        direction: NEXT to seek past the booking, PREVIOUS to seek before it
+
+    Returns:
+        str: Cursor token
+    """
+    return _encode(direction, booking.date, booking.time, booking.pk)
+
+
+def encode_row_cursor(row, direction=NEXT):
+    """encode_cursor for a values() row with 'date', 'time' and 'id' keys."""
+    return _encode(direction, row['date'], row['time'], row['id'])
+
+
+def _encode(direction, day, booking_time, pk):
+    raw = f"{direction}|{day.isoformat()}|{booking_time.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token produced by encode_cursor.
+
+    Args:
+        token: Cursor token from the URL
+
+    Returns:
+        tuple: (direction, date, time, pk)
+
+    Raises:
+        InvalidCursor: If the token is malformed
+    """
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        direction, raw_date, raw_time, pk = (
+            base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        )
+        if direction not in (NEXT, PREVIOUS):
+            raise ValueError(direction)
+        return direction, date.fromisoformat(raw_date), time.fromisoformat(raw_time), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+def get_page_size(value=None):
+    """
+    Resolves the requested page size, clamped to BOOKING_MAX_PAGE_SIZE.
+
+    Args:
+        value: Requested page size (e.g. from the URL), may be None or invalid
+
+    Returns:
+        int: Page size to use
+    """
+    default = getattr(settings, 'BOOKING_PAGE_SIZE', 25)
+    maximum = getattr(settings, 'BOOKING_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def cached_count(queryset, cache_key=None, timeout=None):
+    """
+    Counts a queryset, optionally caching the result for a short period.
+
+    Large listings (e.g. the admin dashboard) can tolerate an approximate
+    count, so the value is cached instead of running COUNT(*) on every page.
+
+    Args:
+        queryset: Queryset to count
+        cache_key: Scope for the cached value; if None the count is not cached
+        timeout: Cache timeout in seconds (defaults to BOOKING_COUNT_CACHE_TIMEOUT)
+
+    Returns:
+        int: Number of rows
+    """
+    queryset = queryset.order_by()
+    if cache_key is None:
+        return queryset.count()
+
+    digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    key = f'booking_count:{cache_key}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        if timeout is None:
+            timeout = getattr(settings, 'BOOKING_COUNT_CACHE_TIMEOUT', 30)
+        cache.set(key, count, timeout)
+    return count
+
+
+def estimated_count(queryset, threshold=None):
+    """
+    Counts a queryset, estimating the size of whole big tables.
+
+    An unfiltered queryset is sized from the span of its primary keys
+    (the first and last key are two index seeks), which is never lower than the real
+    count: every row stays reachable, the last pages may just come up
+    short. Spans below the threshold, and filtered querysets, are counted
+    exactly.
+
+    Args:
+        queryset: Queryset to count
+        threshold: Spans at or above this are estimated (defaults to ADMIN_COUNT_ESTIMATE_THRESHOLD)
+
+    Returns:
+        int: Number of rows, possibly an overestimate
+    """
+    queryset = queryset.order_by()
+    if threshold is None:
+        threshold = getattr(settings, 'ADMIN_COUNT_ESTIMATE_THRESHOLD', 10000)
+    if queryset.query.where or queryset.query.distinct or queryset.query.is_sliced:
+        return queryset.count()
+    # Separate aggregates: MIN and MAX together would scan the whole table
+    first = queryset.aggregate(first=Min('pk'))['first']
+    if first is None:
+        return 0
+    estimate = queryset.aggregate(last=Max('pk'))['last'] - first + 1
+    return estimate if estimate >= threshold else queryset.count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists: unfiltered big tables are sized with estimated_count()."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+def _seek(queryset, cursor):
+    """Applies the cursor's keyset filter and ordering; returns (queryset, direction)."""
+    direction = None
+    if cursor:
+        try:
+            direction, seek_date, seek_time, seek_pk = decode_cursor(cursor)
+        except InvalidCursor:
+            direction = None
+
+    if direction == NEXT:
+        queryset = queryset.filter(
+            Q(date__lt=seek_date) |
+            Q(date=seek_date, time__lt=seek_time) |
+            Q(date=seek_date, time=seek_time, pk__lt=seek_pk)
+        ).order_by(*KEYSET_ORDERING)
+    elif direction == PREVIOUS:
+        queryset = queryset.filter(
+            Q(date__gt=seek_date) |
+            Q(date=seek_date, time__gt=seek_time) |
+            Q(date=seek_date, time=seek_time, pk__gt=seek_pk)
+        ).order_by(*REVERSE_KEYSET_ORDERING)
+    else:
+        queryset = queryset.order_by(*KEYSET_ORDERING)
+    return queryset, direction
+
+
+def _build_page(rows, page_size, direction, count, cursor_for=encode_cursor):
+    """Turns the page_size + 1 fetched rows into a BookingPage."""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if direction == PREVIOUS:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction == NEXT
+
+    return BookingPage(
+        object_list=rows,
+        page_size=page_size,
+        next_cursor=cursor_for(rows[-1], NEXT) if rows and has_next else None,
+        previous_cursor=cursor_for(rows[0], PREVIOUS) if rows and has_previous else None,
+        count=count,
+    )
+
+
+def paginate_bookings(queryset, cursor=None, page_size=None, count_cache_key=None, with_count=False):
+    """
+    Returns one keyset page of a Booking queryset.
+
+    Pages are ordered by (-date, -time, -id) and each page fetches at most
+    page_size + 1 rows, so the cost of a page does not grow with the table.
+
+    Args:
+        queryset: Booking queryset (filters and select_related already applied)
+        cursor: Cursor token from the URL, or None for the first page
+        page_size: Requested page size
+        count_cache_key: If given, the total count is cached under this scope
+        with_count: Whether to compute the total count at all
+
+    Returns:
+        BookingPage: The requested page
+    """
+    page_size = get_page_size(page_size)
+    count = cached_count(queryset, count_cache_key) if with_count or count_cache_key else None
+    queryset, direction = _seek(queryset, cursor)
+    return _build_page(list(queryset[:page_size + 1]), page_size, direction, count)
+
+
+def paginate_rows(queryset, cursor=None, page_size=None):
+    """
+    paginate_bookings for a values() queryset of bookings.
+
+    The page holds the dicts themselves, so no model instances are built.
+    Cursors are encoded from the 'date', 'time' and 'id' keys, which every
+    row must therefore include.
+
+    Args:
+        queryset: Booking values() queryset
+        cursor: Cursor token from the URL, or None for the first page
+        page_size: Requested page size
+
+    Returns:
+        BookingPage: The requested page of dicts
+    """
+    page_size = get_page_size(page_size)
+    queryset, direction = _seek(queryset, cursor)
+    return _build_page(list(queryset[:page_size + 1]), page_size, direction, None, cursor_for=encode_row_cursor)
+
+
+async def acached_count(queryset, cache_key=None, timeout=None):
+    """Async version of cached_count."""
+    queryset = queryset.order_by()
+    if cache_key is None:
+        return await queryset.acount()
+
+    digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    key = f'booking_count:{cache_key}:{digest}'
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        if timeout is None:
+            timeout = getattr(settings, 'BOOKING_COUNT_CACHE_TIMEOUT', 30)
+        await cache.aset(key, count, timeout)
+    return count
+
+
+async def apaginate_bookings(queryset, cursor=None, page_size=None, count_cache_key=None, with_count=False):
+    """
+    Async version of paginate_bookings.
+
+    The count and the page rows are gathered together, but the async ORM
+    runs them one after another on the thread that owns the connection.
+    """
+    page_size = get_page_size(page_size)
+    seek_queryset, direction = _seek(queryset, cursor)
+
+    async def fetch_rows():
+        return [booking async for booking in seek_queryset[:page_size + 1]]
+
+    if with_count or count_cache_key:
+        count, rows = await asyncio.gather(acached_count(queryset, count_cache_key), fetch_rows())
+    else:
+        count, rows = None, await fetch_rows()
+    return _build_page(rows, page_size, direction, count)
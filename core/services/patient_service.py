@@ -0,0 +1,297 @@
+import re
+import unicodedata
+from collections import defaultdict
+from itertools import chain
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+
+from core.models import Booking, BookingArchive, Patient, WaitlistEntry
+from core.services import page_cache_service, search_service
+
+
+NON_DIGITS = re.compile(r'\D')
+NAME_TOKENS = re.compile(r'\w+', re.UNICODE)
+
+# Kenyan numbers: 07XXXXXXXX locally, +254 7XXXXXXXX internationally
+COUNTRY_CODE = '254'
+
+# Likely-duplicate rules used by find_duplicate_clusters
+NAME_SIMILARITY = 0.9
+MAX_AGE_DIFFERENCE = 1
+
+
+def normalize_contact(value):
+    """
+    Returns the canonical 07XXXXXXXX form of a phone number.
+
+    Spaces, dashes, brackets and a +254/254 country code are accepted; the
+    value is returned digits-only (and unchanged otherwise) when it does not
+    look like a local mobile number, so validation can still reject it.
+
+    Args:
+        value: Contact number as entered
+
+    Returns:
+        str: Normalised contact
+    """
+    digits = NON_DIGITS.sub('', value or '')
+    if digits.startswith(COUNTRY_CODE) and len(digits) == len(COUNTRY_CODE) + 9:
+        digits = '0' + digits[len(COUNTRY_CODE):]
+    elif len(digits) == 9 and digits.startswith('7'):
+        digits = '0' + digits
+    return digits
+
+
+def name_key(name):
+    """
+    Returns a blocking key for a patient name.
+
+    Case, accents, punctuation and word order are ignored, so
+    "Doe, John" and "john DOE" share a key.
+    """
+    folded = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().casefold()
+    return ' '.join(sorted(NAME_TOKENS.findall(folded)))
+
+
+def upsert_patient(name, age, contact):
+    """
+    Returns the patient with the given contact, creating or updating it.
+
+    The contact is normalised and uniquely indexed, so it identifies the
+    patient. The row is only written when it is new or its name/age
+    actually changed; a concurrent insert of the same contact is resolved
+    by re-reading the winner.
+
+    Args:
+        name: Patient name
+        age: Patient age
+        contact: Contact number (the patient's lookup key)
+
+    Returns:
+        Patient: The stored patient
+    """
+    contact = normalize_contact(contact)
+    patient = Patient.objects.filter(contact=contact).first()
+    if patient is None:
+        try:
+            with transaction.atomic():
+                return Patient.objects.create(name=name, age=age, contact=contact)
+        except IntegrityError:
+            patient = Patient.objects.get(contact=contact)
+
+    changed = [
+        field for field, value in (('name', name), ('age', age))
+        if getattr(patient, field) != value
+    ]
+    if changed:
+        patient.name = name
+        patient.age = age
+        patient.save(update_fields=changed)
+    return patient
+
+
+def merge_patients(keeper, duplicate_ids):
+    """
+    Moves the bookings and waitlist entries of duplicates onto one patient.
+
+    Bookings (and archived bookings) are re-pointed with bulk UPDATEs. A duplicate's booking for
+    a slot the keeper already holds is the same booking twice and is
+    deleted first (through the ORM, so the occupancy grid and search index
+    follow). The moved bookings are reindexed, since the search index holds
+    the patient's name, and the duplicates are deleted.
+
+    Args:
+        keeper: Patient that remains
+        duplicate_ids: Ids of the patients merged into it
+
+    Returns:
+        int: Number of bookings moved to the keeper
+    """
+    duplicate_ids = [pk for pk in set(duplicate_ids) if pk != keeper.pk]
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        bookings = Booking.objects.filter(patient_id__in=duplicate_ids)
+        held = set(Booking.objects.filter(patient=keeper).values_list('test_id', 'date', 'time'))
+        clashes = []
+        for pk, *slot in bookings.order_by('pk').values_list('pk', 'test_id', 'date', 'time'):
+            if tuple(slot) in held:
+                clashes.append(pk)
+            held.add(tuple(slot))
+        if clashes:
+            Booking.objects.filter(pk__in=clashes).delete()
+
+        user_ids = set(bookings.values_list('user_id', flat=True))
+        moved_ids = list(bookings.values_list('pk', flat=True))
+        moved = bookings.update(patient=keeper, version=F('version') + 1)
+        BookingArchive.objects.filter(patient_id__in=duplicate_ids).update(patient=keeper)
+
+        waiting = set(
+            WaitlistEntry.objects.filter(patient=keeper, status=WaitlistEntry.WAITING)
+            .values_list('test_id', 'date', 'time')
+        )
+        for entry in WaitlistEntry.objects.filter(patient_id__in=duplicate_ids).order_by('pk'):
+            slot = (entry.test_id, entry.date, entry.time)
+            if entry.status == WaitlistEntry.WAITING and slot in waiting:
+                entry.status = WaitlistEntry.CANCELLED
+            waiting.add(slot)
+            entry.patient = keeper
+            entry.save(update_fields=['patient', 'status'])
+
+        Patient.objects.filter(pk__in=duplicate_ids).delete()
+        search_service.index_bookings(Booking.objects.filter(pk__in=moved_ids))
+        transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+    return moved
+
+
+def is_contact_typo(a, b):
+    """True if two contacts differ by one wrong digit or two swapped neighbours."""
+    if len(a) != len(b):
+        return False
+    diff = [index for index, (x, y) in enumerate(zip(a, b)) if x != y]
+    if len(diff) <= 1:
+        return True
+    first, second = diff[0], diff[-1]
+    return len(diff) == 2 and second == first + 1 and a[first] == b[second] and a[second] == b[first]
+
+
+def is_likely_duplicate(a, b):
+    """
+    True if two (name key, contact, age) tuples probably describe one person.
+
+    Names must be near-identical, contacts equal up to one typo and ages
+    within a year (a birthday between visits). Numbers in names must match
+    exactly: "Baby 1 Wanjiru" and "Baby 2 Wanjiru" are twins, not a typo.
+    """
+    key_a, contact_a, age_a = a
+    key_b, contact_b, age_b = b
+    if abs(age_a - age_b) > MAX_AGE_DIFFERENCE or not is_contact_typo(contact_a, contact_b):
+        return False
+    if NON_DIGITS.sub('', key_a) != NON_DIGITS.sub('', key_b):
+        return False
+    # Deferred: only the duplicate scan needs it, not the booking path
+    import difflib
+
+    return key_a == key_b or difflib.SequenceMatcher(None, key_a, key_b).ratio() >= NAME_SIMILARITY
+
+
+def _contact_blocks():
+    """
+    Yields {patient id: (name key, contact, age)} for contacts one digit apart.
+
+    Each digit position after the 07 prefix is masked in turn and the
+    database groups on the masked value, so contacts with one wrong digit
+    meet in exactly one group. Every pass is a single GROUP BY (a sort),
+    never a pairwise comparison.
+    """
+    table = Patient._meta.db_table
+    with connection.cursor() as cursor:
+        for position in range(3, 11):
+            cursor.execute(
+                f'SELECT GROUP_CONCAT(id) FROM {table} '
+                f'GROUP BY SUBSTR(contact, 1, %s) || SUBSTR(contact, %s) '
+                f'HAVING COUNT(*) > 1',
+                [position - 1, position + 1],
+            )
+            groups = [[int(pk) for pk in ids.split(',')] for (ids,) in cursor.fetchall()]
+            # Load the members of many groups per query
+            for start in range(0, len(groups), 500):
+                chunk = groups[start:start + 500]
+                people = {
+                    pk: (name_key(name), contact, age)
+                    for pk, name, contact, age in Patient.objects.filter(
+                        pk__in={pk for ids in chunk for pk in ids}
+                    ).values_list('pk', 'name', 'contact', 'age')
+                }
+                for ids in chunk:
+                    yield {pk: people[pk] for pk in ids if pk in people}
+
+
+def _name_blocks(chunk_size=10000):
+    """
+    Yields {patient id: (name key, contact, age)} for patients sharing a name.
+
+    Blocks are keyed on the name key and age; each patient is also put in
+    the block of the year below, so ages a year apart still meet. This
+    catches contact typos the digit-masked groups miss (swapped digits).
+
+    Two streaming passes keep memory bounded: the first only counts a hash
+    of each block key, the second keeps patients whose block has others.
+    """
+    rows = Patient.objects.order_by().values_list('pk', 'name', 'contact', 'age')
+    counts = defaultdict(int)
+    for _, name, _, age in rows.iterator(chunk_size=chunk_size):
+        key = name_key(name)
+        counts[hash((key, age))] += 1
+        counts[hash((key, age - 1))] += 1
+    blocks = defaultdict(dict)
+    for pk, name, contact, age in rows.iterator(chunk_size=chunk_size):
+        key = name_key(name)
+        for block in (hash((key, age)), hash((key, age - 1))):
+            if counts[block] > 1:
+                blocks[block][pk] = (key, contact, age)
+    del counts
+    yield from blocks.values()
+
+
+def find_duplicate_clusters(max_block=500):
+    """
+    Finds groups of patients that are probably the same person.
+
+    Candidate pairs come only from blocks (same name key and age, or
+    contacts one digit apart), so the work is proportional to the block
+    sizes rather than O(n^2) over all patients. Blocks larger than
+    max_block are skipped as too unselective. Matching pairs are joined
+    into clusters with union-find; two clusters are only joined when their
+    oldest patients match too, so near-miss pairs cannot chain unrelated
+    people (0700000001, 0700000002, ...) into one cluster.
+
+    Args:
+        max_block: Largest block compared pairwise
+
+    Returns:
+        list: Lists of patient ids, oldest first, one list per cluster
+    """
+    parent = {}
+    people_by_id = {}
+
+    def find(pk):
+        root = pk
+        while parent[root] != root:
+            root = parent[root]
+        while pk != root:
+            parent[pk], pk = root, parent[pk]
+        return root
+
+    def union(a, b):
+        parent.setdefault(a, a)
+        parent.setdefault(b, b)
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b and is_likely_duplicate(people_by_id[root_a], people_by_id[root_b]):
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    for people in chain(_contact_blocks(), _name_blocks()):
+        if len(people) > max_block:
+            continue
+        people_by_id.update(people)
+        ids = sorted(people)
+        for index, a in enumerate(ids):
+            for b in ids[index + 1:]:
+                if is_likely_duplicate(people[a], people[b]):
+                    union(a, b)
+
+    clusters = defaultdict(list)
+    for pk in list(parent):
+        clusters[find(pk)].append(pk)
+    return [sorted(members) for members in clusters.values()]
+
+
+def booking_counts(patient_ids):
+    """Returns {patient id: number of bookings} for reporting merges."""
+    return dict(
+        Booking.objects.filter(patient_id__in=patient_ids)
+        .values_list('patient_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
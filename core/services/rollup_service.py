@@ -0,0 +1,189 @@
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+
+from core.models import Booking, DailyBookingRollup
+from core.services import catalogue_service, hospital_service
+from core.services.availability_service import BOOKING_WINDOW_DAYS, get_capacities, slot_times
+
+
+# Heatmap cells are graded from 0 (nothing booked) to HEATMAP_LEVELS (day full)
+HEATMAP_LEVELS = 4
+
+# Longest range served by the heatmap endpoint
+HEATMAP_MAX_DAYS = 92
+
+
+@dataclass
+class HeatmapRow:
+    """Bookings per day of one hospital and test."""
+    hospital_id: int
+    hospital: str
+    test_id: int
+    test_name: str
+    # Bookings allowed per day, None if the slots have no limit
+    capacity: int
+    counts: list
+
+    @property
+    def cells(self):
+        """(count, level) per day, level scaled to the day's capacity (else to the busiest day)."""
+        scale = max(self.counts) if self.capacity is None else self.capacity
+        return [(count, heat_level(count, scale)) for count in self.counts]
+
+
+@dataclass
+class Heatmap:
+    """Daily load of every hospital and test with bookings in a date range."""
+    days: list
+    rows: list
+
+
+def heat_level(count, capacity):
+    if count <= 0:
+        return 0
+    if capacity <= 0:
+        return HEATMAP_LEVELS
+    return min(HEATMAP_LEVELS, math.ceil(count * HEATMAP_LEVELS / capacity))
+
+
+def _day_capacity(capacity, slots_per_day):
+    return None if capacity is None else capacity * slots_per_day
+
+
+def adjust_rollup(hospital_id, test_id, day, delta):
+    """
+    Adds delta to the booking count of a day, hospital and test.
+
+    Args:
+        hospital_id: Hospital primary key
+        test_id: Test primary key
+        day: Booking date
+        delta: +1 for a new booking, -1 for a removed one
+    """
+    key = {'date': day, 'hospital_id': hospital_id, 'test_id': test_id}
+    if DailyBookingRollup.objects.filter(**key).update(booked=F('booked') + delta):
+        return
+    if delta <= 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyBookingRollup.objects.create(booked=delta, **key)
+    except IntegrityError:
+        # Another writer created the row first
+        DailyBookingRollup.objects.filter(**key).update(booked=F('booked') + delta)
+
+
+def adjust_rollup_bulk(slots, delta=1):
+    """
+    Applies adjust_rollup for many bookings with one batched statement.
+
+    Used after bulk_create/bulk deletes, which do not send model signals.
+
+    Args:
+        slots: Iterable of (hospital_id, test_id, date, time) tuples, as for adjust_occupancy_bulk
+        delta: +1 for added bookings, -1 for removed ones
+    """
+    ops = connection.ops
+    counts = Counter(
+        (ops.adapt_datefield_value(day), hospital_id, test_id)
+        for hospital_id, test_id, day, _ in slots
+    )
+    if not counts:
+        return
+    table = DailyBookingRollup._meta.db_table
+    with connection.cursor() as cursor:
+        if delta > 0:
+            cursor.executemany(
+                f'INSERT INTO {table} (date, hospital_id, test_id, booked) '
+                f'VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (date, hospital_id, test_id) '
+                f'DO UPDATE SET booked = {table}.booked + excluded.booked',
+                [(*key, delta * count) for key, count in counts.items()],
+            )
+        else:
+            cursor.executemany(
+                f'UPDATE {table} SET booked = booked + %s '
+                f'WHERE date = %s AND hospital_id = %s AND test_id = %s',
+                [(delta * count, *key) for key, count in counts.items()],
+            )
+
+
+def rebuild_rollup(start=None):
+    """
+    Recomputes the daily rollup from the Booking table.
+
+    Args:
+        start: Only bookings on or after this date are counted (defaults to today)
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    start = start or date.today()
+    groups = (
+        Booking.objects.filter(date__gte=start).order_by()
+        .values_list('date', 'hospital_id', 'test_id').annotate(booked=Count('id'))
+    )
+    with transaction.atomic():
+        DailyBookingRollup.objects.all().delete()
+        created = DailyBookingRollup.objects.bulk_create(
+            [
+                DailyBookingRollup(date=day, hospital_id=hospital_id, test_id=test_id, booked=booked)
+                for day, hospital_id, test_id, booked in groups.iterator(chunk_size=5000)
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def get_heatmap(start=None, days=BOOKING_WINDOW_DAYS, hospital_id=None, test_id=None):
+    """
+    Returns the daily booking load per hospital and test from the rollup.
+
+    Reads one rollup row per day, hospital and test with bookings, so the
+    cost depends on the range and catalogue rather than on the number of
+    bookings. Rows are grouped on the hospital and test ids and sorted by
+    their names.
+
+    Args:
+        start: First day (defaults to today)
+        days: Number of days
+        hospital_id: Only this hospital
+        test_id: Only this test
+
+    Returns:
+        Heatmap: Days and one row per hospital and test
+    """
+    start = start or date.today()
+    day_list = [start + timedelta(days=offset) for offset in range(days)]
+    queryset = DailyBookingRollup.objects.filter(date__range=(start, day_list[-1]), booked__gt=0)
+    if hospital_id:
+        queryset = queryset.filter(hospital_id=hospital_id)
+    if test_id:
+        queryset = queryset.filter(test_id=test_id)
+
+    counts = defaultdict(dict)
+    for day, row_hospital_id, row_test_id, booked in queryset.values_list('date', 'hospital_id', 'test_id', 'booked'):
+        counts[(row_hospital_id, row_test_id)][day] = booked
+
+    slots_per_day = len(slot_times())
+    capacities = get_capacities(counts)
+    test_names = {test.pk: test.name for test in catalogue_service.get_tests()}
+    hospital_names = hospital_service.get_names({row_hospital_id for row_hospital_id, _ in counts})
+    rows = [
+        HeatmapRow(
+            hospital_id=row_hospital_id,
+            hospital=hospital_names.get(row_hospital_id, str(row_hospital_id)),
+            test_id=row_test_id,
+            test_name=test_names.get(row_test_id, str(row_test_id)),
+            capacity=_day_capacity(capacities[(row_hospital_id, row_test_id)], slots_per_day),
+            counts=[by_day.get(day, 0) for day in day_list],
+        )
+        for (row_hospital_id, row_test_id), by_day in counts.items()
+    ]
+    rows.sort(key=lambda row: (row.hospital, row.test_name))
+    return Heatmap(days=day_list, rows=rows)
@@ -0,0 +1,346 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from core.models import Booking
+from core.services.pagination_service import BookingPage, get_page_size
+
+
+# Denormalised search index tables (created by migration 0003)
+FTS_TABLE = 'core_booking_fts'
+TRIGRAM_TABLE = 'core_booking_trigram'
+INDEXED_COLUMNS = ('patient_name', 'contact', 'test_name', 'hospital', 'username')
+
+# bm25 column weights, in INDEXED_COLUMNS order
+RANK_WEIGHTS = (10.0, 4.0, 5.0, 2.0, 1.0)
+
+# Trigram matching needs at least three characters per term
+TRIGRAM_MIN_LENGTH = 3
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+INDEX_FIELDS = (
+    'pk', 'patient__name', 'patient__contact', 'test__name', 'hospital__name', 'user__username',
+)
+
+
+def is_search_enabled():
+    """Returns True if the FTS5 search index is available on this database."""
+    return connection.vendor == 'sqlite' and getattr(settings, 'BOOKING_SEARCH_ENABLED', True)
+
+
+def _index_rows(queryset):
+    """Yields (rowid, patient_name, contact, test_name, hospital, username) tuples."""
+    for pk, name, contact, test_name, hospital, username in (
+        queryset.order_by().values_list(*INDEX_FIELDS).iterator(chunk_size=2000)
+    ):
+        yield (pk, name, contact, test_name, hospital, username or '')
+
+
+def _insert_rows(cursor, rows):
+    placeholders = ', '.join(['%s'] * (len(INDEXED_COLUMNS) + 1))
+    columns = ', '.join(('rowid',) + INDEXED_COLUMNS)
+    for table in (FTS_TABLE, TRIGRAM_TABLE):
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+
+
+def _write_rows(cursor, rows):
+    for table in (FTS_TABLE, TRIGRAM_TABLE):
+        cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row[0],) for row in rows])
+    _insert_rows(cursor, rows)
+
+
+def index_bookings(queryset):
+    """
+    Adds or refreshes the search index rows for the given bookings.
+
+    Args:
+        queryset: Booking queryset to (re)index
+    """
+    if not is_search_enabled():
+        return
+    rows = list(_index_rows(queryset))
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        _write_rows(cursor, rows)
+
+
+def index_booking(booking):
+    """Adds or refreshes the search index row for a single booking."""
+    index_bookings(Booking.objects.filter(pk=booking.pk))
+
+
+def remove_booking(booking_id):
+    """Removes a booking from the search index."""
+    remove_bookings([booking_id])
+
+
+def remove_bookings(booking_ids):
+    """Removes bookings from the search index."""
+    if not is_search_enabled():
+        return
+    with connection.cursor() as cursor:
+        for table in (FTS_TABLE, TRIGRAM_TABLE):
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(pk,) for pk in booking_ids])
+
+
+def rebuild_index(batch_size=5000):
+    """
+    Rebuilds the whole search index from the Booking table.
+
+    Args:
+        batch_size: Number of rows written per executemany call
+
+    Returns:
+        int: Number of bookings indexed
+    """
+    if not is_search_enabled():
+        return 0
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in (FTS_TABLE, TRIGRAM_TABLE):
+            cursor.execute(f'DELETE FROM {table}')
+        batch = []
+        for row in _index_rows(Booking.objects.all()):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_rows(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert_rows(cursor, batch)
+            total += len(batch)
+        for table in (FTS_TABLE, TRIGRAM_TABLE):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return total
+
+
+def parse_terms(query):
+    """Splits a free-text search query into lower-cased word terms."""
+    return [term.lower() for term in TERM_PATTERN.findall(query or '')]
+
+
+def build_prefix_query(terms):
+    """Builds an FTS5 MATCH expression where every term is a prefix match."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def build_trigram_query(terms):
+    """Builds a trigram MATCH expression (substring match on every term)."""
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def encode_offset_cursor(offset):
+    """Encodes a ranked-result offset as an opaque cursor token."""
+    return base64.urlsafe_b64encode(f's|{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_offset_cursor(token):
+    """Decodes an offset cursor, returning 0 for missing or malformed tokens."""
+    if not token:
+        return 0
+    try:
+        prefix, offset = base64.urlsafe_b64decode(
+            (token + '=' * (-len(token) % 4)).encode()
+        ).decode().split('|')
+        return max(0, int(offset)) if prefix == 's' else 0
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return 0
+
+
+def get_rank_window():
+    """Number of newest matches that are ranked when a term matches more bookings."""
+    return getattr(settings, 'BOOKING_SEARCH_RANK_WINDOW', 2000)
+
+
+def _count_matches(cursor, table, expression):
+    # Broad terms are counted in O(matches), so the total is cached for a
+    # short period, like the dashboard count
+    digest = hashlib.md5(f'{table}|{expression}'.encode()).hexdigest()
+    key = f'booking_search_count:{digest}'
+    count = cache.get(key)
+    if count is None:
+        cursor.execute(f'SELECT count(*) FROM {table} WHERE {table} MATCH %s', [expression])
+        count = cursor.fetchone()[0]
+        cache.set(key, count, getattr(settings, 'BOOKING_COUNT_CACHE_TIMEOUT', 30))
+    return count
+
+
+def _match(table, expression, limit, offset):
+    # Scoring is O(matches), so only the newest rank-window matches (a
+    # cheap rowid-ordered scan) are scored. If that is every match the
+    # whole result is ranked; otherwise the remaining, older matches follow
+    # the ranked window newest first, so every match stays reachable.
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    window = get_rank_window()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({table}, {weights}) FROM {table} '
+            f'WHERE {table} MATCH %s ORDER BY rowid DESC LIMIT %s',
+            [expression, window + 1],
+        )
+        scored = cursor.fetchall()
+        if len(scored) <= window:
+            ranked = sorted(scored, key=lambda row: (row[1], -row[0]))
+            return [row[0] for row in ranked[offset:offset + limit]], len(scored)
+
+        boundary = scored[window - 1][0]
+        ranked = sorted(scored[:window], key=lambda row: (row[1], -row[0]))
+        ids = [row[0] for row in ranked[offset:offset + limit]]
+        if len(ids) < limit:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s AND rowid < %s '
+                f'ORDER BY rowid DESC LIMIT %s OFFSET %s',
+                [expression, boundary, limit - len(ids), max(0, offset - window)],
+            )
+            ids += [row[0] for row in cursor.fetchall()]
+        return ids, _count_matches(cursor, table, expression)
+
+
+def search_booking_ids(query, limit, offset=0):
+    """
+    Returns ranked booking ids matching a free-text query.
+
+    Every term is matched as a word prefix against patient name, contact,
+    test name, hospital and username. If that finds nothing, the trigram
+    index is used to match terms anywhere inside a word. Terms matching up
+    to BOOKING_SEARCH_RANK_WINDOW bookings are ranked in full; broader terms
+    rank the newest window and list older matches after it, newest first.
+
+    Args:
+        query: Free-text search query
+        limit: Maximum number of ids to return
+        offset: Number of ranked results to skip
+
+    Returns:
+        tuple: (list of booking ids in rank order, total number of matches)
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return [], 0
+
+    ids, count = _match(FTS_TABLE, build_prefix_query(terms), limit, offset)
+    if not count and all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms):
+        ids, count = _match(TRIGRAM_TABLE, build_trigram_query(terms), limit, offset)
+    return ids, count
+
+
+def filter_bookings(queryset, query):
+    """
+    Restricts a Booking queryset to bookings matching a free-text query.
+
+    Unlike search_booking_ids, results are not ranked: the
+    match is applied as an SQL subquery so the queryset can be streamed.
+
+    Args:
+        queryset: Booking queryset
+        query: Free-text search query
+
+    Returns:
+        QuerySet: Filtered queryset
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset
+    if not is_search_enabled():
+        return contains_filter(queryset, query)
+
+    table, expression = FTS_TABLE, build_prefix_query(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {table} WHERE {table} MATCH %s LIMIT 1', [expression])
+        has_match = cursor.fetchone() is not None
+    if not has_match and all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms):
+        table, expression = TRIGRAM_TABLE, build_trigram_query(terms)
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+    )
+
+
+def search_bookings(query, cursor=None, page_size=None):
+    """
+    Returns one ranked page of bookings matching a free-text query.
+
+    Args:
+        query: Free-text search query
+        cursor: Offset cursor from the URL, or None for the first page
+        page_size: Requested page size
+
+    Returns:
+        BookingPage: The requested page, best matches first
+    """
+    page_size = get_page_size(page_size)
+    offset = decode_offset_cursor(cursor)
+    queryset = Booking.objects.select_related('patient', 'test', 'user')
+
+    if not is_search_enabled():
+        queryset = contains_filter(queryset, query)
+        count = queryset.count()
+        rows = list(queryset[offset:offset + page_size])
+    else:
+        ids, count = search_booking_ids(query, page_size, offset)
+        bookings = queryset.in_bulk(ids)
+        rows = [bookings[pk] for pk in ids if pk in bookings]
+    return _search_page(rows, page_size, offset, count)
+
+
+async def asearch_bookings(query, cursor=None, page_size=None):
+    """
+    Async version of search_bookings.
+
+    The FTS5 lookup uses a raw cursor, so it runs through sync_to_async;
+    the bookings themselves are loaded with the async ORM.
+    """
+    page_size = get_page_size(page_size)
+    offset = decode_offset_cursor(cursor)
+    queryset = Booking.objects.select_related('patient', 'test', 'user')
+
+    if not is_search_enabled():
+        queryset = contains_filter(queryset, query)
+
+        async def fetch_rows():
+            return [booking async for booking in queryset[offset:offset + page_size]]
+
+        count, rows = await asyncio.gather(queryset.acount(), fetch_rows())
+    else:
+        ids, count = await sync_to_async(search_booking_ids)(query, page_size, offset)
+        bookings = await queryset.ain_bulk(ids)
+        rows = [bookings[pk] for pk in ids if pk in bookings]
+    return _search_page(rows, page_size, offset, count)
+
+
+def contains_filter(queryset, query):
+    """
+    icontains matching for databases without the FTS5 index.
+
+    Matches the same fields as the index (patient name, contact, test,
+    hospital and username), but the whole query as one substring rather
+    than word by word. Also used for archived bookings, which are not indexed.
+    """
+    return queryset.filter(
+        Q(patient__name__icontains=query) |
+        Q(patient__contact__icontains=query) |
+        Q(test__name__icontains=query) |
+        Q(hospital__name__icontains=query) |
+        Q(user__username__icontains=query)
+    )
+
+
+def _search_page(rows, page_size, offset, count):
+    has_next = offset + page_size < count
+    return BookingPage(
+        object_list=rows,
+        page_size=page_size,
+        next_cursor=encode_offset_cursor(offset + page_size) if has_next else None,
+        previous_cursor=encode_offset_cursor(max(0, offset - page_size)) if offset else None,
+        count=count,
+    )
@@ -0,0 +1,133 @@
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from core.models import Booking, Patient, Test
+from core.services import (
+    availability_service, catalogue_service, hospital_service, page_cache_service, rollup_service,
+    search_service, stats_service,
+)
+
+
+FIRST_NAMES = [
+    'John', 'Alice', 'Mary', 'Peter', 'Grace', 'James', 'Faith', 'Kevin', 'Mercy', 'Brian',
+    'Joy', 'David', 'Esther', 'Samuel', 'Ann', 'Daniel', 'Lucy', 'Joseph', 'Ruth', 'Paul',
+]
+LAST_NAMES = [
+    'Doe', 'Kimani', 'Wanjiku', 'Otieno', 'Mwangi', 'Njeri', 'Ochieng', 'Achieng',
+    'Kamau', 'Wambui', 'Mutua', 'Chebet', 'Kiprop', 'Atieno', 'Njoroge', 'Omondi',
+]
+HOSPITALS = [
+    'Kenyatta National Hospital', 'Aga Khan University Hospital', 'Nairobi Hospital',
+    'MP Shah Hospital', 'Mater Hospital', 'Gertrude\'s Children\'s Hospital',
+    'Coast General Hospital', 'Moi Teaching and Referral Hospital', 'Karen Hospital',
+    'Avenue Hospital', 'Nakuru Level 5 Hospital', 'Kisumu County Hospital',
+]
+EXTRA_TESTS = ['MRI', 'CT Scan', 'ECG', 'Mammogram', 'Urinalysis', 'Lipid Panel']
+
+DEMO_PASSWORD = 'password@1234'
+
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative Zipf weights, so a few patients/tests/hospitals dominate."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def seed_bookings(bookings, patients=None, users=None, history_days=365, seed=None, batch_size=5000, log=None):
+    """
+    Inserts a synthetic, skewed dataset for demos and benchmarks.
+
+    Patients, tests and hospitals are drawn from Zipf distributions; dates
+    span history_days in the past plus the 30-day booking window. Rows that
+    collide with the (patient, test, date, time) constraint are skipped, and
+    derived tables (search index, occupancy grid, daily rollup, caches) are rebuilt once
+    at the end.
+
+    Args:
+        bookings: Number of bookings to generate
+        patients: Number of patients (default: bookings / 5)
+        users: Number of user accounts (default: bookings / 50)
+        history_days: How far back booking dates go
+        seed: Random seed for repeatable datasets
+        batch_size: Rows per bulk_create
+        log: Optional callable(message) for progress output
+
+    Returns:
+        int: Number of bookings actually inserted
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    patients = patients or max(1, bookings // 5)
+    users = users or max(1, bookings // 50)
+
+    for name in EXTRA_TESTS:
+        Test.objects.get_or_create(name=name)
+    catalogue_service.invalidate()
+    test_ids = list(Test.objects.values_list('pk', flat=True))
+
+    log(f'Creating {users} users...')
+    password = make_password(DEMO_PASSWORD)
+    first_user = User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    User.objects.bulk_create(
+        [
+            User(username=f'bench{first_user + index}', password=password, email=f'bench{first_user + index}@example.com')
+            for index in range(users)
+        ],
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench', is_staff=False).values_list('pk', flat=True))
+
+    log(f'Creating {patients} patients...')
+    first_contact = Patient.objects.count()
+    patient_objects = []
+    for index in range(patients):
+        patient_objects.append(Patient(
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            age=rng.randint(1, 95),
+            contact=f'07{(first_contact + index) % 10 ** 8:08d}',
+        ))
+    patient_ids = [patient.pk for patient in Patient.objects.bulk_create(patient_objects, batch_size=batch_size)]
+
+    patient_weights = zipf_weights(len(patient_ids), exponent=0.8)
+    test_weights = zipf_weights(len(test_ids))
+    hospital_ids = [hospital_service.resolve_hospitals(HOSPITALS)[name] for name in HOSPITALS]
+    hospital_weights = zipf_weights(len(hospital_ids))
+    user_weights = zipf_weights(len(user_ids), exponent=0.7)
+    slots = availability_service.slot_times()
+    start = date.today() - timedelta(days=history_days)
+    span = history_days + availability_service.BOOKING_WINDOW_DAYS
+
+    inserted = 0
+    remaining = bookings
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        batch = [
+            Booking(
+                patient_id=rng.choices(patient_ids, cum_weights=patient_weights)[0],
+                test_id=rng.choices(test_ids, cum_weights=test_weights)[0],
+                user_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+                date=start + timedelta(days=rng.randrange(span + 1)),
+                time=rng.choice(slots),
+                hospital_id=rng.choices(hospital_ids, cum_weights=hospital_weights)[0],
+            )
+            for _ in range(size)
+        ]
+        with transaction.atomic():
+            before = Booking.objects.count()
+            Booking.objects.bulk_create(batch, ignore_conflicts=True)
+            inserted += Booking.objects.count() - before
+        remaining -= size
+        log(f'  {bookings - remaining}/{bookings} generated, {inserted} inserted')
+
+    log('Rebuilding derived tables...')
+    search_service.rebuild_index()
+    availability_service.rebuild_occupancy()
+    rollup_service.rebuild_rollup()
+    stats_service.invalidate(user_ids)
+    page_cache_service.bump_all()
+    return inserted
+
@@ -0,0 +1,141 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, DateField, F, When
+
+from core.models import Booking
+from core.services import archive_service, catalogue_service, hospital_service
+from core.services.availability_service import BOOKING_WINDOW_DAYS
+
+
+def _cache_key(user_id, today):
+    return f"booking_stats:{user_id or 'all'}:{today.isoformat()}"
+
+
+def compute_stats(user=None, today=None):
+    """
+    Aggregates booking statistics with a single grouped query.
+
+    Rows are grouped by test id, hospital id and (for the booking window) day, so
+    the result size depends on the catalogue and window, not on the number
+    of bookings. Archived bookings are all past ones; their (cached)
+    per-test and per-hospital counts are added on top.
+
+    Args:
+        user: Restrict to this user's bookings, or None for all bookings
+        today: Reference date (defaults to today)
+
+    Returns:
+        dict: total, upcoming, past, by_test, by_hospital and by_day
+    """
+    today = today or date.today()
+    window_end = today + timedelta(days=BOOKING_WINDOW_DAYS)
+    queryset = Booking.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+
+    groups = (
+        queryset.order_by()
+        .annotate(
+            window_day=Case(
+                When(date__range=(today, window_end), then=F('date')),
+                default=None,
+                output_field=DateField(),
+            ),
+            upcoming=Case(When(date__gte=today, then=True), default=False, output_field=BooleanField()),
+        )
+        .values('test_id', 'hospital_id', 'window_day', 'upcoming')
+        .annotate(count=Count('id'))
+    )
+
+    by_test = Counter()
+    by_hospital = Counter()
+    by_day = Counter()
+    upcoming = past = 0
+    for group in groups:
+        count = group['count']
+        by_test[group['test_id']] += count
+        by_hospital[group['hospital_id']] += count
+        if group['window_day'] is not None:
+            by_day[group['window_day']] += count
+        if group['upcoming']:
+            upcoming += count
+        else:
+            past += count
+    for (test_id, hospital_id), count in archive_service.archived_counts(getattr(user, 'pk', None)).items():
+        by_test[test_id] += count
+        by_hospital[hospital_id] += count
+        past += count
+
+    test_names = {test.pk: test.name for test in catalogue_service.get_tests()}
+    hospital_names = hospital_service.get_names(by_hospital)
+    return {
+        'total': upcoming + past,
+        'upcoming': upcoming,
+        'past': past,
+        'by_test': sorted(
+            ((test_names.get(test_id, str(test_id)), count) for test_id, count in by_test.items()),
+            key=lambda item: (-item[1], item[0]),
+        ),
+        'by_hospital': sorted(
+            (
+                (hospital_names.get(hospital_id, str(hospital_id)), count)
+                for hospital_id, count in by_hospital.items()
+            ),
+            key=lambda item: (-item[1], item[0]),
+        ),
+        'by_day': [
+            (today + timedelta(days=offset), by_day.get(today + timedelta(days=offset), 0))
+            for offset in range(BOOKING_WINDOW_DAYS + 1)
+        ],
+    }
+
+
+def get_stats(user=None):
+    """
+    Returns booking statistics for a user (or globally), cached until bookings change.
+
+    Changes drop the cached copy of the process that made them; with a
+    per-process cache, other workers serve theirs until
+    BOOKING_STATS_TIMEOUT expires.
+
+    Args:
+        user: User whose bookings to summarise, or None for all bookings
+
+    Returns:
+        dict: See compute_stats
+    """
+    today = date.today()
+    key = _cache_key(getattr(user, 'pk', None), today)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(user, today)
+        cache.set(key, stats, getattr(settings, 'BOOKING_STATS_TIMEOUT', 300))
+    return stats
+
+
+async def aget_stats(user=None):
+    """Async version of get_stats; a cache miss computes the stats on a worker thread."""
+    today = date.today()
+    key = _cache_key(getattr(user, 'pk', None), today)
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await sync_to_async(compute_stats)(user, today)
+        await cache.aset(key, stats, getattr(settings, 'BOOKING_STATS_TIMEOUT', 300))
+    return stats
+
+
+def invalidate(user_ids=()):
+    """
+    Drops cached statistics for the given users and the global summary.
+
+    Args:
+        user_ids: Ids of users whose bookings changed
+    """
+    today = date.today()
+    keys = [_cache_key(None, today)]
+    keys += [_cache_key(user_id, today) for user_id in set(user_ids) if user_id]
+    cache.delete_many(keys)
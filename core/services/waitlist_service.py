@@ -0,0 +1,155 @@
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import Booking, WaitlistEntry
+from core.services import hospital_service, notification_service
+from core.services.availability_service import is_full, slot_start, slot_usage
+from core.services.patient_service import upsert_patient
+
+
+ALREADY_WAITLISTED_MESSAGE = 'This patient is already on the waitlist for that test and time slot.'
+
+
+class AlreadyWaitlistedError(Exception):
+    """Raised when the patient is already waiting for the same test and slot."""
+
+    def __init__(self, message=ALREADY_WAITLISTED_MESSAGE):
+        super().__init__(message)
+
+
+def join_waitlist(*, patient_name, age, contact, test, date, time, hospital, user=None, priority=0):
+    """
+    Puts a patient on the waitlist of a (full) slot.
+
+    Args:
+        patient_name: Patient name
+        age: Patient age
+        contact: Patient contact number
+        test: Test instance
+        date: Requested date
+        time: Requested time (the whole slot containing it is waited for)
+        hospital: Hospital instance or name
+        user: User joining the waitlist
+        priority: Entries with a higher priority are promoted first
+
+    Returns:
+        WaitlistEntry: The new entry
+
+    Raises:
+        AlreadyWaitlistedError: If the patient is already waiting for this test and slot
+    """
+    try:
+        with transaction.atomic():
+            return WaitlistEntry.objects.create(
+                patient=upsert_patient(patient_name, age, contact),
+                test=test,
+                hospital=hospital_service.resolve_hospital(hospital),
+                date=date,
+                time=slot_start(time),
+                user=user,
+                priority=priority,
+            )
+    except IntegrityError as exc:
+        raise AlreadyWaitlistedError() from exc
+
+
+def leave_waitlist(entry):
+    """
+    Takes a waiting entry off the waitlist.
+
+    Args:
+        entry: WaitlistEntry to cancel
+    """
+    if entry.status == WaitlistEntry.WAITING:
+        _resolve(entry, WaitlistEntry.CANCELLED)
+
+
+def user_waitlist(user):
+    """
+    Returns the user's waiting and promoted entries for upcoming slots.
+
+    Args:
+        user: User instance
+
+    Returns:
+        QuerySet: WaitlistEntry objects, soonest slot first
+    """
+    return (
+        WaitlistEntry.objects.filter(
+            user=user,
+            status__in=[WaitlistEntry.WAITING, WaitlistEntry.PROMOTED],
+            date__gte=date.today(),
+        )
+        .select_related('patient', 'test')
+    )
+
+
+def slot_queue(hospital_id, test_id, day, booking_time):
+    """
+    Returns the entries waiting for a slot, in promotion order.
+
+    The order matches the partial waitlist_queue_idx index, so the head of
+    the queue is a single index seek regardless of how many entries wait.
+    """
+    return WaitlistEntry.objects.filter(
+        status=WaitlistEntry.WAITING,
+        hospital_id=hospital_id,
+        test_id=test_id,
+        date=day,
+        time=slot_start(booking_time),
+    ).order_by('-priority', 'created_at', 'id')
+
+
+def promote(hospital_id, test_id, day, booking_time):
+    """
+    Books waiting patients into the free places of a slot.
+
+    Must run inside the transaction that freed the place (booking deleted
+    or moved), after the occupancy grid was updated, so the place cannot be
+    taken by anyone else in between. Entries whose patient already holds
+    the test at that slot are cancelled and the next one is tried. Promoted
+    patients are notified through the job queue.
+
+    Args:
+        hospital_id: Hospital primary key
+        test_id: Test primary key
+        day: Date of the slot
+        booking_time: Time within the slot
+
+    Returns:
+        list: WaitlistEntry objects that were promoted
+    """
+    slot = slot_start(booking_time)
+    if day < date.today():
+        return []
+    promoted = []
+    booked, capacity = slot_usage(hospital_id, test_id, day, slot)
+    queue = slot_queue(hospital_id, test_id, day, slot).select_related('patient')
+    while not is_full(booked, capacity):
+        entry = queue.select_for_update(skip_locked=True).first()
+        if entry is None:
+            break
+        booking = Booking(
+            user_id=entry.user_id, patient=entry.patient, test_id=test_id,
+            hospital_id=hospital_id, date=day, time=slot,
+        )
+        try:
+            with transaction.atomic():
+                booking.save()
+        except IntegrityError:
+            _resolve(entry, WaitlistEntry.CANCELLED)
+            continue
+        _resolve(entry, WaitlistEntry.PROMOTED, booking)
+        notification_service.notify_booking('promoted', booking)
+        promoted.append(entry)
+        booked += 1
+    return promoted
+
+
+def _resolve(entry, status, booking=None):
+    entry.status = status
+    entry.booking = booking
+    entry.resolved_at = timezone.now()
+    entry.save(update_fields=['status', 'booking', 'resolved_at'])
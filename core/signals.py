@@ -0,0 +1,200 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import instrumentation
+from core.models import Booking, Hospital, Patient, SlotCapacity, Test, WaitlistEntry
+from core.services import (
+    availability_service, catalogue_service, hospital_service, page_cache_service, rollup_service,
+    search_service, stats_service, waitlist_service,
+)
+
+
+@receiver(post_save, sender=Booking)
+def index_saved_booking(sender, instance, **kwargs):
+    """Keep the booking search index in sync with booking writes."""
+    search_service.index_booking(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def unindex_deleted_booking(sender, instance, **kwargs):
+    """Drop deleted bookings from the search index."""
+    search_service.remove_booking(instance.pk)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_slot(sender, instance, **kwargs):
+    """Record the slot an existing booking occupied before an update."""
+    instance._previous_slot = None
+    if instance.pk:
+        instance._previous_slot = (
+            Booking.objects.filter(pk=instance.pk)
+            .values_list('hospital_id', 'test_id', 'date', 'time')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Booking)
+def update_slot_occupancy(sender, instance, created, **kwargs):
+    """Move the booking's count in the occupancy grid to its current slot."""
+    current = (instance.hospital_id, instance.test_id, instance.date, instance.time)
+    previous = getattr(instance, '_previous_slot', None)
+    if previous == current:
+        return
+    if previous:
+        availability_service.adjust_occupancy(*previous, delta=-1)
+    availability_service.adjust_occupancy(*current, delta=1)
+
+
+@receiver(post_delete, sender=Booking)
+def release_slot_occupancy(sender, instance, **kwargs):
+    """Free the deleted booking's slot in the occupancy grid."""
+    availability_service.adjust_occupancy(
+        instance.hospital_id, instance.test_id, instance.date, instance.time, delta=-1
+    )
+
+
+@receiver(post_save, sender=Booking)
+def update_daily_rollup(sender, instance, created, **kwargs):
+    """Move the booking's count in the daily rollup to its current day."""
+    current = (instance.hospital_id, instance.test_id, instance.date)
+    previous = getattr(instance, '_previous_slot', None)
+    previous = previous[:3] if previous else None
+    if previous == current:
+        return
+    if previous:
+        rollup_service.adjust_rollup(*previous, delta=-1)
+    rollup_service.adjust_rollup(*current, delta=1)
+
+
+@receiver(post_delete, sender=Booking)
+def release_daily_rollup(sender, instance, **kwargs):
+    """Remove the deleted booking from the daily rollup."""
+    rollup_service.adjust_rollup(instance.hospital_id, instance.test_id, instance.date, delta=-1)
+
+
+@receiver(post_save, sender=Booking)
+def promote_into_previous_slot(sender, instance, **kwargs):
+    """A booking moved to another slot frees its old place for the waitlist."""
+    previous = getattr(instance, '_previous_slot', None)
+    if previous and previous != (instance.hospital_id, instance.test_id, instance.date, instance.time):
+        waitlist_service.promote(*previous)
+
+
+@receiver(post_delete, sender=Booking)
+def promote_into_freed_slot(sender, instance, origin=None, **kwargs):
+    """A cancelled booking's place goes to the head of the slot's waitlist."""
+    # Bookings cascading from a deleted patient, test or user are not cancellations
+    if isinstance(origin, Booking) or getattr(origin, 'model', None) is Booking:
+        waitlist_service.promote(instance.hospital_id, instance.test_id, instance.date, instance.time)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_stats(sender, instance, **kwargs):
+    """Cached dashboard statistics are stale once the change commits."""
+    # Dropped earlier, a concurrent request could cache the pre-commit numbers again
+    user_ids = [instance.user_id]
+    transaction.on_commit(lambda: stats_service.invalidate(user_ids))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def bump_booking_pages(sender, instance, **kwargs):
+    """Rendered pages listing the booking are stale once the change commits."""
+    user_ids = [instance.user_id]
+    transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+
+
+@receiver(post_save, sender=WaitlistEntry)
+@receiver(post_delete, sender=WaitlistEntry)
+def bump_waitlist_pages(sender, instance, **kwargs):
+    """The booking list shows the user's waitlist."""
+    user_ids = [instance.user_id]
+    transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+
+
+@receiver(post_save, sender=SlotCapacity)
+@receiver(post_delete, sender=SlotCapacity)
+def bump_capacity_pages(sender, **kwargs):
+    """The admin heatmap grades each day against the slot capacity."""
+    transaction.on_commit(page_cache_service.bump)
+
+
+@receiver(post_save, sender=Patient)
+def reindex_patient_bookings(sender, instance, created, **kwargs):
+    """Patient name and contact are denormalised into the search index."""
+    if not created:
+        search_service.index_bookings(instance.bookings.all())
+
+
+@receiver(post_save, sender=Patient)
+def bump_patient_pages(sender, instance, created, **kwargs):
+    """Patient names appear in the booking tables of every user who booked for them."""
+    if not created:
+        user_ids = set(instance.bookings.values_list('user_id', flat=True))
+        transaction.on_commit(lambda: page_cache_service.bump(user_ids))
+
+
+@receiver(post_save, sender=Test)
+def reindex_test_bookings(sender, instance, created, **kwargs):
+    """Test names are denormalised into the search index."""
+    if not created:
+        search_service.index_bookings(instance.bookings.all())
+
+
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def invalidate_test_catalogue(sender, **kwargs):
+    """Reload the cached test catalogue once the change is committed."""
+    transaction.on_commit(catalogue_service.invalidate)
+    # Test names appear on every bookings page
+    transaction.on_commit(page_cache_service.bump_all)
+
+
+@receiver(pre_save, sender=Hospital)
+def set_hospital_key(sender, instance, **kwargs):
+    """Spelling variants of a name share the hospital's key."""
+    instance.key = hospital_service.canonical_name(instance.name)
+
+
+@receiver(post_save, sender=Hospital)
+def reindex_hospital_bookings(sender, instance, created, **kwargs):
+    """Hospital names are denormalised into the search index."""
+    if not created:
+        search_service.index_bookings(instance.bookings.all())
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def invalidate_hospitals(sender, created=False, **kwargs):
+    """Reload the cached hospitals once the change is committed."""
+    # Also right away: a rolled-back insert's id can be handed out again
+    hospital_service.invalidate()
+    transaction.on_commit(hospital_service.invalidate)
+    if not created:
+        # Hospital names appear on every bookings page
+        transaction.on_commit(page_cache_service.bump_all)
+
+
+@receiver(post_save, sender=User)
+def reindex_user_bookings(sender, instance, created, update_fields=None, **kwargs):
+    """Usernames are denormalised into the search index."""
+    # Logging in only touches last_login
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    search_service.index_bookings(instance.bookings.all())
+    transaction.on_commit(lambda: page_cache_service.bump([instance.pk]))
+
+
+@receiver(connection_created)
+def time_connection_queries(sender, connection, **kwargs):
+    """
+    Attach the request metrics query timer to every new connection.
+
+    Connections are thread-bound and async views query from sync_to_async
+    worker threads, so the timer cannot just be wrapped around the request.
+    """
+    instrumentation.install_query_timer(connection)
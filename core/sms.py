@@ -0,0 +1,90 @@
+"""
+SMS gateway backends, selected with settings.SMS_GATEWAY.
+
+Gateways take a whole batch of messages per call; the notification jobs
+group messages so a queue of N SMS costs N / SMS_BATCH_SIZE gateway calls.
+A gateway that accepts part of a batch raises PartialDeliveryError, so only
+the rejected messages are retried.
+"""
+
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SMSMessage:
+    to: str
+    body: str
+
+
+class PartialDeliveryError(Exception):
+    """
+    Raised by send_batch when some messages of the batch were not accepted.
+
+    Args:
+        failed: Indexes into the batch of the rejected messages
+    """
+
+    def __init__(self, failed, message=''):
+        self.failed = sorted(set(failed))
+        super().__init__(message or f'{len(self.failed)} message(s) rejected')
+
+
+class BaseGateway:
+    def send_batch(self, messages):
+        """
+        Sends a batch of messages in one call.
+
+        Args:
+            messages: List of SMSMessage
+
+        Raises:
+            PartialDeliveryError: If only some messages were accepted; only those are retried
+            Exception: If the batch was not accepted; the job queue retries it
+        """
+        raise NotImplementedError
+
+
+class StubGateway(BaseGateway):
+    """Local stand-in for a real provider: logs the messages."""
+
+    def send_batch(self, messages):
+        for message in messages:
+            logger.info('SMS to %s: %s', message.to, message.body)
+
+
+class LocmemGateway(StubGateway):
+    """
+    Test gateway: also records the sent batches, like Django's locmem email backend.
+
+    Batches are kept in LocmemGateway.outbox so the batching can be
+    inspected; only the latest OUTBOX_SIZE batches are kept. Select it in
+    tests with override_settings(SMS_GATEWAY='core.sms.LocmemGateway') and
+    clear the outbox in setUp. Messages to a number in LocmemGateway.reject
+    are left out of the outbox and reported with PartialDeliveryError.
+    """
+    OUTBOX_SIZE = 1000
+    outbox = deque(maxlen=OUTBOX_SIZE)
+    reject = set()
+    _lock = threading.Lock()
+
+    def send_batch(self, messages):
+        failed = [index for index, message in enumerate(messages) if message.to in self.reject]
+        sent = [message for index, message in enumerate(messages) if index not in failed]
+        with self._lock:
+            self.outbox.append(sent)
+        super().send_batch(sent)
+        if failed:
+            raise PartialDeliveryError(failed)
+
+
+def get_gateway():
+    return import_string(getattr(settings, 'SMS_GATEWAY', 'core.sms.StubGateway'))()
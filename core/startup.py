@@ -0,0 +1,214 @@
+"""
+Process start-up: template warm-up and cold-start measurement.
+
+hbs.wsgi and hbs.asgi load the application inside paused_gc() and call
+warm_up() once it is loaded. With PRECOMPILE_TEMPLATES on (the production
+start-up mode) every project and form widget template is compiled into the
+cached loaders before the first request, instead of on the first request
+that happens to use it.
+
+profile_cold_start() runs inside a fresh interpreter started by
+`manage.py benchmark_startup`. Only the standard library is imported at
+module level so the child's import timings start from a clean slate.
+"""
+import gc
+import io
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Written to stderr between phases, so -X importtime lines can be attributed
+PHASE_MARKER = '# startup phase: '
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pauses the cyclic garbage collector while the application loads.
+
+    Importing Django, the apps and their models allocates hundreds of
+    thousands of long-lived objects, which triggers several full
+    collections that find almost nothing to free. Afterwards the loaded
+    objects are frozen out of later collections (which also keeps forked
+    workers from touching, and so copying, those pages). If loading fails
+    nothing is frozen, so the half-loaded objects can still be collected.
+    """
+    gc.disable()
+    try:
+        yield
+        gc.freeze()
+    finally:
+        gc.enable()
+
+
+def project_template_names(directories):
+    """Returns the names of the templates under the given template directories."""
+    names = set()
+    for directory in directories:
+        directory = Path(directory)
+        names.update(
+            path.relative_to(directory).as_posix()
+            for path in directory.rglob('*')
+            if path.is_file() and path.suffix in ('.html', '.txt')
+        )
+    return sorted(names)
+
+
+def _project_template_dirs():
+    from django.apps import apps
+    from django.conf import settings
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    return [
+        Path(app.path) / 'templates'
+        for app in apps.get_app_configs()
+        if Path(app.path).resolve().is_relative_to(base_dir) and (Path(app.path) / 'templates').is_dir()
+    ]
+
+
+def precompile_templates():
+    """
+    Compiles every template of the project apps and of the form renderer.
+
+    The templates land in the engines' cached loaders, so the first request
+    neither reads nor parses them. Admin templates are left to load lazily:
+    they are only used by staff.
+
+    Returns:
+        int: Number of templates compiled
+    """
+    import django.forms
+    from django.forms.renderers import get_default_renderer
+    from django.template import engines
+
+    compiled = 0
+    names = project_template_names(_project_template_dirs())
+    for engine in engines.all():
+        for name in names:
+            engine.get_template(name)
+            compiled += 1
+
+    renderer = get_default_renderer()
+    for name in project_template_names([Path(django.forms.__file__).parent / 'templates']):
+        if name.startswith('django/forms/'):
+            renderer.get_template(name)
+            compiled += 1
+    return compiled
+
+
+def warm_up(force=False):
+    """
+    Production start-up mode: precompiles templates when PRECOMPILE_TEMPLATES is on.
+
+    Args:
+        force: Precompile regardless of the setting
+
+    Returns:
+        int: Number of templates compiled (0 when skipped)
+    """
+    from django.conf import settings
+
+    if not (force or getattr(settings, 'PRECOMPILE_TEMPLATES', False)):
+        return 0
+    return precompile_templates()
+
+
+def _phase(name):
+    sys.stderr.write(f'{PHASE_MARKER}{name}\n')
+    sys.stderr.flush()
+
+
+def _request(handler, path, cookie):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    started = time.perf_counter()
+    result = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return (time.perf_counter() - started) * 1000, int(status[0].split()[0])
+
+
+def profile_cold_start(requests):
+    """
+    Times the start-up phases of this (fresh) process and its first requests.
+
+    Phases: settings import, app registry population (models, admin
+    autodiscovery), WSGI handler and middleware, warm_up(), then each
+    request twice (cold, then warm). A phase marker is written to stderr
+    before each phase.
+
+    Args:
+        requests: [(name, path, cookie)] to issue after start-up
+
+    Returns:
+        dict: {'phases': {name: ms}, 'requests': {name: {'status', 'first_ms', 'warm_ms'}}}
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    # Same sequence as hbs.wsgi
+    with paused_gc():
+        _phase('settings')
+        import django
+        from django.conf import settings
+        settings.INSTALLED_APPS
+        timings['settings'] = (time.perf_counter() - started) * 1000
+
+        _phase('apps_ready')
+        mark = time.perf_counter()
+        django.setup(set_prefix=False)
+        timings['apps_ready'] = (time.perf_counter() - mark) * 1000
+
+        _phase('handler')
+        mark = time.perf_counter()
+        from django.core.handlers.wsgi import WSGIHandler
+        handler = WSGIHandler()
+        timings['handler'] = (time.perf_counter() - mark) * 1000
+
+        _phase('warm_up')
+        mark = time.perf_counter()
+        warm_up()
+        timings['warm_up'] = (time.perf_counter() - mark) * 1000
+    timings['startup'] = (time.perf_counter() - started) * 1000
+
+    results = {}
+    for name, path, cookie in requests:
+        _phase(f'request:{name}')
+        first, status = _request(handler, path, cookie)
+        warm, _ = _request(handler, path, cookie)
+        results[name] = {'status': status, 'first_ms': first, 'warm_ms': warm}
+    _phase('done')
+    return {'phases': timings, 'requests': results}
+
+
+def main():
+    """Entry point of the profiling child: reads the requests as JSON on argv, prints the result."""
+    requests = json.loads(sys.argv[1])
+    print(json.dumps(profile_cold_start(requests)))
+
+
+if __name__ == '__main__':
+    main()
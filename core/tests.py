@@ -1,3 +1,1878 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import importlib
+import io
+import json
+import random
+import re
+import subprocess
+import threading
+import time as time_module
+from unittest import mock
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.template import engines
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from core import async_views, instrumentation, startup
+from core import urls as core_urls
+from core.admission import admission_control
+from core.forms import BookingForm
+from core.management.commands.benchmark_startup import Command as BenchmarkStartupCommand
+from core.models import (
+    Booking, BookingArchive, DailyBookingRollup, Hospital, Job, Patient, SlotCapacity, SlotOccupancy, Test,
+    WaitlistEntry,
+)
+from core.routers import read_replica
+from core.services import (
+    admission_service, archive_service, availability_service, bulk_service, catalogue_service, export_service,
+    hospital_service, import_service, job_service, notification_service, pagination_service, rollup_service,
+    search_service, stats_service, waitlist_service,
+)
+from core.services.availability_service import BOOKING_WINDOW_DAYS
+from core.services.booking_service import (
+    DuplicateBookingError, SlotFullError, save_booking, upsert_patient,
+)
+from core.services.patient_service import find_duplicate_clusters, merge_patients, normalize_contact
+from core.sms import LocmemGateway, SMSMessage
+from core.validators import validate_phone_number
+from hbs import urls as hbs_urls
+
+
+def create_hospitals(count):
+    """Hospitals 'Hospital 0', 'Hospital 1', ..., created as the booking paths create them."""
+    names = [f'Hospital {n}' for n in range(count)]
+    ids = hospital_service.resolve_hospitals(names)
+    hospitals = Hospital.objects.in_bulk(ids.values())
+    return [hospitals[ids[name]] for name in names]
+
+
+class SaveBookingTests(TestCase):
+    def setUp(self):
+        self.test = Test.objects.get(name='X-ray')
+        self.booking_data = {
+            'patient_name': 'John Doe',
+            'age': 30,
+            'contact': '0712345678',
+            'test': self.test,
+            'date': date.today() + timedelta(days=1),
+            'time': time(9, 0),
+            'hospital': 'Kenyatta National Hospital',
+        }
+
+    def test_duplicate_booking_is_reported_and_rolled_back(self):
+        save_booking(**self.booking_data)
+        with self.assertRaises(DuplicateBookingError):
+            save_booking(**dict(self.booking_data, patient_name='Johnny Doe'))
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Patient.objects.get().name, 'John Doe')
+
+    def test_unchanged_patient_is_not_written(self):
+        save_booking(**self.booking_data)
+        with self.assertNumQueries(1):
+            upsert_patient('John Doe', 30, '0712345678')
+
+
+class ConcurrentSaveBookingTests(TransactionTestCase):
+    threads = 16
+
+    def test_concurrent_submits_create_exactly_one_booking(self):
+        test = Test.objects.create(name='MRI')
+        Patient.objects.create(name='Jane Doe', age=40, contact='0798765432')
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+
+        def submit():
+            try:
+                barrier.wait()
+                for _ in range(200):
+                    try:
+                        save_booking(
+                            patient_name='Jane Doe', age=40, contact='0798765432', test=test,
+                            date=date.today() + timedelta(days=2), time=time(10, 0),
+                            hospital='Aga Khan Hospital',
+                        )
+                    except OperationalError:
+                        # SQLite reports lock contention; the submit is retried
+                        time_module.sleep(0.005)
+                        continue
+                    outcomes.append('created')
+                    return
+            except DuplicateBookingError:
+                outcomes.append('duplicate')
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=submit) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(outcomes.count('created'), 1)
+        self.assertEqual(outcomes.count('duplicate'), self.threads - 1)
+        self.assertEqual(Booking.objects.filter(test=test).count(), 1)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.slot = {
+            'test': Test.objects.get(name='X-ray'),
+            'date': date.today() + timedelta(days=3),
+            'time': time(11, 0),
+            'hospital': 'Nairobi Hospital',
+        }
+        self.booking = save_booking(patient_name='First', age=50, contact='0700000001', **self.slot)
+        SlotCapacity.objects.create(hospital=self.booking.hospital, test=self.slot['test'], capacity=1)
+
+    def join(self, contact, priority=0):
+        return waitlist_service.join_waitlist(
+            patient_name=f'Waiter {contact}', age=30, contact=contact, priority=priority, **self.slot
+        )
+
+    def test_full_slot_is_rejected(self):
+        with self.assertRaises(SlotFullError):
+            save_booking(patient_name='Second', age=20, contact='0700000002', **self.slot)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_slots_have_no_limit_without_a_capacity(self):
+        SlotCapacity.objects.all().delete()
+        save_booking(patient_name='Second', age=20, contact='0700000002', **self.slot)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_cancellation_promotes_highest_priority_then_oldest(self):
+        early = self.join('0700000002')
+        urgent = self.join('0700000003', priority=5)
+        self.join('0700000004', priority=5)
+        self.booking.delete()
+
+        urgent.refresh_from_db()
+        self.assertEqual(urgent.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(urgent.booking.patient, urgent.patient)
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING).count(), 2)
+        early.refresh_from_db()
+        self.assertEqual(early.status, WaitlistEntry.WAITING)
+
+    def test_moving_a_booking_promotes_into_its_old_slot(self):
+        waiter = self.join('0700000002')
+        save_booking(
+            patient_name='First', age=50, contact='0700000001', booking=self.booking,
+            **dict(self.slot, time=time(14, 0)),
+        )
+        waiter.refresh_from_db()
+        self.assertEqual(waiter.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(waiter.booking.time, self.slot['time'])
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+        self.booking = save_booking(
+            patient_name='First', age=50, contact='0700000001', test=self.test,
+            date=self.day, time=time(9, 10), hospital='Nairobi Hospital',
+        )
+        self.hospital = self.booking.hospital
+
+    def book(self, contact, booking_time, **kwargs):
+        return save_booking(
+            patient_name=f'Patient {contact}', age=30, contact=contact, test=self.test,
+            date=self.day, time=booking_time, hospital='Nairobi Hospital', **kwargs
+        )
+
+    def grid(self):
+        return {
+            (row.hospital_id, row.test_id, row.date, row.time): row.booked
+            for row in SlotOccupancy.objects.filter(booked__gt=0)
+        }
+
+    def assertGridMatchesBookings(self):
+        expected = Counter(
+            (hospital_id, test_id, day, availability_service.slot_start(booking_time))
+            for hospital_id, test_id, day, booking_time in Booking.objects.values_list(
+                'hospital_id', 'test_id', 'date', 'time'
+            )
+        )
+        self.assertEqual(self.grid(), dict(expected))
+
+    def test_full_slots_are_not_free(self):
+        SlotCapacity.objects.create(hospital=self.hospital, test=self.test, capacity=1)
+        start = self.day - timedelta(days=1)
+        slots = availability_service.free_slots(self.test, self.hospital.pk, days=5, start=start)
+
+        self.assertEqual(list(slots), [start + timedelta(days=n) for n in range(5)])
+        self.assertNotIn(time(9, 0), slots[self.day])
+        self.assertEqual(slots[self.day], [slot for slot in availability_service.slot_times() if slot != time(9, 0)])
+        self.assertIn(time(9, 0), slots[start])
+        self.assertEqual(
+            async_to_sync(availability_service.afree_slots)(self.test, self.hospital.pk, days=5, start=start),
+            slots,
+        )
+
+    def test_slots_are_free_without_a_capacity_and_the_window_is_capped(self):
+        slots = availability_service.free_slots(self.test, self.hospital.pk, days=100)
+        today = date.today()
+        self.assertEqual(len(slots), availability_service.BOOKING_WINDOW_DAYS + 1)
+        self.assertEqual(slots[self.day], availability_service.slot_times())
+        now = datetime.now().time()
+        self.assertTrue(all(slot > now for slot in slots[today]))
+        # An unknown hospital has nothing booked
+        unknown = availability_service.free_slots(self.test, None, days=1, start=self.day)
+        self.assertEqual(unknown[self.day], slots[self.day])
+
+    def test_grid_follows_creates_moves_and_cancellations(self):
+        self.book('0700000002', time(9, 20))
+        self.assertGridMatchesBookings()
+
+        moved = self.book('0700000003', time(10, 0))
+        self.book('0700000003', time(14, 45), booking=moved)
+        self.assertGridMatchesBookings()
+
+        self.booking.delete()
+        self.assertGridMatchesBookings()
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time=time(9, 0)).booked, 1)
+
+    def test_bulk_adjustments(self):
+        other = self.day + timedelta(days=1)
+        slots = [
+            (self.hospital.pk, self.test.pk, self.day, time(9, 25)),
+            (self.hospital.pk, self.test.pk, other, time(11, 0)),
+            (self.hospital.pk, self.test.pk, other, time(11, 15)),
+        ]
+        availability_service.adjust_occupancy_bulk(slots)
+        grid = self.grid()
+        self.assertEqual(grid[(self.hospital.pk, self.test.pk, self.day, time(9, 0))], 2)
+        self.assertEqual(grid[(self.hospital.pk, self.test.pk, other, time(11, 0))], 2)
+
+        availability_service.adjust_occupancy_bulk(slots, delta=-1)
+        self.assertGridMatchesBookings()
+
+    def test_past_days_are_pruned(self):
+        SlotOccupancy.objects.create(
+            hospital=self.hospital, test=self.test, date=date.today() - timedelta(days=1), time=time(9, 0), booked=1,
+        )
+        out = io.StringIO()
+        call_command('rebuild_slot_occupancy', '--prune', stdout=out)
+        self.assertIn('Dropped 1 past occupancy rows', out.getvalue())
+        self.assertGridMatchesBookings()
+
+
+class ConcurrentCancellationTests(TransactionTestCase):
+    threads = 4
+    slots = 2000
+
+    def test_concurrent_cancellations_promote_one_waiter_per_slot(self):
+        test = Test.objects.create(name='Echocardiogram')
+        day = date.today() + timedelta(days=5)
+        times = availability_service.slot_times()
+        # One booking per slot and two waiters each, the later one with priority
+        hospitals = create_hospitals(-(-self.slots // len(times)))
+        slots = [(hospitals[n // len(times)], times[n % len(times)]) for n in range(self.slots)]
+        patients = Patient.objects.bulk_create(
+            Patient(name=f'Patient {n}', age=30, contact=f'07{n:08d}') for n in range(3 * self.slots)
+        )
+        bookings = Booking.objects.bulk_create(
+            Booking(patient=patients[n], test=test, date=day, time=slot, hospital=hospital)
+            for n, (hospital, slot) in enumerate(slots)
+        )
+        availability_service.rebuild_occupancy()
+        SlotCapacity.objects.bulk_create(SlotCapacity(hospital=hospital, capacity=1) for hospital in hospitals)
+        WaitlistEntry.objects.bulk_create(
+            WaitlistEntry(
+                patient=patients[(rank + 1) * self.slots + n], test=test, date=day, time=slot,
+                hospital=hospital, priority=rank,
+            )
+            for n, (hospital, slot) in enumerate(slots)
+            for rank in (0, 1)
+        )
+        pending = [booking.pk for booking in bookings]
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.threads)
+
+        def cancel():
+            try:
+                barrier.wait()
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        pk = pending.pop()
+                    while True:
+                        try:
+                            Booking.objects.get(pk=pk).delete()
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention; the cancellation is retried
+                            time_module.sleep(random.uniform(0.001, 0.01))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=cancel) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(Booking.objects.filter(test=test).count(), self.slots)
+        promoted = WaitlistEntry.objects.filter(status=WaitlistEntry.PROMOTED)
+        self.assertEqual(promoted.count(), self.slots)
+        self.assertFalse(promoted.exclude(priority=1).exists())
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING).count(), self.slots)
+        self.assertEqual(set(SlotOccupancy.objects.values_list('booked', flat=True)), {1})
+
+
+class ReadReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # The test runner mirrors the replica onto default; route as configured outside tests
+        patcher = mock.patch('core.routers.replica_available', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Test.objects.get_or_create(name='Ultrasound')
+
+    def test_reads_in_read_replica_views_go_to_the_replica(self):
+        view = read_replica(lambda: list(Test.objects.values_list('name', flat=True)))
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as default:
+            names = view()
+        self.assertIn('Ultrasound', names)
+        self.assertEqual(len(replica), 1)
+        self.assertEqual(len(default), 0)
+        # Other views read from default
+        self.assertEqual(Test.objects.all().db, 'default')
+
+    def test_writes_and_reads_in_a_transaction_stay_on_default(self):
+        @read_replica
+        def view():
+            patient = Patient.objects.create(name='Jane Doe', age=40, contact='0798765432')
+            with transaction.atomic():
+                Patient.objects.filter(pk=patient.pk).update(age=41)
+                return Patient.objects.all().db, Patient.objects.get(pk=patient.pk).age
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            alias, age = view()
+        self.assertEqual((alias, age), ('default', 41))
+        self.assertEqual(len(replica), 0)
+
+
+class TestCatalogueCacheTests(TestCase):
+    def setUp(self):
+        catalogue_service.invalidate()
+        catalogue_service.get_tests()
+
+    def test_booking_form_runs_no_test_queries_when_warm(self):
+        test = Test.objects.get(name='Ultrasound')
+        data = {
+            'patient_name': 'Mary Wanjiku', 'age': 28, 'contact': '0722000000',
+            'test': test.pk, 'date': date.today() + timedelta(days=3), 'time': '11:00',
+            'hospital': 'Nairobi Hospital',
+        }
+        with CaptureQueriesContext(connection) as queries:
+            rendered = BookingForm().as_p()
+            form = BookingForm(data=data)
+            self.assertTrue(form.is_valid(), form.errors)
+
+        self.assertIn('Ultrasound', rendered)
+        self.assertEqual(form.cleaned_data['test'], test)
+        self.assertEqual([q['sql'] for q in queries if 'core_test' in q['sql']], [])
+
+    def test_catalogue_reloads_after_test_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Test.objects.create(name='CT Scan')
+        self.assertIn('CT Scan', [test.name for test in catalogue_service.get_tests()])
+
+
+class QueryPlanTests(TestCase):
+    """Every query issued by the booking views must use an index on the big tables."""
+
+    # A bare "SCAN <table>" (without USING INDEX) is a full table scan
+    FULL_SCAN = re.compile(r'\bSCAN (core_booking|core_patient)\b(?! USING)')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='password@1234', is_staff=True)
+        cls.user = User.objects.create_user('patient', password='password@1234')
+        tests = list(Test.objects.all())
+        hospitals = create_hospitals(4)
+        for index in range(60):
+            patient = Patient.objects.create(
+                name=f'Patient {index}', age=20 + index % 50, contact=f'07{index:08d}'
+            )
+            Booking.objects.create(
+                user=cls.user if index % 2 else cls.staff,
+                patient=patient,
+                test=tests[index % len(tests)],
+                date=date.today() + timedelta(days=index % 30),
+                time=time(8 + index % 9, 0),
+                hospital=hospitals[index % 4],
+            )
+        cls.booking = Booking.objects.filter(user=cls.user).first()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, client, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        for query in queries:
+            sql = query['sql']
+            if not re.match(r'\s*(SELECT|UPDATE|DELETE|INSERT)', sql, re.IGNORECASE):
+                continue
+            scans = [line for line in self.explain(sql) if self.FULL_SCAN.search(line)]
+            self.assertEqual(scans, [], f'{method.upper()} {url} ran a full scan:\n{sql}')
+
+    def test_user_views_use_indexes(self):
+        self.client.force_login(self.user)
+        booking_data = {
+            'patient_name': 'Peter Otieno', 'age': 41, 'contact': '0733000000',
+            'test': Test.objects.first().pk, 'date': date.today() + timedelta(days=5),
+            'time': '14:00', 'hospital': 'Hospital 1',
+        }
+        self.assert_indexed(self.client, 'get', reverse('dashboard'))
+        self.assert_indexed(self.client, 'get', reverse('list_bookings'))
+        next_cursor = self.client.get(reverse('list_bookings'), {'page_size': 5}).context['page'].next_cursor
+        self.assert_indexed(self.client, 'get', reverse('list_bookings'), {'page_size': 5, 'cursor': next_cursor})
+        self.assert_indexed(self.client, 'post', reverse('create_booking'), booking_data)
+        self.assert_indexed(self.client, 'get', reverse('update_booking', args=[self.booking.pk]))
+        self.assert_indexed(
+            self.client, 'post', reverse('update_booking', args=[self.booking.pk]),
+            dict(booking_data, contact=self.booking.patient.contact, time='15:00'),
+        )
+        self.assert_indexed(
+            self.client, 'get', reverse('slot_availability'),
+            {'test': self.booking.test_id, 'hospital': 'Hospital 1'},
+        )
+        self.assert_indexed(self.client, 'post', reverse('delete_booking', args=[self.booking.pk]))
+
+    def test_staff_views_use_indexes(self):
+        self.client.force_login(self.staff)
+        self.assert_indexed(self.client, 'get', reverse('admin_dashboard'))
+        next_cursor = self.client.get(reverse('admin_dashboard'), {'page_size': 5}).context['page'].next_cursor
+        self.assert_indexed(self.client, 'get', reverse('admin_dashboard'), {'page_size': 5, 'cursor': next_cursor})
+        self.assert_indexed(self.client, 'get', reverse('admin_dashboard'), {'search': 'patient 1'})
+        self.assert_indexed(
+            self.client, 'get', reverse('export_bookings'),
+            {'date_from': date.today().isoformat(), 'date_to': date.today().isoformat()},
+        )
+
+
+class AdminChangelistTests(TestCase):
+    """The booking and patient changelists cost the same handful of queries at any table size."""
+
+    rows = 100_000
+    patients = 2_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='password@1234')
+        tests = list(Test.objects.all())
+        hospitals = create_hospitals(4)
+        patients = Patient.objects.bulk_create(
+            (Patient(name=f'Patient {n}', age=30, contact=f'07{n:08d}') for n in range(cls.patients)),
+            batch_size=1000,
+        )
+        start = date.today() - timedelta(days=400)
+        # Each patient holds one booking per day, for rows / patients days
+        Booking.objects.bulk_create(
+            (
+                Booking(
+                    user=cls.admin, patient=patients[n % cls.patients], test=tests[n % len(tests)],
+                    date=start + timedelta(days=n // cls.patients), time=time(8 + n % 9, 0),
+                    hospital=hospitals[n % len(hospitals)],
+                )
+                for n in range(cls.rows)
+            ),
+            batch_size=5000,
+        )
+        cls.booking = Booking.objects.first()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_scalable(self, url, data=None, max_queries=10):
+        """GETs an admin page; returns the response after checking its queries."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data or {})
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(len(queries), max_queries, url)
+        for query in queries:
+            sql = query['sql']
+            self.assertIsNone(re.match(r'SELECT COUNT\(\*\) AS "__count" FROM "\w+"$', sql), sql)
+            if sql.startswith('SELECT'):
+                plan = self.explain(sql)
+                scans = [line for line in plan if QueryPlanTests.FULL_SCAN.search(line)]
+                self.assertEqual(scans, [], f'{url} ran a full scan:\n{sql}')
+        return response
+
+    def test_booking_changelist_queries_do_not_grow_with_the_table(self):
+        changelist = reverse('admin:core_booking_changelist')
+        response = self.assert_scalable(changelist)
+        self.assertGreaterEqual(response.context['cl'].result_count, self.rows)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assert_scalable(changelist, {'p': 500})
+        self.assert_scalable(changelist, {'date__year': self.booking.date.year})
+        self.assert_scalable(
+            changelist, {'date__year': self.booking.date.year, 'date__month': self.booking.date.month},
+        )
+        self.assert_scalable(changelist, {'hospital__id__exact': self.booking.hospital_id})
+
+    @override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=1000)
+    def test_patient_changelist_is_estimated_and_indexed(self):
+        response = self.assert_scalable(reverse('admin:core_patient_changelist'))
+        self.assertGreaterEqual(response.context['cl'].result_count, self.patients)
+
+    def test_booking_change_form_does_not_list_patients_or_users(self):
+        response = self.assert_scalable(reverse('admin:core_booking_change', args=[self.booking.pk]), max_queries=12)
+        self.assertLess(response.content.count(b'<option'), 20)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('patient', password='password@1234')
+        self.today = date.today()
+        tests = list(Test.objects.order_by('pk')[:3])
+        hospitals = create_hospitals(2)
+        offsets = (-40, -1, 0, 0, 3, 3, 3, 17, 30, 31)
+        patients = Patient.objects.bulk_create(
+            Patient(name=f'Patient {n}', age=30, contact=f'07{n:08d}') for n in range(len(offsets) * 2)
+        )
+        Booking.objects.bulk_create(
+            Booking(
+                patient=patients[n], test=tests[n % 3], hospital=hospitals[n % 2],
+                date=self.today + timedelta(days=offsets[n % len(offsets)]), time=time(9, 0),
+                user=self.user if n % 3 else None,
+            )
+            for n in range(len(patients))
+        )
+
+    def per_status_counts(self, queryset):
+        """The statistics as the per-status COUNT queries computed them before the grouped aggregate."""
+        test_names = dict(Test.objects.values_list('pk', 'name'))
+        hospital_names = dict(Hospital.objects.values_list('pk', 'name'))
+        by_test = [
+            (test_names[test_id], queryset.filter(test_id=test_id).count())
+            for test_id in set(queryset.values_list('test_id', flat=True))
+        ]
+        by_hospital = [
+            (hospital_names[hospital_id], queryset.filter(hospital_id=hospital_id).count())
+            for hospital_id in set(queryset.values_list('hospital_id', flat=True))
+        ]
+        return {
+            'total': queryset.count(),
+            'upcoming': queryset.filter(date__gte=self.today).count(),
+            'past': queryset.filter(date__lt=self.today).count(),
+            'by_test': sorted(by_test, key=lambda item: (-item[1], item[0])),
+            'by_hospital': sorted(by_hospital, key=lambda item: (-item[1], item[0])),
+            'by_day': [
+                (day, queryset.filter(date=day).count())
+                for day in (self.today + timedelta(days=offset) for offset in range(BOOKING_WINDOW_DAYS + 1))
+            ],
+        }
+
+    def test_grouped_aggregate_matches_per_status_counts(self):
+        self.assertEqual(
+            stats_service.compute_stats(today=self.today), self.per_status_counts(Booking.objects.all()),
+        )
+        self.assertEqual(
+            stats_service.compute_stats(self.user, today=self.today),
+            self.per_status_counts(Booking.objects.filter(user=self.user)),
+        )
+
+    def test_committed_changes_drop_the_cached_stats(self):
+        total = stats_service.get_stats()['total']
+        mine = stats_service.get_stats(self.user)['total']
+        booking = Booking.objects.filter(user=self.user).first()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            booking.delete()
+        # Until the change commits, the cached copy is still served
+        self.assertEqual(stats_service.get_stats()['total'], total)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(stats_service.get_stats()['total'], total - 1)
+        self.assertEqual(stats_service.get_stats(self.user)['total'], mine - 1)
+        upcoming = stats_service.get_stats(self.user)['upcoming']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_booking(
+                patient_name='New Patient', age=30, contact='0799999999', test=booking.test,
+                date=self.today + timedelta(days=2), time=time(10, 0), hospital='Hospital 0', user=self.user,
+            )
+        self.assertEqual(stats_service.get_stats()['total'], total)
+        self.assertEqual(stats_service.get_stats(self.user)['upcoming'], upcoming + 1)
+
+
+class BookingPageCacheTests(TestCase):
+    CSRF_TOKEN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+    def setUp(self):
+        self.user = User.objects.create_user('patient', password='password@1234')
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.entry = waitlist_service.join_waitlist(
+            patient_name='Waiter', age=30, contact='0700000009', test=Test.objects.get(name='X-ray'),
+            date=date.today() + timedelta(days=3), time=time(11, 0), hospital='Nairobi Hospital', user=self.user,
+        )
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get(reverse('list_bookings'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('list_bookings'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_booking(
+                patient_name='John Doe', age=30, contact='0712345678', test=Test.objects.get(name='X-ray'),
+                date=date.today() + timedelta(days=1), time=time(9, 0), hospital='Nairobi Hospital', user=self.user,
+            )
+        response = self.client.get(reverse('list_bookings'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'John Doe')
+
+    def test_versions_are_kept_in_the_version_cache(self):
+        shared = dict(settings.CACHES, versions={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})
+        with self.settings(CACHES=shared, BOOKING_VERSION_CACHE='versions'):
+            etag = self.client.get(reverse('list_bookings'))['ETag']
+            # Another process's default cache never held the version
+            cache.clear()
+            self.assertEqual(self.client.get(reverse('list_bookings'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                save_booking(
+                    patient_name='John Doe', age=30, contact='0712345678', test=Test.objects.get(name='X-ray'),
+                    date=date.today() + timedelta(days=1), time=time(9, 0), hospital='Nairobi Hospital',
+                    user=self.user,
+                )
+            self.assertEqual(self.client.get(reverse('list_bookings'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            self.assertIsNotNone(caches['versions'].get(f'bookings_version:{self.user.pk}'))
+
+    def test_page_is_revalidated_after_login(self):
+        etag = self.client.get(reverse('list_bookings'))['ETag']
+        # What the login view's rotate_token() does to the session's CSRF secret
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        self.assertEqual(self.client.get(reverse('list_bookings'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_waitlist_accepts_each_sessions_token(self):
+        # The first session fills the fragment cache, the second is served from it
+        self.client.get(reverse('list_bookings'))
+        other = Client(enforce_csrf_checks=True)
+        other.force_login(self.user)
+        page = other.get(reverse('list_bookings')).content.decode()
+
+        response = other.post(
+            reverse('leave_waitlist', args=[self.entry.pk]),
+            {'csrfmiddlewaretoken': self.CSRF_TOKEN.search(page).group(1)},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, WaitlistEntry.CANCELLED)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        # core.urls picks the async views when it is imported
+        with override_settings(BOOKING_ASYNC_VIEWS=True):
+            self.reload_urls()
+        self.addCleanup(self.reload_urls)
+        cache.clear()
+        caches['fragments'].clear()
+
+        self.user = User.objects.create_user('patient', password='password@1234')
+        self.staff = User.objects.create_user('staff', password='password@1234', is_staff=True)
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=2)
+        for n, name in enumerate(('John Doe', 'Mary Otieno')):
+            save_booking(
+                patient_name=name, age=30, contact=f'071234567{n}', test=self.test,
+                date=self.day, time=time(9 + n, 0), hospital='Nairobi Hospital', user=self.user,
+            )
+        SlotCapacity.objects.create(hospital=hospital_service.find_hospital('Nairobi Hospital'), capacity=1)
+
+    @staticmethod
+    def reload_urls():
+        for module in (core_urls, hbs_urls):
+            importlib.reload(module)
+        clear_url_caches()
+
+    def test_read_views_are_routed_to_the_async_variants(self):
+        for name in ('dashboard', 'admin_dashboard', 'list_bookings', 'slot_availability'):
+            with self.subTest(name=name):
+                self.assertIs(resolve(reverse(name)).func, getattr(async_views, name))
+
+    async def test_dashboard_and_booking_list(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, 'John Doe')
+        revalidated = await self.async_client.get(reverse('dashboard'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+        response = await self.async_client.get(reverse('list_bookings'), {'page_size': 1})
+        self.assertContains(response, 'Mary Otieno')
+        self.assertNotContains(response, 'John Doe')
+        self.assertIsNotNone(response.context['page'].next_cursor)
+        response = await self.async_client.get(
+            reverse('list_bookings'), {'page_size': 1, 'cursor': response.context['page'].next_cursor},
+        )
+        self.assertContains(response, 'John Doe')
+
+    async def test_admin_dashboard_lists_and_searches(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.async_client.get(reverse('admin_dashboard'))).status_code, 302)
+
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'John Doe')
+        self.assertContains(response, 'Mary Otieno')
+        self.assertEqual(response.context['stats']['total'], 2)
+
+        response = await self.async_client.get(reverse('admin_dashboard'), {'search': 'mary'})
+        self.assertContains(response, 'Mary Otieno')
+        self.assertNotContains(response, 'John Doe')
+
+    async def test_slot_availability(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse('slot_availability'), {'hospital': 'nairobi hospital', 'test': self.test.pk, 'days': 31},
+        )
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()['slots']
+        self.assertEqual(len(slots), BOOKING_WINDOW_DAYS + 1)
+        self.assertNotIn('09:00', slots[self.day.isoformat()])
+        self.assertNotIn('10:00', slots[self.day.isoformat()])
+        self.assertIn('11:00', slots[self.day.isoformat()])
+
+        invalid = ({'hospital': 'Nairobi Hospital'}, {'hospital': 'Nairobi Hospital', 'test': self.test.pk, 'days': 'x'})
+        for params in invalid:
+            with self.subTest(params=params):
+                self.assertEqual((await self.async_client.get(reverse('slot_availability'), params)).status_code, 400)
+
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='password@1234', is_staff=True)
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, day, contact='0700000001'):
+        return save_booking(
+            patient_name='Chained', age=40, contact=contact, test=self.test, date=day, time=time(10, 0),
+            hospital='Nairobi Hospital', user=self.staff,
+        )
+
+    def test_chained_shift_moves_every_booking(self):
+        bookings = [self.book(self.day + timedelta(days=n)) for n in range(3)]
+        for days in (1, -1):
+            result = bulk_service.move_bookings(Booking.objects.all(), bulk_service.RESCHEDULE, days=days)
+            self.assertEqual(result.skipped, {})
+        self.assertEqual(
+            [Booking.objects.get(pk=booking.pk).date for booking in bookings],
+            [booking.date for booking in bookings],
+        )
+
+    def test_shift_past_the_booking_window_is_skipped(self):
+        near = self.book(self.day)
+        far = self.book(date.today() + timedelta(days=28), contact='0700000002')
+        result = bulk_service.move_bookings(Booking.objects.all(), bulk_service.RESCHEDULE, days=5)
+        self.assertEqual(result.skipped, {far.pk: bulk_service.SKIPPED_WINDOW})
+        self.assertEqual(Booking.objects.get(pk=near.pk).date, self.day + timedelta(days=5))
+        self.assertEqual(Booking.objects.get(pk=far.pk).date, far.date)
+
+    def test_bulk_view_reports_each_booking(self):
+        booking = self.book(self.day)
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('bulk_bookings'), {
+            'hospital': 'nairobi hospital', 'date_from': self.day.isoformat(), 'action': bulk_service.CANCEL,
+        })
+        self.assertEqual(response.status_code, 200)
+        report = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report[1].startswith(f'{booking.pk},') and report[1].endswith(',cancelled'))
+        self.assertFalse(Booking.objects.exists())
+
+
+class ApiBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('patient', password='password@1234')
+        self.client.force_login(self.user)
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+        self.bookings = [
+            save_booking(
+                patient_name=f'Patient {n}', age=30, contact=f'070000000{n}', test=self.test, date=self.day,
+                time=time(9 + n, 0), hospital='Nairobi Hospital', user=self.user,
+            )
+            for n in range(2)
+        ]
+
+    def batch(self, *operations):
+        return self.client.post(
+            reverse('api_batch') + '?fields=id,time', {'operations': list(operations)},
+            content_type='application/json',
+        )
+
+    def test_operations_are_applied_together(self):
+        first, second = self.bookings
+        response = self.batch(
+            {'op': 'create', 'data': {
+                'patient_name': 'New Patient', 'age': 41, 'contact': '0733000000', 'test': self.test.pk,
+                'date': self.day.isoformat(), 'time': '14:00', 'hospital': 'Nairobi Hospital',
+            }},
+            {'op': 'update', 'id': first.pk, 'data': {'time': '15:00'}},
+            {'op': 'delete', 'id': second.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        created, updated, deleted = response.json()['results']
+        self.assertEqual((created['status'], created['booking']['time']), (201, '14:00:00'))
+        self.assertEqual(updated['booking'], {'id': first.pk, 'time': '15:00:00'})
+        self.assertEqual((deleted['status'], deleted['id']), (204, second.pk))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_update_then_delete_of_one_booking_is_rejected_before_writing(self):
+        booking = self.bookings[0]
+        response = self.batch(
+            {'op': 'update', 'id': booking.pk, 'data': {'time': '15:00'}},
+            {'op': 'delete', 'id': booking.pk},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.json()['index'], response.json()['applied']), (1, 0))
+        self.assertEqual(Booking.objects.get(pk=booking.pk).time, booking.time)
+
+    def test_failing_operation_rolls_back_the_batch(self):
+        response = self.batch(
+            {'op': 'delete', 'id': self.bookings[0].pk},
+            {'op': 'update', 'id': self.bookings[1].pk, 'data': {'date': 'never'}},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+class RequestCounterTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def test_exited_threads_keep_their_counts_but_not_their_counters(self):
+        def handle():
+            instrumentation.finish_request(None, 'list_bookings')
+
+        # Threads still running from earlier tests (e.g. asgiref's executor) stay registered
+        instrumentation.finish_request(None, 'warm_up')
+        registered = len(instrumentation._thread_counters)
+        for _ in range(20):
+            thread = threading.Thread(target=handle)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(instrumentation._request_counts()['list_bookings'], 20)
+        self.assertEqual(len(instrumentation._thread_counters), registered)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        # Each test loads the middleware with an unpatched template backend
+        render = getattr(DjangoTemplate.render, '__wrapped__', DjangoTemplate.render)
+        patcher = mock.patch.object(DjangoTemplate, 'render', render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_leaves_templates_unpatched(self):
+        response = self.client.get(reverse('login'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(hasattr(DjangoTemplate.render, '__wrapped__'))
+        self.assertEqual(instrumentation._request_counts()['login'], 1)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_requests_time_rendering(self):
+        response = self.client.get(reverse('login'))
+
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertTrue(hasattr(DjangoTemplate.render, '__wrapped__'))
+        self.assertEqual(instrumentation.snapshot()['login']['samples'], 1)
+
+
+class StartupTests(TestCase):
+    def test_precompile_compiles_every_project_template(self):
+        names = {
+            path.relative_to(directory).as_posix()
+            for directory in Path(settings.BASE_DIR).glob('*/templates')
+            for path in directory.rglob('*.html')
+        }
+        self.assertIn('core/admin_dashboard.html', names)
+        self.assertIn('registration/login.html', names)
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+
+        compiled = startup.precompile_templates()
+        self.assertGreater(compiled, len(names))
+        self.assertLessEqual(names, set(loader.get_template_cache))
+        self.assertEqual(startup.warm_up(), 0)
+
+    def test_gc_is_frozen_only_after_a_successful_load(self):
+        with mock.patch.object(startup, 'gc') as gc:
+            with startup.paused_gc():
+                gc.disable.assert_called_once_with()
+                gc.enable.assert_not_called()
+            gc.freeze.assert_called_once_with()
+            gc.enable.assert_called_once_with()
+
+            gc.reset_mock()
+            with self.assertRaises(ImportError):
+                with startup.paused_gc():
+                    raise ImportError('broken settings')
+            gc.freeze.assert_not_called()
+            gc.enable.assert_called_once_with()
+
+    def test_benchmark_attributes_import_time_to_phases(self):
+        requests = [('login', '/login/', '')]
+        result = {'phases': {}, 'requests': {'login': {'status': 200, 'first_ms': 9.0, 'warm_ms': 1.0}}}
+        stderr = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        100 | encodings',
+            f'{startup.PHASE_MARKER}apps_ready',
+            'import time:      2000 |       5000 |   core.models',
+            'import time:      3000 |       3000 | core.admin',
+            f'{startup.PHASE_MARKER}request:login',
+            'import time:       500 |        500 | users.forms',
+            f'{startup.PHASE_MARKER}done',
+        ])
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(result) + '\n', stderr=stderr)
+        with mock.patch.object(subprocess, 'run', return_value=completed) as run:
+            run_result = BenchmarkStartupCommand().cold_start(requests, 'precompiled')
+
+        self.assertEqual(run.call_args.kwargs['env']['PRECOMPILE_TEMPLATES'], '1')
+        self.assertEqual(run_result['imports_ms']['interpreter'], 0.1)
+        self.assertEqual(run_result['imports_ms']['apps_ready'], 5.0)
+        self.assertEqual(run_result['requests']['login']['imports_ms'], 0.5)
+        self.assertEqual(
+            run_result['modules']['core.models'], {'phase': 'apps_ready', 'self_ms': 2.0, 'cumulative_ms': 5.0},
+        )
+
+
+@override_settings(SMS_GATEWAY='core.sms.LocmemGateway')
+class SMSGatewayTests(TestCase):
+    def setUp(self):
+        LocmemGateway.outbox.clear()
+
+    def test_one_gateway_call_per_batch(self):
+        payload = {
+            'event': 'created', 'booking_id': 1, 'user_id': 1, 'patient': 'Amina', 'contact': '0781234567',
+            'test': 'Blood test', 'date': '2030-01-02', 'time': '09:00', 'hospital': 'Central',
+        }
+        notification_service.send_sms([payload, {**payload, 'booking_id': 2}])
+
+        self.assertEqual(len(LocmemGateway.outbox), 1)
+        self.assertEqual([message.to for message in LocmemGateway.outbox[0]], ['0781234567'] * 2)
+
+    def test_outbox_keeps_only_the_latest_batches(self):
+        gateway = LocmemGateway()
+        for index in range(LocmemGateway.OUTBOX_SIZE + 5):
+            gateway.send_batch([SMSMessage('0781234567', str(index))])
+
+        self.assertEqual(len(LocmemGateway.outbox), LocmemGateway.OUTBOX_SIZE)
+        self.assertEqual(LocmemGateway.outbox[-1][0].body, str(LocmemGateway.OUTBOX_SIZE + 4))
+
+
+@override_settings(SMS_GATEWAY='core.sms.LocmemGateway')
+class NotificationTests(TestCase):
+    def setUp(self):
+        LocmemGateway.outbox.clear()
+        self.user = User.objects.create_user('patient', email='patient@example.com', password='password@1234')
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, contact='0700000001', day=None, booking=None):
+        return save_booking(
+            patient_name='Notified', age=40, contact=contact, test=self.test, date=day or self.day,
+            time=time(10, 0), hospital='Nairobi Hospital', user=self.user, booking=booking,
+        )
+
+    def run_due(self, kind):
+        Job.objects.filter(kind=kind, status=Job.QUEUED).update(run_at=timezone.now())
+        return job_service.run(job_service.claim(kind, 'test'))
+
+    def test_partial_sms_failure_retries_only_the_rejected_message(self):
+        for contact in ('0700000001', '0700000002', '0700000003'):
+            notification_service.notify_booking('created', self.book(contact))
+
+        with mock.patch.object(LocmemGateway, 'reject', {'0700000002'}):
+            self.assertEqual(self.run_due(notification_service.SMS_JOB), 1)
+        self.assertEqual([message.to for message in LocmemGateway.outbox[0]], ['0700000001', '0700000003'])
+        retried = Job.objects.get(kind=notification_service.SMS_JOB, status=Job.QUEUED)
+        self.assertEqual(retried.payload['contact'], '0700000002')
+        self.assertIn('PartialDeliveryError', retried.last_error)
+
+        self.assertEqual(self.run_due(notification_service.SMS_JOB), 0)
+        self.assertEqual([message.to for message in LocmemGateway.outbox[1]], ['0700000002'])
+        self.assertEqual(Job.objects.filter(kind=notification_service.SMS_JOB, status=Job.DONE).count(), 3)
+
+    def test_partial_email_failure_retries_only_the_failed_message(self):
+        other = User.objects.create_user('other', email='other@example.com', password='password@1234')
+        notification_service.notify_booking('created', self.book('0700000001'))
+        booking = self.book('0700000002')
+        booking.user = other
+        booking.save()
+        notification_service.notify_booking('created', booking)
+
+        def send_messages(messages):
+            if messages[0].to == ['other@example.com']:
+                raise ConnectionError('mailbox unavailable')
+            return 1
+
+        connection = mock.MagicMock()
+        connection.__enter__.return_value.send_messages.side_effect = send_messages
+        with mock.patch.object(notification_service, 'get_connection', return_value=connection), \
+                self.assertLogs('core.services.notification_service', 'ERROR'):
+            self.assertEqual(self.run_due(notification_service.EMAIL_JOB), 1)
+        self.assertEqual(connection.__enter__.return_value.send_messages.call_count, 2)
+        retried = Job.objects.get(kind=notification_service.EMAIL_JOB, status=Job.QUEUED)
+        self.assertEqual(retried.payload['booking_id'], booking.pk)
+
+    def test_booking_moved_away_and_back_is_notified_each_time(self):
+        booking = self.book()
+        for day in (self.day + timedelta(days=1), self.day, self.day + timedelta(days=1)):
+            booking = self.book(day=day, booking=booking)
+            notification_service.notify_booking('updated', booking)
+
+        self.assertEqual(Booking.objects.get(pk=booking.pk).version, 4)
+        self.assertEqual(Job.objects.filter(kind=notification_service.SMS_JOB).count(), 3)
+
+    def test_resubmitted_update_is_notified_once(self):
+        booking = self.book()
+        booking = self.book(day=self.day + timedelta(days=1), booking=booking)
+        notification_service.notify_booking('updated', booking)
+        booking = self.book(day=self.day + timedelta(days=1), booking=Booking.objects.get(pk=booking.pk))
+        notification_service.notify_booking('updated', booking)
+
+        self.assertEqual(booking.version, 2)
+        self.assertEqual(Job.objects.filter(kind=notification_service.SMS_JOB).count(), 1)
+
+    def test_bulk_move_back_is_notified_again(self):
+        booking = self.book()
+        for days in (1, -1):
+            bulk_service.move_bookings(Booking.objects.all(), bulk_service.RESCHEDULE, days=days)
+
+        self.assertEqual(Booking.objects.get(pk=booking.pk).version, 3)
+        self.assertEqual(Job.objects.filter(kind=notification_service.SMS_JOB).count(), 2)
+
+
+class WaitlistViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('waiter', password='password@1234')
+        self.client.force_login(self.user)
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+        self.taken = save_booking(
+            patient_name='First', age=50, contact='0700000001', test=self.test, date=self.day,
+            time=time(11, 0), hospital='Nairobi Hospital',
+        )
+        SlotCapacity.objects.create(hospital=self.taken.hospital, test=self.test, capacity=1)
+        self.data = {
+            'patient_name': 'Second', 'age': 20, 'contact': '0700000002', 'test': self.test.pk,
+            'date': self.day.isoformat(), 'time': '11:00', 'hospital': 'Nairobi Hospital',
+        }
+
+    def test_full_slot_offers_the_waitlist_and_a_cancellation_books_it(self):
+        response = self.client.post(reverse('create_booking'), self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['slot_full'])
+        self.assertContains(response, 'name="waitlist"')
+
+        response = self.client.post(reverse('create_booking'), dict(self.data, waitlist='1'))
+        self.assertRedirects(response, reverse('list_bookings'))
+        entry = WaitlistEntry.objects.get(user=self.user)
+        self.assertEqual(entry.status, WaitlistEntry.WAITING)
+
+        self.taken.delete()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(entry.booking.user, self.user)
+
+    def test_leaving_the_waitlist(self):
+        self.client.post(reverse('create_booking'), dict(self.data, waitlist='1'))
+        entry = WaitlistEntry.objects.get(user=self.user)
+
+        response = self.client.post(reverse('leave_waitlist', args=[entry.pk]))
+        self.assertRedirects(response, reverse('list_bookings'))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.CANCELLED)
+        self.taken.delete()
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+
+    def own_booking(self):
+        return save_booking(
+            patient_name='Second', age=20, contact='0700000002', test=self.test, date=self.day,
+            time=time(14, 0), hospital='Nairobi Hospital', user=self.user,
+        )
+
+    def assert_slot_not_overbooked(self, booking):
+        booking.refresh_from_db()
+        self.assertEqual(booking.time, time(14, 0))
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time=time(11, 0)).booked, 1)
+
+    def test_moving_into_a_full_slot_through_the_edit_page_is_refused(self):
+        booking = self.own_booking()
+        response = self.client.post(reverse('update_booking', args=[booking.pk]), self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'fully booked')
+        self.assert_slot_not_overbooked(booking)
+
+    def test_moving_into_a_full_slot_through_the_api_is_refused(self):
+        booking = self.own_booking()
+        response = self.client.patch(
+            reverse('api_booking_detail', args=[booking.pk]), {'time': '11:00'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['code'], 'slot_full')
+        self.assert_slot_not_overbooked(booking)
+
+    def test_refused_create_leaves_the_form_instance_unsaved(self):
+        form = BookingForm(self.data)
+        self.assertTrue(form.is_valid())
+        with self.assertRaises(SlotFullError):
+            form.save(user=self.user)
+        self.assertIsNone(form.instance.pk)
+
+        form.cleaned_data['time'] = time(15, 0)
+        booking = form.save(user=self.user)
+        self.assertTrue(Booking.objects.filter(pk=booking.pk, time=time(15, 0)).exists())
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        test = Test.objects.get(name='X-ray')
+        hospital = hospital_service.resolve_hospital('Kenyatta Hospital')
+        day = date.today() + timedelta(days=1)
+        # Five bookings tie on (date, time); the primary key orders them
+        slots = [(day, time(9, 0))] * 5 + [(day, time(8, 0)), (day - timedelta(days=1), time(15, 0))]
+        patients = Patient.objects.bulk_create(
+            Patient(name=f'Patient {n}', age=30, contact=f'07{n:08d}') for n in range(len(slots))
+        )
+        Booking.objects.bulk_create(
+            Booking(patient=patient, test=test, date=slot_date, time=slot_time, hospital=hospital)
+            for patient, (slot_date, slot_time) in zip(patients, slots)
+        )
+        self.expected = list(
+            Booking.objects.order_by(*pagination_service.KEYSET_ORDERING).values_list('pk', flat=True)
+        )
+
+    def walk(self, paginate, queryset, page_size=3):
+        pages, cursor = [], None
+        while True:
+            page = paginate(queryset, cursor=cursor, page_size=page_size)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    @staticmethod
+    def ids(page):
+        return [row['id'] if isinstance(row, dict) else row.pk for row in page.object_list]
+
+    def test_cursor_round_trip(self):
+        booking = Booking.objects.get(pk=self.expected[2])
+        for direction in (pagination_service.NEXT, pagination_service.PREVIOUS):
+            token = pagination_service.encode_cursor(booking, direction)
+            self.assertEqual(
+                pagination_service.decode_cursor(token), (direction, booking.date, booking.time, booking.pk)
+            )
+        row = Booking.objects.values('id', 'date', 'time').get(pk=booking.pk)
+        self.assertEqual(pagination_service.encode_row_cursor(row), pagination_service.encode_cursor(booking))
+
+    def test_malformed_cursors(self):
+        day = date.today().isoformat()
+        tokens = [
+            'not-a-cursor', '!!!', '',
+            base64.urlsafe_b64encode(f'x|{day}|09:00:00|1'.encode()).decode(),
+            base64.urlsafe_b64encode(f'n|{day}|09:00:00'.encode()).decode(),
+            base64.urlsafe_b64encode(b'n|yesterday|09:00:00|1').decode(),
+            base64.urlsafe_b64encode(f'n|{day}|09:00:00|one'.encode()).decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]
+        for token in tokens:
+            with self.subTest(token=token):
+                with self.assertRaises(pagination_service.InvalidCursor):
+                    pagination_service.decode_cursor(token)
+                # Listings fall back to the first page
+                page = pagination_service.paginate_bookings(Booking.objects.all(), cursor=token, page_size=3)
+                self.assertEqual(self.ids(page), self.expected[:3])
+                self.assertFalse(page.has_previous)
+
+    def test_pages_cover_ties_on_date_and_time_once(self):
+        for paginate, queryset in (
+            (pagination_service.paginate_bookings, Booking.objects.all()),
+            (pagination_service.paginate_rows, Booking.objects.values('id', 'date', 'time')),
+        ):
+            with self.subTest(paginate=paginate.__name__):
+                pages = self.walk(paginate, queryset)
+                self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+                self.assertEqual([len(page.object_list) for page in pages], [3, 3, 1])
+
+    def test_previous_page(self):
+        for paginate, queryset in (
+            (pagination_service.paginate_bookings, Booking.objects.all()),
+            (pagination_service.paginate_rows, Booking.objects.values('id', 'date', 'time')),
+        ):
+            with self.subTest(paginate=paginate.__name__):
+                first, second, last = self.walk(paginate, queryset)
+                back = paginate(queryset, cursor=last.previous_cursor, page_size=3)
+                self.assertEqual(self.ids(back), self.ids(second))
+                self.assertTrue(back.has_next)
+                self.assertTrue(back.has_previous)
+
+                back = paginate(queryset, cursor=back.previous_cursor, page_size=3)
+                self.assertEqual(self.ids(back), self.ids(first))
+                self.assertFalse(back.has_previous)
+                self.assertEqual(
+                    self.ids(paginate(queryset, cursor=back.next_cursor, page_size=3)), self.ids(second)
+                )
+
+    def test_count_is_cached_per_scope(self):
+        cache.clear()
+        queryset = Booking.objects.all()
+        page = pagination_service.paginate_bookings(queryset, page_size=3, count_cache_key='tests')
+        self.assertEqual(page.count, len(self.expected))
+        Booking.objects.filter(pk=self.expected[0]).delete()
+        page = pagination_service.paginate_bookings(queryset, page_size=3, count_cache_key='tests')
+        self.assertEqual(page.count, len(self.expected))
+        self.assertEqual(pagination_service.paginate_bookings(queryset, with_count=True).count, len(self.expected) - 1)
+
+
+@override_settings(BOOKING_SEARCH_RANK_WINDOW=50)
+class BookingSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test = Test.objects.get(name='X-ray')
+        self.hospital = hospital_service.resolve_hospital('Kenyatta Hospital')
+        self.day = date.today() + timedelta(days=2)
+
+    def book(self, name, contact):
+        return Booking.objects.create(
+            patient=Patient.objects.create(name=name, age=30, contact=contact),
+            test=self.test, date=self.day, time=time(9, 0), hospital=self.hospital,
+        )
+
+    def book_many(self, name, count):
+        patients = Patient.objects.bulk_create(
+            Patient(name=f'{name} {n}', age=30, contact=f'07{n + 1:08d}') for n in range(count)
+        )
+        Booking.objects.bulk_create(
+            Booking(patient=patient, test=self.test, date=self.day, time=time(9, 0), hospital=self.hospital)
+            for patient in patients
+        )
+
+    def test_exact_match_on_an_old_booking_ranks_first(self):
+        old = self.book('Amina Wanjiku', '0700000000')
+        # Newer, weaker matches, still within the rank window
+        self.book_many('Amina Wanjiku Otieno', 49)
+        search_service.rebuild_index()
+
+        ids, count = search_service.search_booking_ids('amina wanjiku', limit=10)
+        self.assertEqual(count, 50)
+        self.assertEqual(ids[0], old.pk)
+
+    def test_broad_terms_rank_the_newest_window_then_list_older_matches(self):
+        old = self.book('Amina Wanjiku', '0700000000')
+        self.book_many('Amina Wanjiku Otieno', 119)
+        search_service.rebuild_index()
+        newest = list(Booking.objects.order_by('-pk').values_list('pk', flat=True))
+
+        ids, count = search_service.search_booking_ids('amina', limit=200)
+        self.assertEqual(count, 120)
+        self.assertEqual(set(ids[:50]), set(newest[:50]))
+        self.assertEqual(ids[50:], newest[50:])
+        self.assertEqual(ids[-1], old.pk)
+
+        seen, cursor = [], None
+        while True:
+            page = search_service.search_bookings('amina', cursor=cursor, page_size=30)
+            seen += [booking.pk for booking in page.object_list]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, ids)
+
+    def test_contains_filter_matches_the_indexed_fields(self):
+        booking = self.book('Amina Wanjiku', '0712345678')
+        queryset = Booking.objects.all()
+        for query in ('wanjiku', '0712345', 'kenyatta', 'x-ray'):
+            with self.subTest(query=query):
+                self.assertEqual(list(search_service.contains_filter(queryset, query)), [booking])
+        self.assertFalse(search_service.contains_filter(queryset, 'nobody').exists())
+
+
+@override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_MAX_WAIT=0)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='password@1234')
+        self.client.force_login(self.user)
+        self.clear_buckets()
+        self.addCleanup(self.clear_buckets)
+        admission_service.reset()
+
+    def clear_buckets(self):
+        admission_service.get_cache().delete_many(
+            [admission_service.GLOBAL_KEY, admission_service.user_key(self.user.pk), 'admission:test']
+        )
+
+    @override_settings(ADMISSION_USER_RATE=0.5, ADMISSION_USER_BURST=2)
+    def test_writes_over_the_user_rate_get_429(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('create_booking'), {}).status_code, 200)
+        response = self.client.post(reverse('create_booking'), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertTemplateUsed(response, 'core/busy.html')
+
+        response = self.client.post(reverse('api_bookings'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['code'], 'busy')
+        # Reads are never shed
+        self.assertEqual(self.client.get(reverse('create_booking')).status_code, 200)
+        self.assertEqual(admission_service.snapshot()['rejected'][admission_service.USER_RATE], 2)
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=1)
+    def test_failing_write_releases_its_slot(self):
+        @admission_control()
+        def failing(request):
+            raise RuntimeError('write failed')
+
+        request = RequestFactory().post('/')
+        request.user = self.user
+        with self.assertRaises(RuntimeError):
+            failing(request)
+        self.assertEqual(admission_service.snapshot()['in_flight'], 0)
+
+        decision = admission_service.admit(self.user.pk)
+        self.assertTrue(decision.admitted)
+        self.assertEqual(admission_service.admit(self.user.pk).reason, admission_service.IN_FLIGHT)
+        admission_service.release(decision)
+
+    def test_bucket_refills_at_its_rate(self):
+        now = time_module.time()
+        self.assertEqual(admission_service.take_token('admission:test', 2, 2, now=now), 0)
+        self.assertEqual(admission_service.take_token('admission:test', 2, 2, now=now), 0)
+        self.assertAlmostEqual(admission_service.take_token('admission:test', 2, 2, now=now), 0.5, places=2)
+
+        self.assertEqual(admission_service.take_token('admission:test', 2, 2, now=now + 0.5), 0)
+        self.assertGreater(admission_service.take_token('admission:test', 2, 2, now=now + 0.5), 0)
+
+
+class BookingImportTests(TestCase):
+    HEADER = 'patient_name,age,contact,test,date,time,hospital,username\n'
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='password@1234')
+        self.day = (date.today() + timedelta(days=4)).isoformat()
+        self.rejected = []
+
+    def report(self, line, raw, messages):
+        self.rejected.append((line, messages))
+
+    def import_csv(self, *lines, **kwargs):
+        stream = io.StringIO(self.HEADER + ''.join(lines))
+        return import_service.import_bookings(
+            import_service.read_rows(stream, 'csv'), report=self.report, **kwargs
+        )
+
+    def test_valid_rows_are_created_and_rejected_rows_reported(self):
+        result = self.import_csv(
+            f'Jane Doe,34,0712345678,X-ray,{self.day},09:00,Nairobi Hospital,clerk\n',
+            f'John Doe,abc,0712345679,X-ray,{self.day},09:00,Nairobi Hospital,\n',
+            f'Jane Doe,34,0712345678,X-ray,{self.day},09:00,Nairobi Hospital,clerk\n',
+            f'Mary Doe,40,0712345670,Unknown scan,{self.day},10:00,Nairobi Hospital,\n',
+            f'Peter Doe,50,0712345671,X-ray,{self.day},10:00,nairobi  hospital,\n',
+            chunk_size=1, default_user=self.user,
+        )
+
+        self.assertEqual((result.total, result.created, result.duplicates, result.invalid), (5, 2, 1, 2))
+        self.assertEqual([line for line, _ in self.rejected], [3, 4, 5])
+        self.assertIn(import_service.DUPLICATE_ROW_MESSAGE, self.rejected[1][1])
+        bookings = Booking.objects.order_by('pk')
+        self.assertEqual([booking.user for booking in bookings], [self.user, self.user])
+        self.assertEqual(len({booking.hospital_id for booking in bookings}), 1)
+        # bulk_create skips the signals; the derived tables are kept up to date
+        self.assertEqual(SlotOccupancy.objects.filter(date=self.day).count(), 2)
+        self.assertEqual(search_service.search_booking_ids('peter', limit=10)[0], [bookings[1].pk])
+
+    def test_only_inserted_patients_are_counted(self):
+        Patient.objects.create(name='Jane Doe', age=34, contact='0712345678')
+
+        def new_patient(**fields):
+            # Another import commits one of the new contacts after they were looked up
+            if not Patient.objects.filter(contact='0712345671').exists():
+                Patient.objects.create(name='Peter Doe', age=50, contact='0712345671')
+            return Patient(**fields)
+
+        with mock.patch.object(import_service, 'Patient', wraps=Patient, side_effect=new_patient):
+            result = self.import_csv(
+                f'Jane Doe,34,0712345678,X-ray,{self.day},09:00,Nairobi Hospital,\n',
+                f'Peter Doe,50,0712345671,X-ray,{self.day},10:00,Nairobi Hospital,\n',
+                f'Mary Doe,40,0712345670,X-ray,{self.day},11:00,Nairobi Hospital,\n',
+            )
+
+        self.assertEqual((result.created, result.patients_created), (3, 1))
+        self.assertEqual(Patient.objects.count(), 3)
+
+    def test_malformed_jsonl_lines_are_rejected(self):
+        stream = io.StringIO(
+            json.dumps({
+                'patient_name': 'Jane Doe', 'age': 34, 'contact': '0712345678', 'test': 'x-ray',
+                'date': self.day, 'time': '09:00', 'hospital': 'Nairobi Hospital',
+            }) + '\n\n{not json\n[1, 2]\n'
+        )
+        result = import_service.import_bookings(import_service.read_rows(stream, 'jsonl'), report=self.report)
+
+        self.assertEqual((result.total, result.created, result.invalid), (3, 1, 2))
+        self.assertEqual([line for line, _ in self.rejected], [3, 4])
+        self.assertEqual(self.rejected[0][1], ['Row is not a valid JSON object.'])
+
+
+class BookingExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='password@1234', is_staff=True)
+        self.client.force_login(self.staff)
+        test = Test.objects.get(name='X-ray')
+        self.bookings = [
+            save_booking(
+                patient_name=name, age=30, contact=f'071234567{n}', test=test,
+                date=date.today() + timedelta(days=n + 1), time=time(9, 0), hospital='Nairobi Hospital',
+                user=self.staff,
+            )
+            for n, name in enumerate(['Jane Doe', 'John Smith'])
+        ]
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_bookings'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_streams_every_booking(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0], [name for name, _ in export_service.EXPORT_COLUMNS])
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ['Jane Doe', 'John Smith'])
+
+    def test_ndjson_export_filters_and_compresses(self):
+        response, content = self.export(format='ndjson', gzip='1', search='jane', date_from=date.today().isoformat())
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bookings.ndjson.gz"')
+        rows = [json.loads(line) for line in gzip.decompress(content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.bookings[0].pk)
+        self.assertEqual(rows[0]['date'], self.bookings[0].date.isoformat())
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('export_bookings'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_bookings'), {'date_from': '01/02/2030'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('patient', password='password@1234'))
+        self.assertEqual(self.client.get(reverse('export_bookings')).status_code, 302)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs a data migration against rows created in the schema it starts from."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        # The database flush between tests leaves the search index tables alone
+        with connection.cursor() as cursor:
+            for table in (search_service.FTS_TABLE, search_service.TRIGRAM_TABLE):
+                cursor.execute(f'DELETE FROM {table}')
+        self.old_apps = self.migrate_core(self.migrate_from)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate_core(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('core', name)])
+        return executor.loader.project_state([('core', name)]).apps
+
+
+class PatientDedupeTests(TestCase):
+    def setUp(self):
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, patient, booking_time, hospital='Nairobi Hospital'):
+        return save_booking(
+            patient_name=patient.name, age=patient.age, contact=patient.contact, test=self.test,
+            date=self.day, time=booking_time, hospital=hospital,
+        )
+
+    def test_normalize_contact(self):
+        for value in (
+            '0712345678', '0712 345 678', '0712-345-678', '(0712) 345678', '712345678',
+            '254712345678', '+254712345678', '+254 712 345 678', ' +254-712-345-678 ',
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(normalize_contact(value), '0712345678')
+                validate_phone_number(normalize_contact(value))
+        for value in ('', '12345', '0812345678', '+1 555 010 0100', '07123456789', '+255712345678', 'call me'):
+            with self.subTest(value=value):
+                with self.assertRaises(ValidationError):
+                    validate_phone_number(normalize_contact(value))
+
+    def test_upsert_finds_the_patient_by_any_contact_format(self):
+        patient = upsert_patient('Jane Doe', 30, '0712345678')
+        self.assertEqual(upsert_patient('Jane Doe', 31, '+254 712 345 678').pk, patient.pk)
+        patient.refresh_from_db()
+        self.assertEqual(patient.age, 31)
+
+    def test_merge_moves_bookings_and_drops_clashes(self):
+        keeper = Patient.objects.create(name='Jane Doe', age=30, contact='0712345678')
+        duplicate = Patient.objects.create(name='Jane Do', age=30, contact='0712345679')
+        kept = self.book(keeper, time(9, 0))
+        clash = self.book(duplicate, time(9, 0))
+        moved = self.book(duplicate, time(10, 0))
+        waiting = WaitlistEntry.objects.create(
+            patient=duplicate, test=self.test, hospital=kept.hospital, date=self.day, time=time(11, 0),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(merge_patients(keeper, [duplicate.pk]), 1)
+
+        self.assertFalse(Patient.objects.filter(pk=duplicate.pk).exists())
+        self.assertFalse(Booking.objects.filter(pk=clash.pk).exists())
+        self.assertEqual(set(keeper.bookings.values_list('pk', flat=True)), {kept.pk, moved.pk})
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.patient, keeper)
+        self.assertEqual(SlotOccupancy.objects.get(date=self.day, time=time(9, 0)).booked, 1)
+        # The search index holds the patient's name and contact
+        self.assertEqual(search_service.search_booking_ids('0712345679', limit=10)[0], [])
+        self.assertEqual(sorted(search_service.search_booking_ids('jane doe', limit=10)[0]), [kept.pk, moved.pk])
+
+    def test_duplicate_clusters(self):
+        def patient(name, contact, age=30):
+            return Patient.objects.create(name=name, age=age, contact=contact).pk
+
+        typo = [patient('John Doe', '0712345678'), patient('doe, JOHN', '0712345679', age=31)]
+        swapped = [patient('Mary Wanjiku', '0722334455'), patient('Mary Wanjiku', '0722343455')]
+        patient('Baby 1 Wanjiru', '0733000001')
+        patient('Baby 2 Wanjiru', '0733000002')
+        # One digit apart from each other, but different people
+        for n in range(3):
+            patient(f'Patient {"ABC"[n]}', f'070000000{n}')
+        patient('John Doe', '0799999999', age=60)
+
+        clusters = find_duplicate_clusters()
+
+        self.assertEqual(sorted(clusters), sorted([typo, swapped]))
+
+    def test_dedupe_command_reports_and_merges(self):
+        keeper = Patient.objects.create(name='John Doe', age=30, contact='0712345678')
+        duplicate = Patient.objects.create(name='John Doe', age=30, contact='0712345679')
+        self.book(duplicate, time(9, 0))
+
+        out = io.StringIO()
+        call_command('dedupe_patients', stdout=out)
+        self.assertIn('Found 1 cluster(s) with 1 likely duplicate(s)', out.getvalue())
+        self.assertTrue(Patient.objects.filter(pk=duplicate.pk).exists())
+
+        call_command('dedupe_patients', '--merge', stdout=io.StringIO())
+        self.assertFalse(Patient.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(keeper.bookings.count(), 1)
+
+
+class PatientContactMigrationTests(MigrationTestCase):
+    migrate_from = '0007_job_queue'
+    migrate_to = '0008_patient_contact_key'
+
+    def test_patients_sharing_a_contact_are_merged(self):
+        Patient = self.old_apps.get_model('core', 'Patient')
+        Booking = self.old_apps.get_model('core', 'Booking')
+        SlotOccupancy = self.old_apps.get_model('core', 'SlotOccupancy')
+        WaitlistEntry = self.old_apps.get_model('core', 'WaitlistEntry')
+        test = self.old_apps.get_model('core', 'Test').objects.get_or_create(name='Ultrasound')[0]
+        day = date.today() + timedelta(days=3)
+
+        keeper = Patient.objects.create(name='Jane Doe', age=30, contact='0712345678')
+        duplicate = Patient.objects.create(name='Jane Doe', age=30, contact='+254 712 345 678')
+        other = Patient.objects.create(name='John Doe', age=40, contact='712 000 000')
+        slot = {'test': test, 'date': day, 'hospital': 'Nairobi Hospital'}
+        kept = Booking.objects.create(patient=keeper, time=time(9, 0), **slot)
+        Booking.objects.create(patient=duplicate, time=time(9, 0), **slot)
+        moved = Booking.objects.create(patient=duplicate, time=time(10, 0), **slot)
+        SlotOccupancy.objects.create(time=time(9, 0), booked=2, **slot)
+        SlotOccupancy.objects.create(time=time(10, 0), booked=1, **slot)
+        WaitlistEntry.objects.create(patient=keeper, time=time(11, 0), **slot)
+        second = WaitlistEntry.objects.create(patient=duplicate, time=time(11, 0), **slot)
+
+        new_apps = self.migrate_core(self.migrate_to)
+
+        Patient = new_apps.get_model('core', 'Patient')
+        Booking = new_apps.get_model('core', 'Booking')
+        self.assertEqual(
+            dict(Patient.objects.values_list('pk', 'contact')), {keeper.pk: '0712345678', other.pk: '0712000000'},
+        )
+        self.assertEqual(
+            set(Booking.objects.values_list('pk', 'patient_id')), {(kept.pk, keeper.pk), (moved.pk, keeper.pk)},
+        )
+        self.assertEqual(
+            new_apps.get_model('core', 'SlotOccupancy').objects.get(time=time(9, 0)).booked, 1,
+        )
+        self.assertEqual(new_apps.get_model('core', 'WaitlistEntry').objects.get(pk=second.pk).status, 'cancelled')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM core_booking_fts WHERE core_booking_fts MATCH %s", ['"0712345678"'],
+            )
+            self.assertEqual([row[0] for row in cursor.fetchall()], [moved.pk])
+
+
+class HospitalTests(TestCase):
+    def test_spelling_variants_share_a_key(self):
+        key = hospital_service.canonical_name("St Mary's Hospital")
+        for name in ("st marys hospital", "ST. MARY'S  HOSPITAL", "St Mary’s Hospital ", 'st-marys hospital'):
+            with self.subTest(name=name):
+                self.assertEqual(hospital_service.canonical_name(name), key)
+        self.assertNotEqual(hospital_service.canonical_name('St Marys Hospital 2'), key)
+
+    def test_variants_resolve_to_one_hospital(self):
+        first = hospital_service.resolve_hospital("  St Mary's   Hospital ")
+        self.assertEqual(first.name, "St Mary's Hospital")
+        self.assertEqual(hospital_service.resolve_hospital('st marys hospital'), first)
+
+        ids = hospital_service.resolve_hospitals(['ST MARYS HOSPITAL', 'Aga Khan Hospital', 'aga khan hospital'])
+        self.assertEqual(ids['ST MARYS HOSPITAL'], first.pk)
+        self.assertEqual(ids['Aga Khan Hospital'], ids['aga khan hospital'])
+        self.assertEqual(Hospital.objects.count(), 2)
+
+        booking = save_booking(
+            patient_name='Jane Doe', age=30, contact='0712345678', test=Test.objects.get(name='X-ray'),
+            date=date.today() + timedelta(days=1), time=time(9, 0), hospital="st. mary's hospital",
+        )
+        self.assertEqual(booking.hospital_id, first.pk)
+        self.assertEqual(hospital_service.find_hospital('St Marys Hospital'), first)
+        self.assertIsNone(hospital_service.find_hospital('Unknown Hospital'))
+
+
+class HospitalMigrationTests(MigrationTestCase):
+    migrate_from = '0010_daily_booking_rollup'
+    migrate_to = '0011_hospital'
+
+    def test_spellings_are_merged_and_derived_tables_recounted(self):
+        Patient = self.old_apps.get_model('core', 'Patient')
+        Booking = self.old_apps.get_model('core', 'Booking')
+        SlotCapacity = self.old_apps.get_model('core', 'SlotCapacity')
+        test = self.old_apps.get_model('core', 'Test').objects.get_or_create(name='Ultrasound')[0]
+        day = date.today() + timedelta(days=3)
+
+        spellings = ["St Mary's Hospital", "St Mary's Hospital", 'st marys hospital', 'Aga Khan']
+        bookings = [
+            Booking.objects.create(
+                patient=Patient.objects.create(name=f'Patient {n}', age=30, contact=f'07{n:08d}'),
+                test=test, date=day, time=time(9, 10 * n), hospital=hospital,
+            )
+            for n, hospital in enumerate(spellings)
+        ]
+        SlotCapacity.objects.create(hospital="St Mary's Hospital", test=test, capacity=2)
+        SlotCapacity.objects.create(hospital='ST MARYS HOSPITAL', test=test, capacity=5)
+        SlotCapacity.objects.create(hospital='st marys hospital', test=None, capacity=1)
+        # Stale derived rows, as a drifted grid would have
+        self.old_apps.get_model('core', 'SlotOccupancy').objects.create(
+            hospital='st marys hospital', test=test, date=day, time=time(9, 0), booked=7,
+        )
+        with connection.cursor() as cursor:
+            for booking, hospital in zip(bookings, spellings):
+                cursor.execute(
+                    f'INSERT INTO {search_service.FTS_TABLE} '
+                    f'(rowid, patient_name, contact, test_name, hospital, username) VALUES (%s, %s, %s, %s, %s, %s)',
+                    [booking.pk, 'Patient', '07', 'Ultrasound', hospital, ''],
+                )
+
+        new_apps = self.migrate_core(self.migrate_to)
+
+        hospitals = dict(new_apps.get_model('core', 'Hospital').objects.values_list('key', 'name'))
+        self.assertEqual(hospitals, {'st marys hospital': "St Mary's Hospital", 'aga khan': 'Aga Khan'})
+        st_marys = new_apps.get_model('core', 'Hospital').objects.get(key='st marys hospital')
+        self.assertEqual(
+            sorted(new_apps.get_model('core', 'Booking').objects.values_list('hospital__name', flat=True)),
+            ['Aga Khan', "St Mary's Hospital", "St Mary's Hospital", "St Mary's Hospital"],
+        )
+        self.assertEqual(
+            set(new_apps.get_model('core', 'SlotCapacity').objects.values_list('hospital_id', 'test_id', 'capacity')),
+            {(st_marys.pk, test.pk, 5), (st_marys.pk, None, 1)},
+        )
+        occupancy = new_apps.get_model('core', 'SlotOccupancy').objects.order_by('time')
+        self.assertEqual(
+            list(occupancy.filter(hospital=st_marys).values_list('time', 'booked')),
+            [(time(9, 0), 3)],
+        )
+        self.assertEqual(
+            list(new_apps.get_model('core', 'DailyBookingRollup').objects.filter(hospital=st_marys)
+                 .values_list('date', 'booked')),
+            [(day, 3)],
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT hospital FROM {search_service.FTS_TABLE}')
+            self.assertEqual({row[0] for row in cursor.fetchall()}, {"St Mary's Hospital", 'Aga Khan'})
+
+
+class BookingArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('patient', password='password@1234')
+        self.test = Test.objects.get(name='X-ray')
+        self.past = date.today() - timedelta(days=400)
+        self.old = [
+            save_booking(
+                patient_name=f'Old Patient {n}', age=30, contact=f'071000000{n}', test=self.test,
+                date=self.past + timedelta(days=n), time=time(9, 0), hospital='Nairobi Hospital', user=self.user,
+            )
+            for n in range(3)
+        ]
+        self.upcoming = save_booking(
+            patient_name='New Patient', age=30, contact='0720000000', test=self.test,
+            date=date.today() + timedelta(days=2), time=time(9, 0), hospital='Nairobi Hospital', user=self.user,
+        )
+        self.entry = WaitlistEntry.objects.create(
+            patient=self.old[0].patient, test=self.test, hospital=self.old[0].hospital, date=self.past,
+            time=time(9, 0), status=WaitlistEntry.PROMOTED, booking=self.old[0],
+        )
+
+    def archive(self, *args):
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_bookings', *args, stdout=out)
+        return out.getvalue()
+
+    def test_past_bookings_move_to_the_archive(self):
+        output = self.archive('--batch-size', '2')
+        self.assertIn('Archived 3 booking(s)', output)
+
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True)), [self.upcoming.pk])
+        self.assertEqual(
+            sorted(BookingArchive.objects.values_list('pk', flat=True)), [booking.pk for booking in self.old],
+        )
+        self.entry.refresh_from_db()
+        self.assertIsNone(self.entry.booking)
+        self.assertFalse(SlotOccupancy.objects.filter(date__lt=date.today()).exists())
+        self.assertFalse(DailyBookingRollup.objects.filter(date__lt=date.today()).exists())
+        self.assertEqual(SlotOccupancy.objects.get().date, self.upcoming.date)
+        self.assertEqual(DailyBookingRollup.objects.get().booked, 1)
+        self.assertEqual(search_service.search_booking_ids('patient', limit=10), ([self.upcoming.pk], 1))
+
+    def test_listings_combine_live_and_archived_bookings(self):
+        self.archive()
+        fields = ('id', 'date', 'time', 'patient__name')
+
+        rows = archive_service.booking_rows(fields, user=self.user)
+        self.assertEqual(
+            [row[0] for row in rows], [self.upcoming.pk] + [booking.pk for booking in reversed(self.old)],
+        )
+        self.assertEqual(
+            [row[0] for row in archive_service.booking_rows(fields, date_from=self.past + timedelta(days=1))],
+            [self.upcoming.pk, self.old[2].pk, self.old[1].pk],
+        )
+        self.assertEqual(
+            [row[0] for row in archive_service.booking_rows(fields, date_from=date.today())], [self.upcoming.pk],
+        )
+        self.assertEqual(
+            [row[0] for row in archive_service.booking_rows(fields, search_query='Old Patient 1')],
+            [self.old[1].pk],
+        )
+
+    def test_dry_run_and_future_cutoff(self):
+        self.assertIn('3 booking(s)', self.archive('--dry-run'))
+        self.assertEqual(BookingArchive.objects.count(), 0)
+        with self.assertRaises(CommandError):
+            call_command('archive_bookings', '--before', (date.today() + timedelta(days=1)).isoformat())
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.test = Test.objects.get(name='X-ray')
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, n, day=None, hospital='Nairobi Hospital'):
+        return save_booking(
+            patient_name=f'Patient {n}', age=30, contact=f'07100000{n:02d}', test=self.test, date=day or self.day,
+            time=time(9, 0), hospital=hospital,
+        )
+
+    def rollup(self):
+        rows = DailyBookingRollup.objects.filter(booked__gt=0)
+        return set(rows.values_list('date', 'hospital_id', 'test_id', 'booked'))
+
+    def test_incremental_updates_match_a_rebuild(self):
+        bookings = [self.book(n) for n in range(6)]
+        # Move, cancel, then bulk reschedule, reassign and cancel (no signals)
+        save_booking(
+            patient_name='Patient 0', age=30, contact='0710000000', test=self.test, date=self.day + timedelta(days=1),
+            time=time(9, 0), hospital='Aga Khan Hospital', booking=bookings[0],
+        )
+        bookings[1].delete()
+        bulk_service.move_bookings(Booking.objects.filter(pk=bookings[2].pk), bulk_service.RESCHEDULE, days=2)
+        bulk_service.move_bookings(
+            Booking.objects.filter(pk=bookings[3].pk), bulk_service.REASSIGN, hospital='Aga Khan Hospital',
+        )
+        bulk_service.cancel_bookings(Booking.objects.filter(pk=bookings[4].pk))
+        import_service.import_bookings(import_service.read_rows(io.StringIO(
+            'patient_name,age,contact,test,date,time,hospital\n'
+            f'Imported,30,0720000000,X-ray,{self.day.isoformat()},10:00,Nairobi Hospital\n'
+        ), 'csv'))
+        incremental = self.rollup()
+
+        call_command('rebuild_daily_rollup', stdout=io.StringIO())
+
+        self.assertEqual(incremental, self.rollup())
+        self.assertEqual(sum(row[3] for row in incremental), Booking.objects.count())
+
+    def test_heatmap_levels(self):
+        self.assertEqual(
+            [rollup_service.heat_level(count, 8) for count in (0, 1, 2, 3, 6, 8, 20)], [0, 1, 1, 2, 3, 4, 4],
+        )
+        self.assertEqual(rollup_service.heat_level(3, 0), rollup_service.HEATMAP_LEVELS)
+
+        staff = User.objects.create_user('staff', password='password@1234', is_staff=True)
+        self.client.force_login(staff)
+        for n in range(3):
+            self.book(n)
+        self.book(3, day=self.day + timedelta(days=1))
+        SlotCapacity.objects.create(hospital=Hospital.objects.get(), test=self.test, capacity=1)
+
+        response = self.client.get(reverse('booking_heatmap'), {'start': self.day.isoformat(), 'days': 2})
+        self.assertEqual(response.status_code, 200)
+        (row,) = response.json()['rows']
+        self.assertEqual(row['counts'], [3, 1])
+        self.assertEqual(row['capacity'], len(availability_service.slot_times()))
+
+        heatmap = rollup_service.get_heatmap(self.day, 2)
+        self.assertEqual(
+            heatmap.rows[0].cells,
+            [(count, rollup_service.heat_level(count, row['capacity'])) for count in (3, 1)],
+        )
+        self.assertEqual(self.client.get(reverse('booking_heatmap'), {'days': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('booking_heatmap'), {'hospital': 'Nowhere'}).status_code, 400)
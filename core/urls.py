@@ -1,12 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from core import views
+from core import api_views, views
+
+# Read-heavy views have async variants for ASGI deployments (imported only there)
+if getattr(settings, 'BOOKING_ASYNC_VIEWS', False):
+    from core import async_views as read_views
+else:
+    read_views = views
 
 urlpatterns = [
-    path('dashboard/', views.dashboard, name='dashboard'),
-    path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
-    path('bookings/', views.list_bookings, name='list_bookings'),
+    path('dashboard/', read_views.dashboard, name='dashboard'),
+    path('admin-dashboard/', read_views.admin_dashboard, name='admin_dashboard'),
+    path('admin-dashboard/export/', views.export_bookings, name='export_bookings'),
+    path('admin-dashboard/heatmap/', views.booking_heatmap, name='booking_heatmap'),
+    path('admin-dashboard/bulk/', views.bulk_bookings, name='bulk_bookings'),
+    path('bookings/', read_views.list_bookings, name='list_bookings'),
     path('bookings/new/', views.create_booking, name='create_booking'),
     path('bookings/update/<int:id>/', views.update_booking, name='update_booking'),
     path('bookings/delete/<int:id>/', views.delete_booking, name='delete_booking'),
+    path('waitlist/leave/<int:id>/', views.leave_waitlist_entry, name='leave_waitlist'),
+    path('availability/', read_views.slot_availability, name='slot_availability'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+    path('api/bookings/', api_views.bookings, name='api_bookings'),
+    path('api/bookings/<int:id>/', api_views.booking_detail, name='api_booking_detail'),
+    path('api/batch/', api_views.batch, name='api_batch'),
+    path('api/patients/', api_views.patients, name='api_patients'),
+    path('api/tests/', api_views.tests, name='api_tests'),
+    path('api/availability/', api_views.availability, name='api_availability'),
 ]
-
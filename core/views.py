@@ -1,71 +1,165 @@
+from datetime import date
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Q
-from core.models import Booking, Test
-from core.forms import BookingForm
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from core import instrumentation
+from core.admission import admission_control
+from core.caching import bookings_page
+from core.models import Booking, Test, WaitlistEntry
+from core.routers import read_replica
+from core.forms import BookingForm, BulkBookingForm
+from core.services.availability_service import BOOKING_WINDOW_DAYS, free_slots
+from core.services.booking_service import DuplicateBookingError, SlotFullError
+from core.services import admission_service, bulk_service, hospital_service, notification_service
+from core.services.export_service import EXPORT_FORMATS, export_queryset, iter_export, parse_date
+from core.services.pagination_service import paginate_bookings
+from core.services.rollup_service import HEATMAP_MAX_DAYS, get_heatmap
+from core.services.search_service import search_bookings
+from core.services.stats_service import get_stats
+from core.services.waitlist_service import AlreadyWaitlistedError, leave_waitlist, user_waitlist
 
 
 @login_required
+@bookings_page()
+@read_replica
 def dashboard(request):
     """User dashboard displaying user's bookings."""
     bookings = Booking.objects.filter(user=request.user).select_related('patient', 'test')
+    # Lazy, so cached template fragments skip the queries
     context = {
-        'bookings': bookings,
-        'user': request.user
+        'bookings': SimpleLazyObject(lambda: list(bookings[:5])),
+        'stats': SimpleLazyObject(lambda: get_stats(request.user)),
+        'user': request.user,
+        'bookings_version': request.bookings_version,
     }
     return render(request, 'core/dashboard.html', context)
 
 
 @login_required
 @staff_member_required
+@bookings_page(all_bookings=True)
+@read_replica
 def admin_dashboard(request):
     """Admin dashboard displaying all bookings with search functionality."""
-    bookings = Booking.objects.all().select_related('patient', 'test', 'user')
-    search_query = request.GET.get('search', '')
-    
-    if search_query:
-        bookings = bookings.filter(
-            Q(patient__name__icontains=search_query) |
-            Q(test__name__icontains=search_query)
+    search_query = request.GET.get('search', '').strip()
+
+    def load_page():
+        if search_query:
+            return search_bookings(
+                search_query,
+                cursor=request.GET.get('cursor'),
+                page_size=request.GET.get('page_size'),
+            )
+        return paginate_bookings(
+            Booking.objects.all().select_related('patient', 'test', 'user'),
+            cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('page_size'),
+            count_cache_key='admin_dashboard',
         )
-    
+
+    # Lazy, so cached template fragments skip the queries
+    page = SimpleLazyObject(load_page)
     context = {
-        'bookings': bookings,
-        'search_query': search_query
+        'bookings': SimpleLazyObject(lambda: page.object_list),
+        'page': page,
+        'stats': SimpleLazyObject(get_stats),
+        'heatmap': SimpleLazyObject(get_heatmap),
+        'bulk_form': BulkBookingForm(),
+        'search_query': search_query,
+        'bookings_version': request.bookings_version,
     }
     return render(request, 'core/admin_dashboard.html', context)
 
 
 @login_required
+@staff_member_required
+def export_bookings(request):
+    """Stream bookings (optionally filtered) as CSV or NDJSON."""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Unsupported export format.')
+    try:
+        date_from = parse_date(request.GET.get('date_from'))
+        date_to = parse_date(request.GET.get('date_to'))
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be in YYYY-MM-DD format.')
+    compress = request.GET.get('gzip') == '1'
+
+    queryset = export_queryset(request.GET.get('search', '').strip(), date_from, date_to)
+    filename = f'bookings.{export_format}' + ('.gz' if compress else '')
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        iter_export(queryset, export_format, compress=compress),
+        content_type='application/gzip' if compress else content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@admission_control()
 def create_booking(request):
     """Create a new booking."""
+    slot_full = False
     if request.method == 'POST':
         form = BookingForm(request.POST)
-        if form.is_valid():
-            booking = form.save(commit=False)
-            booking.user = request.user
-            booking.save()
-            messages.success(request, 'Booking created successfully!')
-            return redirect('list_bookings')
+        if form.is_valid() and 'waitlist' in request.POST:
+            try:
+                form.join_waitlist(user=request.user)
+            except AlreadyWaitlistedError as exc:
+                form.add_error(None, str(exc))
+            else:
+                messages.success(request, "Added to the waitlist. You'll be booked in as soon as a place frees up.")
+                return redirect('list_bookings')
+        elif form.is_valid():
+            try:
+                with transaction.atomic():
+                    booking = form.save(user=request.user)
+                    notification_service.notify_booking('created', booking)
+            except DuplicateBookingError as exc:
+                form.add_error(None, str(exc))
+            except SlotFullError as exc:
+                form.add_error(None, str(exc))
+                slot_full = True
+            else:
+                messages.success(request, 'Booking created successfully!')
+                return redirect('list_bookings')
     else:
         form = BookingForm()
     
-    return render(request, 'core/booking_form.html', {'form': form, 'title': 'Create Booking'})
+    return render(request, 'core/booking_form.html', {
+        'form': form, 'title': 'Create Booking', 'slot_full': slot_full,
+    })
 
 
 @login_required
+@bookings_page()
+@read_replica
 def list_bookings(request):
     """List all bookings for the current user."""
     bookings = Booking.objects.filter(user=request.user).select_related('patient', 'test')
+    # Lazy, so a cached table fragment skips the queries
+    page = SimpleLazyObject(lambda: paginate_bookings(
+        bookings,
+        cursor=request.GET.get('cursor'),
+        page_size=request.GET.get('page_size'),
+    ))
     context = {
-        'bookings': bookings
+        'bookings': SimpleLazyObject(lambda: page.object_list),
+        'page': page,
+        'waitlist': SimpleLazyObject(lambda: list(user_waitlist(request.user))),
+        'bookings_version': request.bookings_version,
     }
     return render(request, 'core/booking_list.html', context)
 
 
 @login_required
+@admission_control()
 def update_booking(request, id):
     """Update an existing booking."""
     booking = get_object_or_404(Booking, pk=id, user=request.user)
@@ -73,11 +167,15 @@ def update_booking(request, id):
     if request.method == 'POST':
         form = BookingForm(request.POST, instance=booking)
         if form.is_valid():
-            booking = form.save(commit=False)
-            booking.user = request.user
-            booking.save()
-            messages.success(request, 'Booking updated successfully!')
-            return redirect('list_bookings')
+            try:
+                with transaction.atomic():
+                    booking = form.save(user=request.user)
+                    notification_service.notify_booking('updated', booking)
+            except (DuplicateBookingError, SlotFullError) as exc:
+                form.add_error(None, str(exc))
+            else:
+                messages.success(request, 'Booking updated successfully!')
+                return redirect('list_bookings')
     else:
         # Pre-populate form with booking data
         form = BookingForm(initial={
@@ -95,13 +193,130 @@ def update_booking(request, id):
 
 
 @login_required
+@admission_control()
 def delete_booking(request, id):
     """Delete a booking."""
-    booking = get_object_or_404(Booking, pk=id, user=request.user)
+    booking = get_object_or_404(Booking.objects.select_related('patient'), pk=id, user=request.user)
     
     if request.method == 'POST':
-        booking.delete()
+        with transaction.atomic():
+            notification_service.notify_booking('cancelled', booking)
+            booking.delete()
         messages.success(request, 'Booking deleted successfully!')
         return redirect('list_bookings')
     
     return render(request, 'core/booking_confirm_delete.html', {'booking': booking})
+
+
+@login_required
+def leave_waitlist_entry(request, id):
+    """Take one of the user's entries off the waitlist."""
+    entry = get_object_or_404(WaitlistEntry, pk=id, user=request.user)
+    if request.method == 'POST':
+        leave_waitlist(entry)
+        messages.success(request, 'Removed from the waitlist.')
+    return redirect('list_bookings')
+
+
+@login_required
+def slot_availability(request):
+    """Return the free slots for a test at a hospital as JSON."""
+    hospital = request.GET.get('hospital', '').strip()
+    test_id = request.GET.get('test', '')
+    test = Test.objects.filter(pk=test_id).first() if test_id.isdigit() else None
+    if not hospital or test is None:
+        return JsonResponse({'error': 'Both a valid "test" id and a "hospital" are required.'}, status=400)
+
+    try:
+        days = int(request.GET.get('days', BOOKING_WINDOW_DAYS))
+    except ValueError:
+        return JsonResponse({'error': '"days" must be an integer.'}, status=400)
+
+    slots = free_slots(test, getattr(hospital_service.find_hospital(hospital), 'pk', None), days=days)
+    return JsonResponse({
+        'hospital': hospital,
+        'test': {'id': test.pk, 'name': test.name},
+        'slots': {
+            day.isoformat(): [slot.strftime('%H:%M') for slot in times]
+            for day, times in slots.items()
+        },
+    })
+
+
+def bulk_report_response(result):
+    """Stream the per-booking CSV report of a bulk action."""
+    response = StreamingHttpResponse(bulk_service.iter_report(result), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="bulk-{result.action}-report.csv"'
+    return response
+
+
+@login_required
+@staff_member_required
+def bulk_bookings(request):
+    """Reschedule, move or cancel every booking of a hospital over a date range."""
+    if request.method != 'POST':
+        return redirect('admin_dashboard')
+    form = BulkBookingForm(request.POST)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect('admin_dashboard')
+
+    result = form.run(form.queryset())
+    messages.success(
+        request, f'{form.cleaned_data["action"].title()}: {result.applied} of {len(result.rows)} bookings changed.'
+    )
+    return bulk_report_response(result)
+
+
+@login_required
+@staff_member_required
+@bookings_page(all_bookings=True)
+@read_replica
+def booking_heatmap(request):
+    """Return bookings per day, hospital and test (from the daily rollup) as JSON."""
+    try:
+        start = parse_date(request.GET.get('start')) or date.today()
+        days = int(request.GET.get('days', BOOKING_WINDOW_DAYS))
+    except ValueError:
+        return JsonResponse({'error': '"start" must be YYYY-MM-DD and "days" an integer.'}, status=400)
+    if not 1 <= days <= HEATMAP_MAX_DAYS:
+        return JsonResponse({'error': f'"days" must be between 1 and {HEATMAP_MAX_DAYS}.'}, status=400)
+    test_id = request.GET.get('test', '')
+    hospital_name = request.GET.get('hospital', '').strip()
+    hospital = hospital_service.find_hospital(hospital_name) if hospital_name else None
+    if hospital_name and hospital is None:
+        return JsonResponse({'error': f'Unknown hospital "{hospital_name}".'}, status=400)
+
+    heatmap = get_heatmap(
+        start, days,
+        hospital_id=hospital.pk if hospital else None,
+        test_id=int(test_id) if test_id.isdigit() else None,
+    )
+    return JsonResponse({
+        'days': [day.isoformat() for day in heatmap.days],
+        'rows': [
+            {
+                'hospital': row.hospital,
+                'test': {'id': row.test_id, 'name': row.test_name},
+                'capacity': row.capacity,
+                'counts': row.counts,
+            }
+            for row in heatmap.rows
+        ],
+    })
+
+
+@login_required
+@staff_member_required
+def request_metrics(request):
+    """Expose per-view request metrics and the admission counters as JSON or Prometheus text."""
+    summary = instrumentation.snapshot()
+    admission = admission_service.snapshot()
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(
+            instrumentation.prometheus_text(summary) + admission_service.prometheus_text(admission),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+    return JsonResponse({'views': summary, 'admission': admission})
@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hbs.settings')
+# Route the read-heavy views to their async variants (core.async_views)
+os.environ.setdefault('BOOKING_ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+# Load with the garbage collector paused; in the production start-up mode
+# (PRECOMPILE_TEMPLATES) templates are compiled here rather than on first use
+from core.startup import paused_gc, warm_up  # noqa: E402
+
+with paused_gc():
+    application = get_asgi_application()
+    warm_up()
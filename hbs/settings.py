@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from hbs.database import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,13 +40,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'crispy_forms',
-    'crispy_bootstrap5',
     'core',
     'users',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,32 +57,74 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'hbs.urls'
 
+# Templates are compiled once per process by the cached loader (reset by
+# runserver's autoreloader on change). With PRECOMPILE_TEMPLATES=1, the
+# production start-up mode, hbs.wsgi/hbs.asgi compile them all at boot
+# (core.startup.warm_up) instead of on first use.
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+PRECOMPILE_TEMPLATES = os.environ.get('PRECOMPILE_TEMPLATES', '0') == '1'
+
 WSGI_APPLICATION = 'hbs.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Tuned SQLite (WAL, busy timeout, BEGIN IMMEDIATE, persistent connections);
+# see hbs/database.py. Listing and dashboard views read through the
+# read-only 'replica' alias.
+
+DATABASE_PATH = BASE_DIR / os.environ.get('DATABASE_NAME', 'db.sqlite3')
+
 DATABASES = {
+    'default': sqlite_database(DATABASE_PATH),
+    'replica': sqlite_database(DATABASE_PATH, read_only=True),
+}
+
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hbs-default',
+    },
+    # Rendered template fragments (see core/caching.py). Set
+    # FRAGMENT_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+    # and FRAGMENT_CACHE_LOCATION=<directory> to keep them on disk instead.
+    'fragments': {
+        'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND', 'core.cache_backends.BoundedLocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'hbs-fragments'),
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 4,
+            # Only enforced by BoundedLocMemCache
+            'MAX_BYTES': int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+        },
+    },
 }
 
 
@@ -126,10 +170,96 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Crispy Forms Configuration
-CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
-CRISPY_TEMPLATE_PACK = "bootstrap5"
-
 # Authentication Settings
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
+
+# Booking listings (keyset pagination)
+BOOKING_PAGE_SIZE = 25
+BOOKING_MAX_PAGE_SIZE = 100
+BOOKING_COUNT_CACHE_TIMEOUT = 30
+# Admin changelists estimate the size of unfiltered tables with at least this many rows
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Booking search (SQLite FTS5 index)
+BOOKING_SEARCH_ENABLED = True
+# Terms matching more bookings than this rank only the newest this many
+BOOKING_SEARCH_RANK_WINDOW = 2000
+
+# Bookings page versions (core.services.page_cache_service): the ETag and
+# fragment cache keys of booking pages. Every process must read the same
+# counters, or one that missed a change answers 304 from its stale version:
+# with several worker processes point this at a cache they share (e.g.
+# Redis, or a FileBasedCache on one host). The default locmem cache is only
+# correct for a single-process deployment (one worker, any number of threads).
+BOOKING_VERSION_CACHE = 'default'
+
+# Dashboard statistics (core.services.stats_service), cached in the
+# 'default' cache and dropped when a booking change commits. That cache is
+# per-process locmem, so only the process that made the change drops its
+# copy: other workers keep serving theirs for up to this many seconds.
+# Point 'default' at a shared cache (e.g. Redis) to drop them everywhere.
+BOOKING_STATS_TIMEOUT = 300
+
+# Slot availability grid
+BOOKING_SLOT_START = '08:00'
+BOOKING_SLOT_END = '17:00'
+BOOKING_SLOT_MINUTES = 30
+# Bookings per slot where no SlotCapacity row applies (None: no limit)
+BOOKING_SLOT_CAPACITY = None
+
+# Bookings older than this many days are moved to BookingArchive by
+# `manage.py archive_bookings`, in transactions of BOOKING_ARCHIVE_BATCH_SIZE
+BOOKING_ARCHIVE_AFTER_DAYS = 365
+BOOKING_ARCHIVE_BATCH_SIZE = 1000
+
+# JSON API (core.api_views): operations accepted by one /api/batch/ request
+API_BATCH_MAX_OPERATIONS = 100
+
+# Test catalogue cache (seconds)
+TEST_CATALOGUE_TIMEOUT = 24 * 60 * 60
+TEST_CATALOGUE_LOCAL_TTL = 5
+
+# Hospital list cache (seconds), same scheme as the test catalogue
+HOSPITAL_CACHE_TIMEOUT = 24 * 60 * 60
+HOSPITAL_CACHE_LOCAL_TTL = 5
+
+# Request instrumentation (core.middleware.RequestMetricsMiddleware): the
+# fraction of requests whose queries and template rendering are timed. Kept
+# low in production; 0 turns the timing off and leaves the template backend
+# unpatched (requests are still counted).
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.01'))
+REQUEST_METRICS_WINDOW = 1000
+
+# Admission control for booking writes (core.admission): token buckets per
+# user and for the whole site, held in ADMISSION_CACHE (point it at a cache
+# shared by all processes, e.g. Redis, in production), and a cap on the
+# writes running at once in each process. Writes over a limit get 429.
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+ADMISSION_CACHE = 'default'
+# A tenth of the site-wide rate: a script or a staff member working through
+# the API can keep writing steadily without crowding out everyone else, and
+# people filling in forms never come near it
+ADMISSION_USER_RATE = 5  # writes per second
+ADMISSION_USER_BURST = 20
+# About what SQLite sustains for booking creation (see benchmark_admission)
+ADMISSION_GLOBAL_RATE = 50
+ADMISSION_GLOBAL_BURST = 100
+# SQLite runs one write at a time: more writers in flight only wait on its lock
+ADMISSION_MAX_IN_FLIGHT = 2
+# Seconds a write may wait for an in-flight slot before it is refused
+ADMISSION_MAX_WAIT = 0.5
+
+# Serve the read-heavy views from core.async_views (set by hbs/asgi.py)
+BOOKING_ASYNC_VIEWS = os.environ.get('BOOKING_ASYNC_VIEWS', '0') == '1'
+
+# Background jobs (core.services.job_service, run by `manage.py run_jobs`)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 10
+JOB_WORKER_THREADS = 4
+
+# Booking notifications
+SMS_GATEWAY = os.environ.get('SMS_GATEWAY', 'core.sms.StubGateway')
+SMS_BATCH_SIZE = 50
+EMAIL_BATCH_SIZE = 50
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -13,4 +13,10 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hbs.settings')
 
-application = get_wsgi_application()
+# Load with the garbage collector paused; in the production start-up mode
+# (PRECOMPILE_TEMPLATES) templates are compiled here rather than on first use
+from core.startup import paused_gc, warm_up  # noqa: E402
+
+with paused_gc():
+    application = get_wsgi_application()
+    warm_up()